@@ -0,0 +1,86 @@
+"""
+执行下载计划命令模块
+"""
+
+import typer
+
+from bili_downloader.cli.global_config import get_cookie_from_file
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.bangumi_downloader import BangumiDownloader
+from bili_downloader.core.download_plan import (
+    load_plan,
+    parse_episode_spec,
+    plan_downloads,
+)
+from bili_downloader.exceptions import BiliDownloaderError
+from bili_downloader.utils.print_utils import print_error, print_info, print_success
+
+app = typer.Typer()
+
+
+@app.command()
+def apply(
+    plan_file: str = typer.Argument(..., help="download --plan-only 生成的下载计划"),
+    episodes: str = typer.Option(
+        "", "--episodes", "-e", help="只执行指定的剧集，例如 1,3-5 (默认全部)"
+    ),
+    directory: str = typer.Option(
+        "", "--directory", "-d", help="下载目录 (默认使用计划中的目录)"
+    ),
+    threads: int = typer.Option(0, "--threads", "-t", help="下载线程数"),
+    cleanup: bool = typer.Option(False, "--cleanup", "-c", help="合并后清理"),
+    downloader: str = typer.Option(
+        "", "--downloader", "-D", help="使用的下载器 (axel 或 aria2)"
+    ),
+):
+    """
+    执行下载计划
+
+    地址尚未过期的剧集直接使用计划中选择的流，只有地址已过期的剧集
+    重新请求 playurl (需要 Cookie)。
+    """
+    from bili_downloader.cli.global_config import _global_cli_args
+
+    settings = _global_cli_args.get("settings") or Settings.load_from_file()
+    try:
+        with open(plan_file, encoding="utf-8") as f:
+            plan = load_plan(f)
+        selected = parse_episode_spec(episodes)
+    except (OSError, ValueError) as e:
+        print_error(f"无法读取下载计划: {e}")
+        raise typer.Exit(code=1) from e
+
+    info, resolved = plan_downloads(plan, selected)
+    if not info["episodes"]:
+        print_error("没有选择任何剧集")
+        raise typer.Exit(code=1)
+    expired = len(info["episodes"]) - len(resolved)
+    print_info(
+        f"执行计划: {plan.get('season_title') or plan.get('url')}，"
+        f"{len(info['episodes'])} 集，其中 {expired} 集的地址已过期需要重新解析"
+    )
+
+    # 按计划中的流选择执行
+    settings.download.streams = plan.get("streams") or settings.download.streams
+    cookie_dict = get_cookie_from_file()
+    cookie = BangumiDownloader({}, {}).convert_cookie_to_dict(
+        "; ".join([f"{k}={v}" for k, v in cookie_dict.items()])
+    )
+    download = settings.download
+    try:
+        merged_files = BangumiDownloader(
+            cookie, settings=settings
+        ).download_all_from_info_with_quality(
+            info,
+            directory or plan["directory"],
+            plan["quality"],
+            cleanup or download.cleanup_after_merge,
+            settings.network.headers,
+            downloader or download.default_downloader,
+            threads=threads or download.default_threads,
+            resolved=resolved,
+        )
+    except BiliDownloaderError as e:
+        print_error(f"执行下载计划失败: {e}")
+        raise typer.Exit(code=1) from e
+    print_success(f"下载完成，合并 {len(merged_files or [])} 个文件")
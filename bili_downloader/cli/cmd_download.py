@@ -1,9 +1,12 @@
+import json
 import os
+import sys
 from pathlib import Path
 
 import typer
 from rich.console import Console
 from rich.prompt import Confirm, Prompt
+from rich.table import Table
 
 from bili_downloader.cli.global_config import env_bool, get_cookie_from_file
 from bili_downloader.config.settings import Settings
@@ -11,6 +14,11 @@ from bili_downloader.core.bangumi_downloader import (
     QUALITY_OPTIONS,
     BangumiDownloader,
 )
+from bili_downloader.core.batch import read_url_list, run_batch
+from bili_downloader.core.clip import parse_clip
+from bili_downloader.core.download_plan import build_plan
+from bili_downloader.core.stream_selector import parse_policy
+from bili_downloader.core.transcode import TRANSCODE_PRESETS
 from bili_downloader.exceptions import (
     APIError,
     BiliDownloaderError,
@@ -128,6 +136,239 @@ def get_user_input(settings: Settings):
     return video_url, record_url, selected_qn, doclean, downloader_type, keyword
 
 
+def download_batch(
+    from_file,
+    directory,
+    cookie,
+    settings,
+    selected_qn,
+    doclean,
+    downloader_type,
+    filter_keyword,
+    threads,
+    clip_window=None,
+    urls=None,
+    all_seasons=False,
+):
+    """批量下载 URL 列表中的所有季度并输出汇总，全部成功时返回 True。"""
+    urls = list(urls or [])
+    if from_file == "-":
+        urls += read_url_list(sys.stdin)
+    elif from_file:
+        with open(from_file, encoding="utf-8") as f:
+            urls += read_url_list(f)
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        console.print("[yellow]URL 列表为空。[/yellow]")
+        return True
+
+    console.print(
+        f"批量下载 {len(urls)} 个 URL 到 {directory}，"
+        f"清晰度 {selected_qn}，使用 {downloader_type}"
+    )
+    items = run_batch(
+        urls,
+        directory,
+        lambda: BangumiDownloader(cookie, settings=settings),
+        headers=settings.network.headers,
+        workers=settings.download.batch_workers,
+        threads=threads,
+        all_seasons=all_seasons,
+        quality=selected_qn,
+        doclean=doclean,
+        downloader_type=downloader_type,
+        keyword=filter_keyword,
+        clip=clip_window,
+    )
+
+    table = Table(title="批量下载汇总")
+    table.add_column("URL", overflow="fold")
+    table.add_column("季度")
+    table.add_column("剧集", justify="right")
+    table.add_column("重复剧集", justify="right")
+    table.add_column("失败剧集", justify="right")
+    table.add_column("文件", justify="right")
+    table.add_column("状态")
+    for item in items:
+        if item.error:
+            status = f"[red]失败: {item.error}[/red]"
+        elif item.failed:
+            status = f"[red]{item.failed} 集下载失败[/red]"
+        elif item.duplicate_of:
+            status = f"[yellow]与 {item.duplicate_of} 重复，已跳过[/yellow]"
+        else:
+            status = "[green]完成[/green]"
+        table.add_row(
+            item.url,
+            item.title,
+            str(item.episodes),
+            str(item.shared),
+            str(item.failed),
+            str(len(item.files)),
+            status,
+        )
+    console.print(table)
+
+    failed = [item for item in items if item.error or item.failed]
+    total_files = sum(len(item.files) for item in items)
+    console.print(
+        f"\n共 {len(items)} 个 URL，{len(failed)} 个失败，合并 {total_files} 个文件。"
+    )
+    return not failed
+
+
+def save_history(settings, video_url, directory):
+    """把本次使用的 URL 和下载目录保存到配置文件。"""
+    if video_url:
+        settings.history.last_url = video_url
+    if directory:
+        settings.history.last_directory = directory
+    settings.save_to_file()
+
+
+def load_cookie():
+    """读取 cookie 文件，没有时提示用户粘贴 cookie。"""
+    cookie_dict = get_cookie_from_file()
+    # 如果cookie_dict为空，提示用户输入
+    if not cookie_dict:
+        cookie_str = Prompt.ask("请粘贴您的Bilibili cookie").strip()
+        if not cookie_str:
+            console.print("[red]错误: 需要Cookie。[/red]")
+            raise typer.Exit(code=1)
+        # 将cookie字符串转换为字典
+        cookie_dict = dict(
+            item.split("=", 1) for item in cookie_str.split("; ") if "=" in item
+        )
+
+    return BangumiDownloader({}, {}).convert_cookie_to_dict(
+        "; ".join([f"{k}={v}" for k, v in cookie_dict.items()])
+    )
+
+
+def require_choice(value, choices, message):
+    """value 不是有效选项时输出错误并退出。"""
+    if value not in choices:
+        console.print(f"[red]错误: {message}[/red]")
+        raise typer.Exit(code=1)
+
+
+def parse_or_exit(parse, value):
+    """使用 parse 解析命令行选项，无效时输出错误并退出。"""
+    try:
+        return parse(value)
+    except ValueError as e:
+        console.print(f"[red]错误: {e}[/red]")
+        raise typer.Exit(code=1) from e
+
+
+def apply_download_options(
+    settings,
+    stream_merge=False,
+    clip="",
+    streams="",
+    stream_policy="",
+    progressive=0,
+    transcode="",
+    lease_store="",
+    aria2_batch=False,
+):
+    """校验命令行中的下载选项并写入设置，返回解析后的片段时间窗口。"""
+    if stream_merge:
+        settings.download.stream_merge = True
+    clip_window = parse_or_exit(parse_clip, clip) if clip else None
+    if streams:
+        require_choice(
+            streams.lower(),
+            ("audio", "video", "both"),
+            "--streams 只能是 audio、video 或 both。",
+        )
+        settings.download.streams = streams.lower()
+    if stream_policy:
+        parse_or_exit(parse_policy, stream_policy)
+        settings.download.stream_policy = stream_policy
+    if progressive:
+        require_choice(
+            progressive, QUALITY_OPTIONS, "--progressive 必须是有效的清晰度代码。"
+        )
+        settings.download.progressive_quality = progressive
+    if transcode:
+        require_choice(
+            transcode,
+            TRANSCODE_PRESETS,
+            f"未知的转码预设 {transcode} (可用: {', '.join(TRANSCODE_PRESETS)})。",
+        )
+        settings.download.transcode_preset = transcode
+    if lease_store:
+        settings.download.lease_store = lease_store
+    if aria2_batch:
+        settings.download.aria2_batch = True
+    return clip_window
+
+
+def print_plan(cookie, settings, video_url, directory, selected_qn, filter_keyword):
+    """解析下载信息，把 JSON 下载计划输出到标准输出。"""
+    # 标准输出只包含计划，日志写到标准错误
+    downloader_instance = BangumiDownloader(cookie, settings=settings)
+    info = downloader_instance.get_detailed_info_from_url(
+        video_url, settings.network.headers
+    )
+    plan = build_plan(
+        downloader_instance,
+        info,
+        directory,
+        selected_qn,
+        settings.network.headers,
+        filter_keyword,
+        url=video_url,
+    )
+    sys.stdout.write(json.dumps(plan, ensure_ascii=False, indent=2) + "\n")
+
+
+def download_season(
+    cookie,
+    settings,
+    video_url,
+    directory,
+    selected_qn,
+    doclean,
+    downloader_type,
+    filter_keyword,
+    threads,
+    clip_window=None,
+):
+    """下载一个季度的所有剧集并合并。"""
+    console.print(
+        f"正在从 {video_url} 下载到 {directory}，"
+        f"清晰度 {selected_qn}，使用 {downloader_type}"
+    )
+    if filter_keyword:
+        console.print(f"使用关键字过滤剧集: {filter_keyword}")
+
+    # Create downloader instance
+    downloader_instance = BangumiDownloader(cookie, settings=settings)
+    console.print("开始获取详细信息")
+    # 使用默认头部下载
+    info = downloader_instance.get_detailed_info_from_url(
+        video_url, settings.network.headers
+    )
+    # print(f"\nget detail info: {info}")
+    # Pass the selected quality to the download function
+    merged_files = downloader_instance.download_all_from_info_with_quality(
+        info,
+        directory,
+        selected_qn,
+        doclean,
+        settings.network.headers,
+        downloader_type,
+        filter_keyword,  # Pass keyword filter
+        threads,
+        clip=clip_window,
+    )
+    console.print(f"\nDownload completed. Merged {len(merged_files)} files:")
+    for file in merged_files:
+        console.print(f"  - {file}")
+
+
 @app.command()
 def download(
     url: str = typer.Option("", "--url", "-u", help="视频URL下载"),
@@ -144,6 +385,68 @@ def download(
         "-k",
         help="关键字过滤剧集 (仅下载标题包含此关键字的剧集)",
     ),
+    stream_merge: bool = typer.Option(
+        False, "--stream-merge", help="流式合并，不写中间音视频文件"
+    ),
+    streams: str = typer.Option(
+        "", "--streams", "-s", help="需要下载的流 (audio、video 或 both)"
+    ),
+    clip: str = typer.Option(
+        "",
+        "--clip",
+        help=(
+            "只下载每集中的时间窗口 START-END (例如 1:30-2:45)，"
+            "按段索引只请求需要的字节范围"
+        ),
+    ),
+    stream_policy: str = typer.Option(
+        "",
+        "--stream-policy",
+        "-p",
+        help=(
+            "流选择策略 (default、smallest、prefer-av1、prefer-hevc、prefer-avc、"
+            "max-bitrate-under=码率kbps)"
+        ),
+    ),
+    progressive: int = typer.Option(
+        0,
+        "--progressive",
+        help="先下载并发布此清晰度 (例如 32 或 64) 的版本，再在后台下载所选清晰度替换",
+    ),
+    transcode: str = typer.Option(
+        "",
+        "--transcode",
+        help="合并后转码使用的预设 (archive-hevc、archive-av1 或 compact-avc)",
+    ),
+    from_file: str = typer.Option(
+        "",
+        "--from-file",
+        "-F",
+        help="从文件读取 URL 列表批量下载 (每行一个，- 表示标准输入)",
+    ),
+    all_seasons: bool = typer.Option(
+        False,
+        "--all-seasons",
+        help="同时下载相关季度 (续作、剧场版、OVA)，每个季度保存在单独的子目录中",
+    ),
+    plan_only: bool = typer.Option(
+        False,
+        "--plan-only",
+        help="只解析下载信息，把 JSON 下载计划输出到标准输出 (使用 apply 命令执行)",
+    ),
+    lease_store: str = typer.Option(
+        "",
+        "--lease-store",
+        help=(
+            "共享任务存储 (共享卷上的 SQLite 文件)，"
+            "多个进程同时下载时各自领取不同的剧集"
+        ),
+    ),
+    aria2_batch: bool = typer.Option(
+        False,
+        "--aria2-batch",
+        help="使用 aria2 时由一个 aria2c 进程下载整个季度的所有流",
+    ),
     verbose: bool = typer.Option(False, "--verbose", "-v", help="启用详细日志"),
 ):
     """
@@ -167,27 +470,13 @@ def download(
             configure_logger(verbose, settings.log)
 
         # Cookie
-        cookie_dict = get_cookie_from_file()
-        # 如果cookie_dict为空，提示用户输入
-        if not cookie_dict:
-            cookie_str = Prompt.ask("请粘贴您的Bilibili cookie").strip()
-            if not cookie_str:
-                console.print("[red]错误: 需要Cookie。[/red]")
-                raise typer.Exit(code=1)
-            # 将cookie字符串转换为字典
-            cookie_dict = dict(
-                item.split("=", 1) for item in cookie_str.split("; ") if "=" in item
-            )
-
-        cookie = BangumiDownloader({}, {}).convert_cookie_to_dict(
-            "; ".join([f"{k}={v}" for k, v in cookie_dict.items()])
-        )
+        cookie = load_cookie()
 
         # Input
         # 检查是否通过命令行提供了必要的参数 (url 和 directory)
         # 如果提供了，则使用命令行参数，并从 settings 或 defaults 获取其他参数的值
         # 否则，进入交互式模式
-        if url:
+        if url or from_file:
             # 使用命令行参数
             video_url = url
             default_directory = os.environ.get(
@@ -225,41 +514,64 @@ def download(
             ) = get_user_input(settings)
 
         # 保存历史记录
-        if video_url:
-            settings.history.last_url = video_url
-        if directory:
-            settings.history.last_directory = directory
-        settings.save_to_file()
-
-        console.print(
-            f"正在从 {video_url} 下载到 {directory}，清晰度 {selected_qn}，使用 {downloader_type}"
-        )
-        if filter_keyword:
-            console.print(f"使用关键字过滤剧集: {filter_keyword}")
-
-        # Create downloader instance
-        downloader_instance = BangumiDownloader(cookie)
-        console.print("开始获取详细信息")
-        # 使用默认头部下载
-        info = downloader_instance.get_detailed_info_from_url(
-            video_url, settings.network.headers
+        save_history(settings, video_url, directory)
+        clip_window = apply_download_options(
+            settings,
+            stream_merge=stream_merge,
+            clip=clip,
+            streams=streams,
+            stream_policy=stream_policy,
+            progressive=progressive,
+            transcode=transcode,
+            lease_store=lease_store,
+            aria2_batch=aria2_batch,
         )
-        # print(f"\nget detail info: {info}")
-        # Pass the selected quality to the download function
-        merged_files = downloader_instance.download_all_from_info_with_quality(
-            info,
+
+        if plan_only:
+            if from_file or all_seasons or clip_window:
+                console.print(
+                    "[red]错误: --plan-only 不能与 --from-file、--all-seasons "
+                    "或 --clip 同时使用。[/red]"
+                )
+                raise typer.Exit(code=1)
+            print_plan(
+                cookie, settings, video_url, directory, selected_qn, filter_keyword
+            )
+            return
+
+        if from_file or all_seasons:
+            if not download_batch(
+                from_file,
+                directory,
+                cookie,
+                settings,
+                selected_qn,
+                doclean,
+                downloader_type,
+                filter_keyword,
+                threads,
+                clip_window,
+                urls=[video_url] if video_url else [],
+                all_seasons=all_seasons,
+            ):
+                raise typer.Exit(code=1)
+            return
+
+        download_season(
+            cookie,
+            settings,
+            video_url,
             directory,
             selected_qn,
             doclean,
-            settings.network.headers,
             downloader_type,
-            filter_keyword,  # Pass keyword filter
+            filter_keyword,
             threads,
+            clip_window,
         )
-        console.print(f"\nDownload completed. Merged {len(merged_files)} files:")
-        for file in merged_files:
-            console.print(f"  - {file}")
 
+    except typer.Exit:
+        raise
     except KeyboardInterrupt:
         console.print("\n[yellow]下载被用户中断。[/yellow]")
         logger.info("Download interrupted by user")
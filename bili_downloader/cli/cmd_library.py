@@ -0,0 +1,60 @@
+"""
+媒体库索引命令模块
+"""
+
+import os
+import sqlite3
+from typing import Annotated
+
+import typer
+
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.library_index import LibraryIndex
+from bili_downloader.utils.logger import logger
+from bili_downloader.utils.print_utils import print_error, print_info, print_success
+
+app = typer.Typer()
+
+
+@app.command()
+def library(
+    directories: Annotated[
+        list[str] | None, typer.Argument(help="需要扫描的下载目录")
+    ] = None,
+    rebuild: bool = typer.Option(
+        False, "--rebuild", "-r", help="扫描目录中的下载清单重建媒体库索引"
+    ),
+    workers: int = typer.Option(
+        0, "--workers", "-w", help="并行读取清单的线程数 (默认按 CPU 数量)"
+    ),
+):
+    """
+    管理媒体库索引
+
+    媒体库索引记录已校验的音视频流，下载其他目录中已有的相同剧集时
+    直接链接而不重新下载。不带参数时显示索引状态；使用 --rebuild
+    扫描指定目录 (默认为上次的下载目录) 重建索引。
+    """
+    from bili_downloader.cli.global_config import _global_cli_args
+
+    settings = _global_cli_args.get("settings") or Settings.load_from_file()
+    index = LibraryIndex.from_settings(settings)
+    try:
+        if rebuild:
+            roots = directories or [settings.history.last_directory]
+            roots = [root for root in roots if root]
+            missing = [root for root in roots if not os.path.isdir(root)]
+            if not roots or missing:
+                print_error(f"目录不存在: {', '.join(missing) or '(未指定)'}")
+                raise typer.Exit(code=1)
+            count = index.rebuild(roots, workers=workers or os.cpu_count() or 4)
+            print_success(f"媒体库索引已重建，共 {count} 个流文件")
+        else:
+            print_info(f"媒体库索引: {index.path}")
+            print_info(f"已索引的流文件: {index.count()}")
+    except (OSError, sqlite3.Error) as e:
+        logger.error("媒体库索引操作失败", error=str(e))
+        print_error(f"媒体库索引操作失败: {e}")
+        raise typer.Exit(code=1) from e
+    finally:
+        index.close()
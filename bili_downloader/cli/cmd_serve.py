@@ -0,0 +1,50 @@
+"""
+服务命令模块
+"""
+
+import typer
+
+from bili_downloader.cli.global_config import get_cookie_from_file
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.bangumi_downloader import BangumiDownloader
+from bili_downloader.core.server import JobManager, JobServer
+from bili_downloader.utils.print_utils import print_info, print_warning
+
+app = typer.Typer()
+
+
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", "--host", help="监听地址"),
+    port: int = typer.Option(8765, "--port", "-p", help="监听端口"),
+    workers: int = typer.Option(2, "--workers", "-w", help="同时执行的任务数"),
+):
+    """
+    以服务方式运行，通过本地 HTTP 接口提交和管理下载任务
+
+    接口没有认证，默认只监听 127.0.0.1。所有任务共享 API 连接池、季度
+    缓存和启动时查找到的外部工具。
+    """
+    from bili_downloader.cli.global_config import _global_cli_args
+
+    settings = _global_cli_args.get("settings") or Settings.load_from_file()
+    cookie_dict = get_cookie_from_file()
+    cookie = BangumiDownloader({}, {}).convert_cookie_to_dict(
+        "; ".join([f"{k}={v}" for k, v in cookie_dict.items()])
+    )
+    if host not in ("127.0.0.1", "localhost", "::1"):
+        print_warning(f"任务接口没有认证，正在监听非本地地址 {host}")
+
+    manager = JobManager(
+        BangumiDownloader(cookie, settings=settings), settings, workers
+    )
+    server = JobServer(manager, host, port)
+    manager.start()
+    print_info(f"任务接口已启动: {server.url} ({workers} 个工作线程)，按 Ctrl-C 退出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print_warning("正在停止服务")
+    finally:
+        server.server_close()
+        manager.stop(timeout=5)
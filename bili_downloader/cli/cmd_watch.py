@@ -0,0 +1,148 @@
+"""
+订阅命令模块
+"""
+
+import time
+
+import typer
+
+from bili_downloader.cli.global_config import get_cookie_from_file
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.bangumi_downloader import BangumiDownloader
+from bili_downloader.core.batch import season_title
+from bili_downloader.core.subscriptions import (
+    Subscription,
+    SubscriptionStore,
+    Watcher,
+)
+from bili_downloader.exceptions import BiliDownloaderError
+from bili_downloader.utils.print_utils import (
+    print_error,
+    print_info,
+    print_success,
+    print_warning,
+)
+
+app = typer.Typer()
+
+
+def add_subscription(store, downloader, settings, url, directory, quality):
+    """
+    获取季度信息并保存订阅
+    """
+    target = directory or settings.history.last_directory
+    if not target:
+        print_error("请使用 --directory 指定订阅的下载目录")
+        raise typer.Exit(code=1)
+    try:
+        info = downloader.get_detailed_info_from_url(url, settings.network.headers)
+    except (BiliDownloaderError, ValueError) as e:
+        print_error(f"无法获取季度信息: {e}")
+        raise typer.Exit(code=1) from e
+    subscription = Subscription(
+        season_id=info["season_id"],
+        url=url,
+        directory=target,
+        quality=quality or settings.download.default_quality,
+        title=season_title(info),
+    )
+    store.add(subscription)
+    store.save()
+    print_success(f"已订阅: {subscription.title} (season_id={subscription.season_id})")
+
+
+def remove_subscription(store, season_id):
+    """
+    取消指定 season_id 的订阅
+    """
+    if store.remove(season_id):
+        store.save()
+        print_success(f"已取消订阅 season_id={season_id}")
+    else:
+        print_warning(f"没有找到订阅 season_id={season_id}")
+
+
+def print_subscriptions(subscriptions):
+    """
+    打印订阅列表及其状态
+    """
+    if not subscriptions:
+        print_info("没有订阅")
+    for s in subscriptions:
+        status = "已完结" if s.finished else "连载中"
+        next_poll = time.strftime("%Y-%m-%d %H:%M", time.localtime(s.next_poll))
+        print_info(
+            f"{s.season_id} {s.title} [{status}] 已完成 {len(s.episodes)} 集，"
+            f"下次检查 {next_poll} -> {s.directory}"
+            + (f" (上次错误: {s.last_error})" if s.last_error else "")
+        )
+
+
+@app.command()
+def watch(
+    add: str = typer.Option("", "--add", "-a", help="订阅季度 (番剧或剧集 URL)"),
+    directory: str = typer.Option("", "--directory", "-d", help="订阅的下载目录"),
+    quality: int = typer.Option(0, "--quality", "-q", help="订阅的视频清晰度"),
+    remove: int = typer.Option(0, "--remove", help="取消订阅指定 season_id"),
+    list_subscriptions: bool = typer.Option(False, "--list", "-l", help="列出所有订阅"),
+    once: bool = typer.Option(
+        False, "--once", help="只检查一次到期的订阅后退出 (适合 cron)"
+    ),
+):
+    """
+    订阅季度并自动下载新剧集
+
+    订阅保存在配置目录的 subscriptions.json 中。每次检查只请求一次季度
+    信息，与已完成的剧集比较后只下载新增或重新上传的剧集。不带 --once
+    时持续运行，按各订阅的检查时间休眠。
+    """
+    from bili_downloader.cli.global_config import _global_cli_args
+
+    settings = _global_cli_args.get("settings") or Settings.load_from_file()
+    store = SubscriptionStore.from_settings(settings)
+    cookie_dict = get_cookie_from_file()
+    cookie = BangumiDownloader({}, {}).convert_cookie_to_dict(
+        "; ".join([f"{k}={v}" for k, v in cookie_dict.items()])
+    )
+    headers = settings.network.headers
+
+    def create_downloader():
+        return BangumiDownloader(cookie, settings=settings)
+
+    if add:
+        add_subscription(store, create_downloader(), settings, add, directory, quality)
+        return
+
+    if remove:
+        remove_subscription(store, remove)
+        return
+
+    subscriptions = store.all()
+    if list_subscriptions:
+        print_subscriptions(subscriptions)
+        return
+
+    if not subscriptions:
+        print_warning("没有订阅，请先使用 --add 添加")
+        return
+
+    watcher = Watcher(
+        store,
+        create_downloader,
+        settings,
+        headers=headers,
+        download_options={
+            "doclean": settings.download.cleanup_after_merge,
+            "downloader_type": settings.download.default_downloader,
+            "threads": settings.download.default_threads,
+        },
+    )
+    try:
+        if once:
+            completed = watcher.run_once()
+            print_success(f"检查完成，新下载 {completed} 集")
+        else:
+            print_info(f"开始监视 {len(subscriptions)} 个订阅，按 Ctrl-C 退出")
+            watcher.run_forever()
+    except KeyboardInterrupt:
+        print_warning("已停止监视")
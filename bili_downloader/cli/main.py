@@ -2,9 +2,13 @@
 
 import typer
 
+from bili_downloader.cli.cmd_apply import apply
 from bili_downloader.cli.cmd_download import download
+from bili_downloader.cli.cmd_library import library
 from bili_downloader.cli.cmd_login import login
 from bili_downloader.cli.cmd_search import search
+from bili_downloader.cli.cmd_serve import serve
+from bili_downloader.cli.cmd_watch import watch
 from bili_downloader.cli.global_config import _global_cli_args, setup_global_config
 
 app = typer.Typer()
@@ -13,6 +17,10 @@ app = typer.Typer()
 app.command()(download)
 app.command()(login)
 app.command()(search)
+app.command()(library)
+app.command()(watch)
+app.command()(serve)
+app.command()(apply)
 
 
 # 添加全局选项
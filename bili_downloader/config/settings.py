@@ -35,6 +35,151 @@ class DownloadSettings(BaseModel):
     cleanup_after_merge: bool = Field(
         default=False, description="合并后是否清理原始音视频文件"
     )
+    probe_mirrors: bool = Field(
+        default=True, description="下载前对主/备用镜像测速，优先使用最快的节点"
+    )
+    multi_source: bool = Field(
+        default=False, description="同时从多个镜像分段下载同一个文件"
+    )
+    max_mirrors: int = Field(default=4, description="多源下载时最多使用的镜像数量")
+    mirror_min_speed: int = Field(
+        default=0,
+        description=(
+            "单个连接的最低速度(KiB/s)，低于此值的镜像连接会被丢弃，0 表示不限制"
+        ),
+    )
+    stall_min_speed: int = Field(
+        default=16,
+        description=(
+            "停滞判定的吞吐量下限(KiB/s)，持续低于此值的下载会被终止并重试，0 表示禁用"
+        ),
+    )
+    stall_window: int = Field(
+        default=60, description="停滞判定的时间窗口(秒)，0 表示禁用"
+    )
+    batch_workers: int = Field(
+        default=2, description="批量下载 (--from-file) 时同时下载的季度数"
+    )
+    verify_downloads: bool = Field(
+        default=True, description="下载完成后按文件大小和段索引校验每个音视频流"
+    )
+    verify_hash: bool = Field(
+        default=False, description="校验时计算 SHA-256 并记录到下载清单中"
+    )
+    verify_retries: int = Field(
+        default=2, description="流文件校验失败时单独重新下载该流的次数"
+    )
+    streams: str = Field(
+        default="both", description="需要下载的流 (audio、video 或 both)"
+    )
+    single_stream_remux: bool = Field(
+        default=True,
+        description="只下载音频或视频时封装为独立的 m4a/mp4 文件，否则保留原始流文件",
+    )
+    stream_policy: str = Field(
+        default="default",
+        description=(
+            "音视频流选择策略 (default、smallest、prefer-av1、prefer-hevc、"
+            "prefer-avc 或 max-bitrate-under=码率kbps)"
+        ),
+    )
+    progressive_quality: int = Field(
+        default=0,
+        description=(
+            "渐进式下载：先下载并发布此清晰度 (例如 32 或 64) 的版本，"
+            "再在后台下载所选清晰度替换，0 表示禁用"
+        ),
+    )
+    native_remux: bool = Field(
+        default=True, description="优先使用内置封装器合并 DASH 流，不支持时使用 ffmpeg"
+    )
+    merge_nice: int = Field(
+        default=0, description="合并进程的 nice 值，0 表示不调整"
+    )
+    merge_ionice_class: int = Field(
+        default=0,
+        description="合并进程的 ionice 调度类别 (2 尽力而为, 3 空闲)，0 表示不调整",
+    )
+    stream_merge: bool = Field(
+        default=False,
+        description=(
+            "将音视频流直接送入 ffmpeg 合并，不写中间文件 (需要续传时自动改用文件方式)"
+        ),
+    )
+    transcode_preset: str = Field(
+        default="",
+        description=(
+            "合并后转码使用的预设 (archive-hevc、archive-av1 或 compact-avc)，"
+            "为空表示不转码"
+        ),
+    )
+    transcode_args: str = Field(
+        default="", description="自定义 ffmpeg 编码参数，设置后代替预设中的参数"
+    )
+    transcode_workers: int = Field(
+        default=0, description="同时运行的转码进程数，0 表示按容器可用的 CPU 数量"
+    )
+    transcode_replace: bool = Field(
+        default=False,
+        description="转码完成后替换合并文件，否则另存为 名称.预设.mkv",
+    )
+    transcode_nice: int = Field(default=10, description="转码进程的 nice 值")
+    transcode_ionice_class: int = Field(
+        default=3, description="转码进程的 ionice 调度类别 (3 表示空闲时才进行 IO)"
+    )
+    scratch_dir: str = Field(
+        default="",
+        description=(
+            "音视频流的下载和合并目录 (例如本地磁盘)，只有合并后的文件会放到下载目录"
+        ),
+    )
+    disk_check: str = Field(
+        default="warn",
+        description="下载前估算磁盘空间，不足时的处理方式 (warn、refuse 或 off)",
+    )
+    disk_reserve_mb: int = Field(
+        default=1024, description="估算磁盘空间时需要保留的空闲空间(MiB)"
+    )
+    preallocate: bool = Field(
+        default=True, description="aria2 下载时使用 fallocate 预分配文件空间"
+    )
+    validate_outputs: bool = Field(
+        default=True, description="跳过已存在的合并文件前校验其时长和流数量"
+    )
+    validate_tolerance: float = Field(
+        default=5.0, description="合并文件时长与剧集时长允许的最小误差(秒)"
+    )
+    library_index: bool = Field(
+        default=True,
+        description="在配置目录的媒体库索引中记录已校验的流，其他目录已有相同的流时直接复用",
+    )
+    library_link: str = Field(
+        default="auto",
+        description="复用媒体库中的流文件的方式 (auto、hardlink 或 reflink)",
+    )
+    lease_store: str = Field(
+        default="",
+        description=(
+            "共享任务存储 (共享卷上的 SQLite 文件)，"
+            "多个进程下载同一季度时各自领取不同的剧集，为空表示禁用"
+        ),
+    )
+    lease_seconds: int = Field(
+        default=300, description="剧集租约时长(秒)，进程失联超过此时间后其他进程接管"
+    )
+    lease_attempts: int = Field(
+        default=3, description="每一集最多尝试的次数，超过后在共享任务存储中标记为失败"
+    )
+    aria2_batch: bool = Field(
+        default=False,
+        description=(
+            "使用 aria2 时由一个 aria2c 进程下载整个季度的所有流，"
+            "每集的流下载完成后立即合并"
+        ),
+    )
+    aria2_batch_jobs: int = Field(
+        default=4, description="批量下载时同时下载的文件数 (aria2c -j)"
+    )
 
 
 class LoginSettings(BaseModel):
@@ -66,6 +211,38 @@ class NetworkSettings(BaseModel):
         }
 
 
+class CdnSettings(BaseModel):
+    """CDN 节点选择设置"""
+
+    preferred_hosts: list[str] = Field(
+        default=["upos-sz-*"],
+        description="首选主机列表，支持通配符，越靠前优先级越高",
+    )
+    pinned_hosts: list[str] = Field(
+        default=[], description="固定使用的主机，upos 地址会被改写到这些主机上"
+    )
+    blocked_hosts: list[str] = Field(
+        default=[], description="屏蔽的主机列表，支持通配符 (例如 *.mcdn.bilivideo.cn)"
+    )
+    rewrite_hosts: bool = Field(
+        default=False, description="是否把 upos 地址改写到首选列表中的具体主机上"
+    )
+    demote_ratio: float = Field(
+        default=0.5, description="评分低于最佳主机该比例的主机会被降级"
+    )
+    stats_max_age_days: int = Field(default=7, description="历史评分的有效天数")
+
+
+class WatchSettings(BaseModel):
+    """订阅检查设置"""
+
+    interval: int = Field(default=1800, description="连载中季度的检查间隔(秒)")
+    max_interval: int = Field(
+        default=7 * 24 * 3600, description="已完结季度检查间隔的上限(秒)"
+    )
+    jitter: float = Field(default=0.1, description="检查时间的随机抖动比例")
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -79,6 +256,8 @@ class Settings(BaseSettings):
     login: LoginSettings = LoginSettings()
     history: HistorySettings = HistorySettings()
     network: NetworkSettings = NetworkSettings()
+    cdn: CdnSettings = CdnSettings()
+    watch: WatchSettings = WatchSettings()
 
     def model_post_init(self, __context) -> None:
         self.login.default_output = str(self.get_env_cookie_file_path())
@@ -181,16 +360,17 @@ class Settings(BaseSettings):
 
             # 创建实例并应用配置文件中的设置
             settings = cls()
-            if "log" in config_data:
-                settings.log = LogSettings(**config_data["log"])
-            if "download" in config_data:
-                settings.download = DownloadSettings(**config_data["download"])
-            if "login" in config_data:
-                settings.login = LoginSettings(**config_data["login"])
-            if "history" in config_data:
-                settings.history = HistorySettings(**config_data["history"])
-            if "network" in config_data:
-                settings.network = NetworkSettings(**config_data["network"])
+            for section, model in (
+                ("log", LogSettings),
+                ("download", DownloadSettings),
+                ("login", LoginSettings),
+                ("history", HistorySettings),
+                ("network", NetworkSettings),
+                ("cdn", CdnSettings),
+                ("watch", WatchSettings),
+            ):
+                if section in config_data:
+                    setattr(settings, section, model(**config_data[section]))
 
             # 在model_post_init中会设置login.default_output的正确值
             settings.model_post_init(None)
@@ -234,6 +414,8 @@ class Settings(BaseSettings):
                 "login": self.login.model_dump(),
                 "history": self.history.model_dump(),
                 "network": self.network.model_dump(),
+                "cdn": self.cdn.model_dump(),
+                "watch": self.watch.model_dump(),
             }
 
             with open(config_file, "w", encoding="utf-8") as f:
@@ -1,17 +1,51 @@
+import hashlib
 import json
 import os
 import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
 import requests
 
 from bili_downloader.config.settings import Settings
-from bili_downloader.core.downloader_aria2 import DownloaderAria2
-from bili_downloader.core.downloader_axel import DownloaderAxel
+from bili_downloader.core.cdn_policy import CdnPolicy
+from bili_downloader.core.clip import plan_clip, write_clip
+from bili_downloader.core.dir_snapshot import DirSnapshot
+from bili_downloader.core.downloader_aria2 import (
+    Aria2Batch,
+    Aria2Entry,
+    DownloaderAria2,
+)
+from bili_downloader.core.downloader_axel import RESUME_META_SUFFIX, DownloaderAxel
+from bili_downloader.core.integrity import hash_file, verify_stream_file
+from bili_downloader.core.leases import EpisodeClaims
+from bili_downloader.core.library_index import LibraryEntry, LibraryIndex
+from bili_downloader.core.manifest import DownloadManifest
+from bili_downloader.core.mirror import get_stream_urls, rank_mirrors
+from bili_downloader.core.output_validator import OutputValidator, merge_temp_path
+from bili_downloader.core.planner import free_space, plan_disk_usage, stream_bandwidth
+from bili_downloader.core.remux import remux
+from bili_downloader.core.stream_merge import StreamingMerger
+from bili_downloader.core.stream_merge import is_supported as stream_merge_supported
+from bili_downloader.core.stream_selector import (
+    SelectionPolicy,
+    parse_policy,
+    select_streams,
+)
+from bili_downloader.core.transcode import Transcoder
 from bili_downloader.core.vamerger import VAMerger
-from bili_downloader.exceptions import APIError, DownloadError, MergeError
+from bili_downloader.exceptions import (
+    APIError,
+    DownloadError,
+    MergeError,
+    RemuxError,
+)
+from bili_downloader.utils.fileops import link_file, place_file
 from bili_downloader.utils.logger import logger
-from bili_downloader.utils.print_utils import print_warning
+from bili_downloader.utils.print_utils import print_info, print_warning
 
 # 默认质量和格式参数
 DEFAULT_QN = 112
@@ -37,14 +71,153 @@ QUALITY_OPTIONS = {
 # 默认下载器类型
 DEFAULT_DOWNLOADER = "aria2"  # 或 "axel"
 
+# 只下载一个流时封装成的独立文件格式
+SINGLE_STREAM_EXTENSIONS = {"audio": ".m4a", "video": ".mp4"}
+
+
+def choose_preview_quality(available, target, preferred):
+    """
+    从清晰度阶梯中选择渐进式下载先发布的低清晰度
+
+    只考虑 QUALITY_OPTIONS 中、playurl 的 support_formats 提供的、低于目标
+    清晰度的档位：优先选择不高于 preferred 的最高档位，没有时选择最低档位。
+
+    Returns:
+        int | None: 清晰度 (qn)，没有比目标更低的档位时为 None
+    """
+    ladder = [
+        qn for qn in sorted(QUALITY_OPTIONS) if qn in set(available) and qn < target
+    ]
+    if not ladder:
+        return None
+    below = [qn for qn in ladder if qn <= preferred]
+    return below[-1] if below else ladder[0]
+
 
 class BangumiDownloader:
     """Bilibili 番剧下载器类"""
 
-    def __init__(self, cookie, headers=None):
+    def __init__(self, cookie, headers=None, settings=None, session=None):
         """初始化下载器"""
         self.cookie = cookie
         self.headers = headers if headers is not None else {}
+        self.settings = settings if settings is not None else Settings()
+        # API 请求复用连接池
+        self.session = session if session is not None else requests.Session()
+        self._cdn_policy = None
+        # 镜像测速时得到的流文件大小，按流的主地址索引
+        self._remote_sizes = {}
+        # 下载过程中使用的目录快照，按目录绝对路径索引
+        self._snapshots = {}
+        self._library = None
+        # 季度信息缓存，按 season_id 索引
+        self._season_cache = {}
+        self._season_lock = threading.Lock()
+        # 最近一次 get_bangumi_downloads 的流选择结果
+        self.last_stream_choice = None
+        # 当前下载运行领取剧集使用的共享任务队列
+        self._claims = None
+
+    def fork(self):
+        """
+        创建一个共享会话、季度缓存、CDN 策略和媒体库索引的新实例
+
+        每次下载运行的状态 (目录快照、流选择结果) 属于各自的实例，
+        多个任务可以在不同线程中同时运行。
+        """
+        other = type(self)(
+            self.cookie, self.headers, self.settings, session=self.session
+        )
+        other._cdn_policy = self.cdn_policy
+        other._library = self.library or False
+        other._season_cache = self._season_cache
+        other._season_lock = self._season_lock
+        return other
+
+    @property
+    def cdn_policy(self):
+        """按需加载 CDN 策略 (包含持久化的主机评分)。"""
+        if self._cdn_policy is None:
+            self._cdn_policy = CdnPolicy.from_settings(self.settings)
+        return self._cdn_policy
+
+    @property
+    def streams_mode(self):
+        """需要下载的流 (audio、video 或 both)。"""
+        mode = (self.settings.download.streams or "both").lower()
+        if mode not in ("audio", "video", "both"):
+            logger.warning("无效的 streams 设置，下载音频和视频", streams=mode)
+            return "both"
+        return mode
+
+    @property
+    def stream_policy(self):
+        """解析配置的流选择策略，无法识别时使用默认策略。"""
+        try:
+            return parse_policy(self.settings.download.stream_policy)
+        except ValueError as e:
+            logger.warning("流选择策略无效，使用默认策略", error=str(e))
+            return SelectionPolicy()
+
+    @property
+    def library(self):
+        """按需打开媒体库索引，未启用或无法打开时为 None。"""
+        if self._library is None:
+            self._library = False
+            if self.settings.download.library_index:
+                try:
+                    self._library = LibraryIndex.from_settings(self.settings)
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning("无法打开媒体库索引", error=str(e))
+        return self._library or None
+
+    def snapshot_directory(self, directory):
+        """扫描目录，之后该目录中的存在性检查从快照中回答。"""
+        snapshot = DirSnapshot(directory)
+        self._snapshots[snapshot.directory] = snapshot
+        return snapshot
+
+    def _snapshot_for(self, path):
+        return self._snapshots.get(os.path.dirname(os.path.abspath(path)))
+
+    def path_exists(self, path):
+        """判断文件是否存在，目录已有快照时不访问文件系统。"""
+        snapshot = self._snapshot_for(path)
+        if snapshot is None:
+            return os.path.exists(path)
+        return snapshot.exists(path)
+
+    def remove_path(self, path):
+        """删除存在的文件并更新快照。"""
+        snapshot = self._snapshot_for(path)
+        if snapshot is not None:
+            return snapshot.remove(path)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True
+
+    def check_claim(self, *discard):
+        """
+        从共享任务队列领取的剧集被其他进程接管时中止，不再下载或放置文件
+
+        中止前删除 discard 中的临时文件。
+
+        Raises:
+            LeaseLostError: 租约已被其他进程接管
+        """
+        if self._claims is None or not self._claims.lost:
+            return
+        for path in discard:
+            self.remove_path(path)
+        self._claims.check()
+
+    def refresh_paths(self, *paths):
+        """外部进程 (下载器、ffmpeg) 可能创建或删除了这些文件，重新检查。"""
+        for path in paths:
+            snapshot = self._snapshot_for(path)
+            if snapshot is not None:
+                snapshot.update(path)
 
     def convert_cookie_to_dict(self, cookie):
         """将 Cookie 字符串转换为字典。"""
@@ -107,7 +280,7 @@ class BangumiDownloader:
 
         params = {"media_id": media_id}
         try:
-            response = requests.get(
+            response = self.session.get(
                 "https://api.bilibili.com/pgc/review/user",
                 params=params,
                 headers=headers,
@@ -153,7 +326,7 @@ class BangumiDownloader:
 
         params = {"season_id": season_id}
         try:
-            response = requests.get(
+            response = self.session.get(
                 "https://api.bilibili.com/pgc/view/web/season",
                 params=params,
                 headers=headers,
@@ -198,7 +371,7 @@ class BangumiDownloader:
         logger.info(f"Headers are {headers}")
         params = {"ep_id": ep_id}
         try:
-            response = requests.get(
+            response = self.session.get(
                 "https://api.bilibili.com/pgc/view/web/season",
                 params=params,
                 headers=headers,
@@ -245,14 +418,30 @@ class BangumiDownloader:
                 raise ValueError("Could not extract media ID from the URL.")
             logger.info("Extracted media_id", media_id=media_id)
             season_id = self.get_bangumi_info(media_id, headers)["season_id"]
-            return self.get_bangumi_info_by_season_id(season_id, headers)
+            return self.get_season_info(season_id, headers)
         else:
             # 假设是剧集URL
             ep_id = self.get_numbers_in_str(path)
             if not ep_id:
                 raise ValueError("Could not extract episode ID from the URL.")
             logger.info("Extracted ep_id", ep_id=ep_id)
-            return self.get_bangumi_info_by_ep_id(ep_id, headers)
+            return self.cache_season(self.get_bangumi_info_by_ep_id(ep_id, headers))
+
+    def cache_season(self, info):
+        """把季度信息放入缓存，返回 info。"""
+        season_id = (info or {}).get("season_id")
+        if season_id:
+            with self._season_lock:
+                self._season_cache[season_id] = info
+        return info
+
+    def get_season_info(self, season_id, headers=None):
+        """获取季度信息，同一次运行中已经获取过的季度直接从缓存返回。"""
+        with self._season_lock:
+            info = self._season_cache.get(season_id)
+        if info is not None:
+            return info
+        return self.cache_season(self.get_bangumi_info_by_season_id(season_id, headers))
 
     def get_bangumi_download_info(self, aid, cid, qn=DEFAULT_QN, headers=None):
         """获取特定视频的下载信息。"""
@@ -267,7 +456,7 @@ class BangumiDownloader:
 
         params = {"aid": aid, "cid": cid, "qn": qn, "fnval": DEFAULT_FNVAL}
         try:
-            response = requests.get(
+            response = self.session.get(
                 "https://api.bilibili.com/pgc/player/web/playurl",
                 headers=headers,
                 params=params,
@@ -314,8 +503,14 @@ class BangumiDownloader:
 
         return filename
 
-    def get_bangumi_downloads(self, aid, cid, qn=DEFAULT_QN, headers=None):
-        """获取视频和音频的下载链接列表。"""
+    def get_bangumi_downloads(
+        self, aid, cid, qn=DEFAULT_QN, headers=None, duration=0.0
+    ):
+        """
+        获取视频和音频的下载链接列表。
+
+        视频流和音频流按 ``stream_policy`` 选择，duration (秒) 用于估算字节数。
+        """
         if headers is None:
             headers = {}
         try:
@@ -354,19 +549,23 @@ class BangumiDownloader:
             audios = downinfo["audio"]
             videos = downinfo["video"]
 
-            video = next(
-                (
-                    f
-                    for f in videos
-                    if (f["id"] == quality and f["codecs"] == first_codecs)
-                ),
-                None,
+            choice = select_streams(
+                videos,
+                audios,
+                quality,
+                self.stream_policy,
+                preferred_codecs=first_codecs,
+                duration=duration,
             )
-            audio = max(audios, key=lambda x: x["id"])
-
-            # print(f"selected_format: {selected_format}")
-            # print(f"video: {video}")
-            # print(f"audio: {audio}")
+            self.last_stream_choice = choice
+            video, audio = choice.video, choice.audio
+            if video is not None and video["id"] != quality:
+                # 码率上限使策略选择了更低的清晰度
+                selected_format = next(
+                    (f for f in support_formats if f["quality"] == video["id"]),
+                    selected_format,
+                )
+            logger.info("流选择", aid=aid, cid=cid, choice=choice.describe())
 
             # 返回URL列表
             return (selected_format, video, audio)
@@ -374,6 +573,886 @@ class BangumiDownloader:
             logger.error("解析下载URL时出错", aid=aid, cid=cid, error=str(e))
             raise DownloadError(f"解析下载URL时出错 aid={aid}, cid={cid}: {e}") from e
 
+    def select_stream_urls(self, stream, headers=None):
+        """按 CDN 策略改写地址并对镜像测速，返回按优先级排序的地址列表。"""
+        policy = self.cdn_policy
+        urls = policy.order(policy.rewrite(get_stream_urls(stream)))
+        download_settings = self.settings.download
+        if not download_settings.probe_mirrors or len(urls) <= 1:
+            return urls
+
+        probes = rank_mirrors(urls, headers)
+        for probe in probes:
+            if probe.ok:
+                policy.record(probe.url, probe.throughput, probe.ttfb)
+        policy.save()
+
+        # 所有镜像报告的大小一致时才作为校验依据
+        sizes = {p.total_size for p in probes if p.ok and p.total_size}
+        if len(sizes) == 1:
+            self._remote_sizes[self._stream_key(stream)] = sizes.pop()
+
+        ranked = policy.order([p.url for p in probes if p.ok])
+        if not ranked:
+            logger.warning("所有镜像测速均失败，按原始顺序下载", count=len(urls))
+            return urls
+
+        logger.info(
+            "已选择镜像",
+            host=urlparse(ranked[0]).netloc,
+            mirrors=len(ranked),
+        )
+        if download_settings.multi_source:
+            return ranked[: max(1, download_settings.max_mirrors)]
+        return ranked
+
+    @staticmethod
+    def _stream_key(stream):
+        return stream.get("base_url") or stream.get("baseUrl") or ""
+
+    def check_stream(self, stream, dest, manifest=None, stream_info=None):
+        """
+        校验流文件的完整性，通过后记录到下载清单。
+
+        返回 True 表示文件完整 (或未启用校验)。
+        """
+        download_settings = self.settings.download
+        if not download_settings.verify_downloads:
+            return True
+
+        expected_size = self._remote_sizes.get(self._stream_key(stream), 0)
+        ok, reason = verify_stream_file(dest, stream, expected_size)
+        if not ok:
+            logger.warning("流文件校验失败", dest=dest, reason=reason)
+            return False
+
+        if manifest is not None:
+            stat = os.stat(dest)
+            entry = manifest.get_stream(dest) or {}
+            sha256 = None
+            if download_settings.verify_hash:
+                # 大小和修改时间都没有变化时复用之前计算的哈希值
+                unchanged = (
+                    entry.get("size") == stat.st_size
+                    and entry.get("mtime") == stat.st_mtime
+                )
+                sha256 = entry.get("sha256") if unchanged else None
+                sha256 = sha256 or hash_file(dest)
+            manifest.record_stream(
+                dest,
+                size=stat.st_size,
+                mtime=stat.st_mtime,
+                sha256=sha256,
+                **(stream_info or {}),
+            )
+            self.record_library_stream(dest, stat, sha256, stream_info)
+        return True
+
+    def record_library_stream(self, dest, stat, sha256=None, stream_info=None):
+        """把已校验的流文件记录到媒体库索引。"""
+        stream_info = stream_info or {}
+        library = self.library
+        if library is None or not stream_info.get("cid"):
+            return
+        try:
+            library.record(
+                LibraryEntry(
+                    path=dest,
+                    cid=stream_info["cid"],
+                    stream_id=stream_info.get("stream_id"),
+                    codecs=stream_info.get("codecs", ""),
+                    quality=stream_info.get("quality"),
+                    kind=stream_info.get("kind", ""),
+                    size=stat.st_size,
+                    mtime=stat.st_mtime,
+                    sha256=sha256,
+                )
+            )
+        except sqlite3.Error as e:
+            logger.warning("无法更新媒体库索引", dest=dest, error=str(e))
+
+    def reuse_library_stream(self, stream, dest, manifest=None, stream_info=None):
+        """
+        其他目录中已有相同的流时通过硬链接或 reflink 复用。
+
+        返回 True 表示 dest 已经是校验通过的完整文件。
+        """
+        stream_info = stream_info or {}
+        library = self.library
+        if library is None or not stream_info.get("cid"):
+            return False
+        try:
+            entry = library.find(
+                stream_info["cid"],
+                stream_info.get("stream_id"),
+                stream_info.get("codecs", ""),
+                stream_info.get("quality"),
+                exclude=dest,
+            )
+        except sqlite3.Error as e:
+            logger.warning("无法查询媒体库索引", error=str(e))
+            return False
+        if entry is None:
+            return False
+
+        method = link_file(entry.path, dest, self.settings.download.library_link)
+        self.refresh_paths(dest)
+        if method is None:
+            logger.debug("无法链接媒体库中的流文件", src=entry.path, dest=dest)
+            return False
+        logger.info("复用媒体库中的流文件", src=entry.path, dest=dest, method=method)
+
+        if manifest is not None and entry.sha256:
+            # 链接保留了大小和修改时间，校验时可以直接使用已记录的哈希值
+            manifest.record_stream(
+                dest,
+                size=entry.size,
+                mtime=entry.mtime,
+                sha256=entry.sha256,
+                **stream_info,
+            )
+        if self.check_stream(stream, dest, manifest, stream_info):
+            return True
+        self.discard_stream(dest, manifest)
+        return False
+
+    def discard_stream(self, dest, manifest=None):
+        """删除损坏的流文件及其下载控制文件。"""
+        for path in (dest, dest + ".st", dest + RESUME_META_SUFFIX, dest + ".aria2"):
+            self.remove_path(path)
+        if manifest is not None:
+            manifest.remove_stream(dest)
+            if self.library is not None:
+                try:
+                    self.library.remove(dest)
+                except sqlite3.Error as e:
+                    logger.warning("无法更新媒体库索引", dest=dest, error=str(e))
+
+    def fetch_stream(
+        self,
+        stream,
+        dest,
+        headers=None,
+        num=16,
+        refurl="",
+        downloader_type=DEFAULT_DOWNLOADER,
+        manifest=None,
+        stream_info=None,
+    ):
+        """下载单个音视频流并校验，校验失败时只重新下载这一个流。"""
+        download_settings = self.settings.download
+        attempts = 1
+        if download_settings.verify_downloads:
+            attempts += max(0, download_settings.verify_retries)
+
+        for attempt in range(1, attempts + 1):
+            self.check_claim()
+            self.download_bangumi(
+                self.select_stream_urls(stream, headers),
+                dest,
+                headers=headers,
+                num=num,
+                refurl=refurl,
+                downloader_type=downloader_type,
+            )
+            if self.check_stream(stream, dest, manifest, stream_info):
+                return True
+            self.discard_stream(dest, manifest)
+            if attempt < attempts:
+                logger.info(f"重新下载损坏的流 ({attempt}/{attempts - 1}): {dest}")
+
+        raise DownloadError(f"流文件校验失败: {dest}")
+
+    def prepare_partial_download(self, dest, downloader_type=DEFAULT_DOWNLOADER):
+        """
+        处理目标文件的未完成下载状态。
+
+        当前下载器自己的控制文件 (axel 的 .st、aria2 的 .aria2) 会被保留用于续传；
+        另一个下载器留下的部分文件无法续传，会被删除。
+        返回 True 表示目标文件已经完整存在。
+        """
+        if downloader_type.lower() == "aria2":
+            own_suffix, foreign_suffixes = ".aria2", (".st", RESUME_META_SUFFIX)
+        else:
+            own_suffix, foreign_suffixes = ".st", (".aria2",)
+
+        if any(self.path_exists(dest + suffix) for suffix in foreign_suffixes):
+            logger.info(f"其他下载器的未完成文件无法续传，删除并重新下载: {dest}")
+            for path in (
+                dest,
+                dest + ".st",
+                dest + RESUME_META_SUFFIX,
+                dest + ".aria2",
+            ):
+                self.remove_path(path)
+            return False
+
+        if self.path_exists(dest + own_suffix):
+            logger.info(f"文件下载未完成，将从中断处续传: {dest}")
+            return False
+
+        return self.path_exists(dest)
+
+    def pending_episodes(self, episodes, destdir, manifest=None):
+        """下载清单中记录的输出文件仍然存在的剧集已完成，返回其余的剧集。"""
+        finished = set()
+        if manifest is not None:
+            finished = {
+                output.get("ep_id")
+                for name, output in manifest.data["outputs"].items()
+                if self.path_exists(os.path.join(destdir, name))
+            }
+        return [
+            ep for ep in episodes if (ep.get("id") or ep.get("ep_id")) not in finished
+        ]
+
+    def preflight_disk_space(
+        self,
+        episodes,
+        destdir,
+        quality,
+        headers=None,
+        doclean=False,
+        manifest=None,
+        resolved=None,
+    ):
+        """
+        下载前根据 DASH 码率和剧集时长估算所需磁盘空间。
+
+        只获取第一集待下载剧集的下载信息 (resolved 中已有时直接使用)，
+        其码率用于估算全部剧集。
+        空间不足时按 ``disk_check`` 设置警告或拒绝开始 (抛出 DownloadError)。
+
+        Returns:
+            dict: cid 到 get_bangumi_downloads 结果的映射，供下载循环复用
+        """
+        download_settings = self.settings.download
+        mode = download_settings.disk_check.lower()
+        if mode == "off":
+            return {}
+
+        pending = self.pending_episodes(episodes, destdir, manifest)
+        if not pending:
+            return {}
+
+        sample = pending[0]
+        downloads = (resolved or {}).get(sample["cid"])
+        if downloads is None:
+            downloads = self.get_bangumi_downloads(
+                sample["aid"],
+                sample["cid"],
+                quality,
+                headers,
+                (sample.get("duration") or 0) / 1000,
+            )
+            if self.last_stream_choice is not None:
+                print_info(f"流选择: {self.last_stream_choice.describe()}")
+        _, video, audio = downloads
+        streams_mode = self.streams_mode
+        bandwidth = 0
+        if streams_mode in ("video", "both"):
+            bandwidth += stream_bandwidth(video)
+        if streams_mode in ("audio", "both"):
+            bandwidth += stream_bandwidth(audio)
+        if not bandwidth:
+            return {sample["cid"]: downloads}
+
+        plan = plan_disk_usage(
+            [(ep.get("duration") or 0) / 1000 for ep in pending],
+            bandwidth,
+            free_space(destdir),
+            doclean=doclean,
+            # 使用临时目录时下载目录只会写入合并后的文件
+            stream_merge=download_settings.stream_merge
+            or bool(download_settings.scratch_dir),
+            reserve_bytes=download_settings.disk_reserve_mb * 1024 * 1024,
+        )
+        gib = 1024**3
+        logger.info(
+            "磁盘空间估算",
+            episodes=plan.episodes,
+            streams_gib=round(plan.stream_bytes / gib, 2),
+            required_gib=round(plan.peak_bytes / gib, 2),
+            free_gib=round(plan.free_bytes / gib, 2),
+        )
+        if not plan.ok:
+            message = (
+                f"磁盘空间可能不足: 预计需要 {plan.peak_bytes / gib:.1f} GiB，"
+                f"可用 {plan.free_bytes / gib:.1f} GiB ({destdir})"
+            )
+            if mode == "refuse":
+                raise DownloadError(message)
+            logger.warning(message)
+            print_warning(message)
+        return {sample["cid"]: downloads}
+
+    def create_output_validator(self, destdir, episodes, manifest=None):
+        """
+        创建输出文件校验器，并行校验目录中已有的合并文件以预热缓存。
+
+        未启用校验时返回 None。
+        """
+        download_settings = self.settings.download
+        if not download_settings.validate_outputs:
+            return None
+        validator = OutputValidator(
+            destdir,
+            tolerance=download_settings.validate_tolerance,
+            workers=min(4, os.cpu_count() or 1),
+        )
+
+        # 通过清单中记录的剧集 ID 找到已有输出文件对应的剧集时长
+        durations = {}
+        if manifest is not None:
+            episode_durations = {
+                ep.get("id") or ep.get("ep_id"): ep.get("duration") for ep in episodes
+            }
+            for name, output in manifest.data["outputs"].items():
+                duration = episode_durations.get(output.get("ep_id"))
+                if duration:
+                    durations[name] = duration / 1000
+        expected_streams = 2 if self.streams_mode == "both" else 1
+        results = validator.validate_directory(durations, expected_streams)
+        invalid = [name for name, result in results.items() if not result.ok]
+        if invalid:
+            logger.warning("发现不完整的合并文件", files=invalid)
+        return validator
+
+    def output_is_complete(
+        self, merged_dest, expected_duration=None, validator=None, expected_streams=2
+    ):
+        """
+        判断合并文件是否已经完整存在。
+
+        文件存在但校验失败时将其删除，以便重新合并。
+        """
+        if not self.path_exists(merged_dest):
+            return False
+        if validator is None:
+            return True
+        result = validator.validate(merged_dest, expected_duration, expected_streams)
+        if result.ok:
+            return True
+        logger.warning(
+            f"合并文件不完整，将重新合并: {merged_dest}", reason=result.reason
+        )
+        self.remove_path(merged_dest)
+        validator.forget(merged_dest)
+        return False
+
+    def merge_streams(
+        self,
+        audio_dest,
+        video_dest,
+        merged_dest,
+        expected_duration=None,
+        validator=None,
+        work_dir=None,
+    ):
+        """
+        合并音视频流。
+
+        先在 work_dir (默认为输出目录) 中写入临时文件，校验通过后放到最终
+        位置，中断的合并不会留下看起来完整的输出文件。
+        """
+        self.check_claim()
+        tmp_dest = merge_temp_path(
+            os.path.join(
+                work_dir or os.path.dirname(merged_dest), os.path.basename(merged_dest)
+            )
+        )
+        self.remove_path(tmp_dest)
+
+        download_settings = self.settings.download
+        merger = VAMerger(
+            audio_dest,
+            video_dest,
+            tmp_dest,
+            native=download_settings.native_remux,
+            duration=expected_duration,
+            nice=download_settings.merge_nice,
+            ionice_class=download_settings.merge_ionice_class,
+        )
+        merged = merger.run()
+        self.refresh_paths(tmp_dest)
+        if not merged:
+            self.remove_path(tmp_dest)
+            return False
+        return self._finalize_merge(tmp_dest, merged_dest, expected_duration, validator)
+
+    def _finalize_merge(
+        self, tmp_dest, merged_dest, expected_duration, validator, expected_streams=2
+    ):
+        """校验临时合并文件并放到最终位置。"""
+        self.check_claim(tmp_dest)
+        if validator is None:
+            place_file(tmp_dest, merged_dest)
+        else:
+            result = validator.validate(tmp_dest, expected_duration, expected_streams)
+            if not result.ok:
+                logger.error(f"合并输出校验失败: {merged_dest}", reason=result.reason)
+                os.remove(tmp_dest)
+                self.refresh_paths(tmp_dest)
+                return False
+            validator.move(tmp_dest, merged_dest)
+        self.refresh_paths(tmp_dest, merged_dest)
+        return True
+
+    def ensure_stream(
+        self,
+        stream,
+        dest,
+        stream_info,
+        headers=None,
+        refurl="",
+        downloader_type=DEFAULT_DOWNLOADER,
+        threads=16,
+        manifest=None,
+    ):
+        """
+        确保流文件已完整下载：校验已有文件，否则从媒体库复用或重新下载。
+
+        Raises:
+            DownloadError: 下载或校验失败
+        """
+        exists = self.prepare_partial_download(dest, downloader_type)
+        if exists and not self.check_stream(stream, dest, manifest, stream_info):
+            self.discard_stream(dest, manifest)
+            exists = False
+        if not exists:
+            exists = self.reuse_library_stream(stream, dest, manifest, stream_info)
+        if not exists:
+            self.fetch_stream(
+                stream,
+                dest,
+                headers=headers,
+                refurl=refurl,
+                downloader_type=downloader_type,
+                num=threads,
+                manifest=manifest,
+                stream_info=stream_info,
+            )
+
+    def single_stream_output(self, kind, stream_dest, destdir, title):
+        """
+        只下载一个流时的输出文件路径。
+
+        启用 ``single_stream_remux`` 时封装为独立的 m4a/mp4 文件，
+        否则直接使用下载的流文件。
+        """
+        if self.settings.download.single_stream_remux:
+            return os.path.join(destdir, title + SINGLE_STREAM_EXTENSIONS[kind])
+        return os.path.join(destdir, os.path.basename(stream_dest))
+
+    def download_single_stream(
+        self,
+        stream,
+        stream_dest,
+        output_dest,
+        stream_info,
+        headers=None,
+        refurl="",
+        downloader_type=DEFAULT_DOWNLOADER,
+        threads=16,
+        manifest=None,
+        expected_duration=None,
+        validator=None,
+        doclean=False,
+    ):
+        """
+        只下载音频或视频流，不经过 VAMerger。
+
+        Returns:
+            str: 输出文件路径
+
+        Raises:
+            DownloadError: 下载或校验失败
+        """
+        self.ensure_stream(
+            stream,
+            stream_dest,
+            stream_info,
+            headers=headers,
+            refurl=refurl,
+            downloader_type=downloader_type,
+            threads=threads,
+            manifest=manifest,
+        )
+        if os.path.abspath(output_dest) == os.path.abspath(stream_dest):
+            return stream_dest
+
+        if self.settings.download.single_stream_remux:
+            tmp_dest = merge_temp_path(
+                os.path.join(
+                    os.path.dirname(stream_dest), os.path.basename(output_dest)
+                )
+            )
+            try:
+                remux([stream_dest], tmp_dest)
+            except RemuxError as e:
+                logger.warning("无法封装为独立文件，保留原始流", reason=str(e))
+                output_dest = os.path.join(
+                    os.path.dirname(output_dest), os.path.basename(stream_dest)
+                )
+            else:
+                self.refresh_paths(tmp_dest)
+                if not self._finalize_merge(
+                    tmp_dest, output_dest, expected_duration, validator, 1
+                ):
+                    raise DownloadError(f"封装输出校验失败: {output_dest}")
+                if doclean:
+                    self.remove_path(stream_dest)
+                    if manifest is not None:
+                        manifest.remove_stream(stream_dest)
+                return output_dest
+
+        # 使用临时目录时把原始流放到下载目录
+        if os.path.abspath(output_dest) != os.path.abspath(stream_dest):
+            self.check_claim()
+            place_file(stream_dest, output_dest)
+            self.refresh_paths(stream_dest, output_dest)
+            if manifest is not None:
+                manifest.remove_stream(stream_dest)
+        return output_dest
+
+    def download_clip(
+        self,
+        streams,
+        output_dest,
+        clip,
+        headers=None,
+        refurl="",
+        work_dir=None,
+        validator=None,
+    ):
+        """
+        通过段索引只下载时间窗口内的子分段，生成片段文件。
+
+        Args:
+            streams: (类型, 流条目) 列表，类型为 "audio" 或 "video"
+            clip: (开始秒, 结束秒)
+
+        Raises:
+            DownloadError: 段索引不可用或下载失败
+            MergeError: 合并片段失败
+        """
+        start, end = clip
+        headers = dict(headers or {})
+        headers.setdefault("referer", refurl or "https://www.bilibili.com")
+        work_dir = work_dir or os.path.dirname(output_dest)
+        base = os.path.splitext(os.path.basename(output_dest))[0]
+
+        pieces = {}
+        try:
+            plans = []
+            for kind, stream in streams:
+                urls = self.select_stream_urls(stream, headers)
+                plans.append((kind, urls, plan_clip(stream, urls, start, end, headers)))
+            # 所有流使用同一个时间零点，保持音画同步
+            origin = min(plan.start for _, _, plan in plans)
+            for kind, urls, plan in plans:
+                piece = os.path.join(work_dir, f"{base}.{kind}.m4s")
+                write_clip(plan, urls, piece, origin, headers)
+                pieces[kind] = piece
+            logger.info(
+                "片段传输完成",
+                output=output_dest,
+                bytes=sum(plan.size + len(plan.init) for _, _, plan in plans),
+            )
+
+            if len(pieces) == 2:
+                merged = self.merge_streams(
+                    pieces["audio"],
+                    pieces["video"],
+                    output_dest,
+                    validator=validator,
+                    work_dir=work_dir,
+                )
+            else:
+                tmp_dest = merge_temp_path(
+                    os.path.join(work_dir, os.path.basename(output_dest))
+                )
+                remux(list(pieces.values()), tmp_dest)
+                self.refresh_paths(tmp_dest)
+                merged = self._finalize_merge(tmp_dest, output_dest, None, validator, 1)
+        except (ValueError, requests.RequestException) as e:
+            raise DownloadError(f"片段下载失败: {e}") from e
+        except RemuxError as e:
+            raise MergeError(f"片段封装失败: {e}") from e
+        finally:
+            for piece in pieces.values():
+                if os.path.exists(piece):
+                    os.remove(piece)
+        if not merged:
+            raise MergeError(f"片段合并失败: {output_dest}")
+        return output_dest
+
+    def get_preview_downloads(self, aid, cid, target, headers=None, duration=0.0):
+        """
+        获取渐进式下载先发布的低清晰度音视频流。
+
+        Returns:
+            tuple | None: 与 get_bangumi_downloads 相同，没有比目标更低的
+            清晰度时为 None
+        """
+        preferred = self.settings.download.progressive_quality
+        ret = self.get_bangumi_download_info(aid, cid, preferred, headers)
+        available = [f.get("quality") for f in ret.get("support_formats") or []]
+        qn = choose_preview_quality(available, target, preferred)
+        if qn is None:
+            return None
+        downloads = self.get_bangumi_downloads(aid, cid, qn, headers, duration)
+        if downloads[1] is None or downloads[2] is None:
+            return None
+        return downloads
+
+    def publish_preview(
+        self,
+        ep,
+        downloads,
+        audio_dest,
+        merged_dest,
+        headers=None,
+        refurl="",
+        downloader_type=DEFAULT_DOWNLOADER,
+        threads=16,
+        manifest=None,
+        expected_duration=None,
+        validator=None,
+        work_dir=None,
+    ):
+        """
+        下载低清晰度视频流并与音频合并到最终文件名，先发布一个可以观看的版本。
+
+        音频写入最终的音频流路径，目标清晰度通常使用相同的音频流，升级时
+        不需要重新下载。低清晰度视频流在合并后删除。
+
+        Raises:
+            DownloadError: 下载失败
+            MergeError: 合并失败
+        """
+        format, video, audio = downloads
+        qn = format["quality"]
+        ep_id = ep.get("id") or ep.get("ep_id")
+        preview_dest = (
+            f"{os.path.splitext(audio_dest)[0]}.preview{qn}.{format['format']}"
+        )
+        options = {
+            "headers": headers,
+            "refurl": refurl,
+            "downloader_type": downloader_type,
+            "threads": threads,
+            "manifest": manifest,
+        }
+        self.ensure_stream(
+            audio,
+            audio_dest,
+            self.stream_record("audio", ep, audio, qn),
+            **options,
+        )
+        try:
+            self.ensure_stream(
+                video,
+                preview_dest,
+                self.stream_record("video", ep, video, qn),
+                **options,
+            )
+            if not self.merge_streams(
+                audio_dest,
+                preview_dest,
+                merged_dest,
+                expected_duration,
+                validator,
+                work_dir=work_dir,
+            ):
+                raise MergeError(f"低清晰度版本合并失败: {merged_dest}")
+        finally:
+            self.discard_stream(preview_dest, manifest)
+
+        if manifest is not None:
+            manifest.record_output(
+                merged_dest,
+                ep_id=ep_id,
+                cid=ep["cid"],
+                quality=qn,
+                size=os.path.getsize(merged_dest),
+                preview=True,
+            )
+        logger.info("已发布低清晰度版本", dest=merged_dest, quality=qn)
+
+    def upgrade_episode(
+        self,
+        ep,
+        quality,
+        audio_dest,
+        video_dest,
+        merged_dest,
+        headers=None,
+        refurl="",
+        downloader_type=DEFAULT_DOWNLOADER,
+        threads=16,
+        manifest=None,
+        expected_duration=None,
+        validator=None,
+        work_dir=None,
+        doclean=False,
+    ):
+        """
+        下载目标清晰度并替换已发布的低清晰度版本。
+
+        合并结果先写入临时文件，校验通过后原子地替换 merged_dest，
+        正在播放的低清晰度文件不受影响。
+
+        Raises:
+            DownloadError: 下载失败
+            MergeError: 合并失败
+        """
+        # 排队期间播放地址可能已经过期，重新获取
+        format, video, audio = self.get_bangumi_downloads(
+            ep["aid"], ep["cid"], quality, headers, expected_duration or 0
+        )
+        if video is None or audio is None:
+            raise DownloadError(f"没有可用的音视频流: cid={ep['cid']}")
+        quality = format["quality"]
+        ep_id = ep.get("id") or ep.get("ep_id")
+        options = {
+            "headers": headers,
+            "refurl": refurl,
+            "downloader_type": downloader_type,
+            "threads": threads,
+            "manifest": manifest,
+        }
+        self.ensure_stream(
+            audio,
+            audio_dest,
+            self.stream_record("audio", ep, audio, quality),
+            **options,
+        )
+        self.ensure_stream(
+            video,
+            video_dest,
+            self.stream_record("video", ep, video, quality),
+            **options,
+        )
+        if not self.merge_streams(
+            audio_dest,
+            video_dest,
+            merged_dest,
+            expected_duration,
+            validator,
+            work_dir=work_dir,
+        ):
+            raise MergeError(f"目标清晰度合并失败: {merged_dest}")
+
+        if manifest is not None:
+            manifest.record_output(
+                merged_dest,
+                ep_id=ep_id,
+                cid=ep["cid"],
+                quality=quality,
+                size=os.path.getsize(merged_dest),
+                audio=os.path.basename(audio_dest),
+                video=os.path.basename(video_dest),
+            )
+        if doclean:
+            for dest in (audio_dest, video_dest):
+                self.remove_path(dest)
+                if manifest is not None:
+                    manifest.remove_stream(dest)
+        logger.info("已替换为目标清晰度", dest=merged_dest, quality=quality)
+        return merged_dest
+
+    def create_transcoder(self):
+        """按设置创建合并后的转码队列，未启用或预设无效时为 None。"""
+        try:
+            transcoder = Transcoder.from_settings(self.settings)
+        except ValueError as e:
+            logger.warning("转码设置无效，跳过转码", error=str(e))
+            return None
+        if transcoder is not None:
+            logger.info(
+                "合并后转码已启用",
+                preset=transcoder.label,
+                workers=transcoder.workers,
+                threads=transcoder.threads,
+            )
+        return transcoder
+
+    def finish_transcodes(self, transcoder, manifest=None):
+        """等待转码完成，替换了合并文件时更新下载清单。"""
+        if transcoder.pending:
+            logger.info("等待转码完成", count=transcoder.pending)
+        results = transcoder.close()
+        for result in results:
+            if not result.ok:
+                continue
+            self.refresh_paths(result.output)
+            if manifest is None:
+                continue
+            output = manifest.get_output(result.source)
+            if output is not None and result.output == result.source:
+                output = dict(output, size=os.path.getsize(result.output))
+                output["transcoded"] = transcoder.label
+                output.pop("recorded_at", None)
+                manifest.record_output(result.source, **output)
+        return results
+
+    def stream_directory(self, destdir):
+        """
+        音视频流的下载和合并目录。
+
+        设置了 ``scratch_dir`` 时使用其中与下载目录对应的子目录，
+        只有合并完成的文件才会放到下载目录。
+        """
+        scratch_dir = self.settings.download.scratch_dir
+        if not scratch_dir:
+            return destdir
+        destdir = os.path.abspath(destdir)
+        digest = hashlib.sha1(destdir.encode("utf-8")).hexdigest()[:8]
+        name = f"{os.path.basename(destdir) or 'bili'}-{digest}"
+        path = os.path.join(os.path.expanduser(scratch_dir), name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def can_stream_merge(self, *dests):
+        """
+        判断能否使用流式合并。
+
+        任一流已有本地文件或续传控制文件时需要续传，只能使用文件方式。
+        """
+        if not stream_merge_supported():
+            return False
+        for dest in dests:
+            for suffix in ("", ".st", RESUME_META_SUFFIX, ".aria2"):
+                if self.path_exists(dest + suffix):
+                    return False
+        return True
+
+    def stream_merge_episode(
+        self,
+        audio,
+        video,
+        merged_dest,
+        headers=None,
+        refurl="",
+        expected_duration=None,
+        validator=None,
+    ):
+        """不写中间文件，把音视频流直接送入 ffmpeg 合并。"""
+        self.check_claim()
+        headers = dict(headers or {})
+        headers.setdefault("referer", refurl or "https://www.bilibili.com")
+        tmp_dest = merge_temp_path(merged_dest)
+        merger = StreamingMerger(
+            self.select_stream_urls(audio, headers),
+            self.select_stream_urls(video, headers),
+            tmp_dest,
+            headers=headers,
+        )
+        if not merger.run():
+            return False
+        return self._finalize_merge(tmp_dest, merged_dest, expected_duration, validator)
+
     def download_bangumi(
         self,
         url,
@@ -383,7 +1462,7 @@ class BangumiDownloader:
         refurl="",
         downloader_type=DEFAULT_DOWNLOADER,
     ):
-        """下载单个视频或音频文件。"""
+        """下载单个视频或音频文件，url 可以是按优先级排序的镜像地址列表。"""
         if headers is None:
             headers = {}
 
@@ -402,16 +1481,678 @@ class BangumiDownloader:
         logger.info("正在下载文件", url=url, dest=dest, referer=referer_value)
 
         # 根据类型选择下载器
+        download_settings = self.settings.download
         if downloader_type.lower() == "aria2":
-            downloader = DownloaderAria2(url, num, dest, header=headers)
+            downloader = DownloaderAria2(
+                url,
+                num,
+                dest,
+                header=headers,
+                multi_source=download_settings.multi_source,
+                min_speed=download_settings.mirror_min_speed,
+                preallocate=download_settings.preallocate,
+                stall_speed=download_settings.stall_min_speed * 1024,
+                stall_window=download_settings.stall_window,
+            )
         else:
-            downloader = DownloaderAxel(url, num, dest, header=headers)
+            downloader = DownloaderAxel(
+                url,
+                num,
+                dest,
+                header=headers,
+                multi_source=download_settings.multi_source,
+                stall_speed=download_settings.stall_min_speed * 1024,
+                stall_window=download_settings.stall_window,
+            )
 
-        if not downloader.run():
+        # 续传时目标文件中已有之前运行下载的数据，只统计本次传输的字节数
+        size_before = os.path.getsize(dest) if self.path_exists(dest) else 0
+        start = time.monotonic()
+        try:
+            success = downloader.run()
+        finally:
+            self.refresh_paths(
+                dest, dest + ".st", dest + RESUME_META_SUFFIX, dest + ".aria2"
+            )
+        elapsed = time.monotonic() - start
+
+        # 单源下载时把实际传输速度计入主机评分
+        if not download_settings.multi_source:
+            transferred = (
+                os.path.getsize(dest) - size_before if self.path_exists(dest) else 0
+            )
+            if success and transferred > 0:
+                self.cdn_policy.record(downloader.url, transferred / elapsed)
+            elif not success:
+                self.cdn_policy.record_failure(downloader.url)
+            self.cdn_policy.save()
+
+        if not success:
             logger.error("下载失败", url=url, dest=dest)
             raise DownloadError(f"下载失败: {url} -> {dest}")
         return True  # 表示成功
 
+    @staticmethod
+    def stream_record(kind, ep, stream, quality):
+        """清单和媒体库索引中记录的流信息，音频流的清晰度使用流 id。"""
+        return {
+            "kind": kind,
+            "ep_id": ep.get("id") or ep.get("ep_id"),
+            "cid": ep["cid"],
+            "stream_id": stream.get("id"),
+            "codecs": stream.get("codecs", ""),
+            "quality": stream.get("id") if kind == "audio" else quality,
+        }
+
+    @staticmethod
+    def record_existing_output(manifest, path, ep, quality, **info):
+        """
+        把校验通过的已有输出文件记录到下载清单
+
+        清单出现之前下载的剧集也会被订阅等功能视为已完成。
+        """
+        ep_id = ep.get("id") or ep.get("ep_id")
+        if (manifest.get_output(path) or {}).get("ep_id") == ep_id:
+            return
+        manifest.record_output(
+            path,
+            ep_id=ep_id,
+            cid=ep["cid"],
+            quality=quality,
+            size=os.path.getsize(path),
+            **info,
+        )
+
+    def episode_files(self, ep, index, format, destdir, stream_dir=None):
+        """
+        使用从API返回的剧集标题和清晰度描述确定文件路径
+
+        Returns:
+            tuple: (文件名标题, 音频流路径, 视频流路径, 合并文件路径)
+        """
+        stream_dir = stream_dir or destdir
+        episode_title = (
+            ep.get("share_copy", f"Episode_{index + 1}")
+            + format["new_description"]
+            + format["display_desc"]
+        )
+        title = self.sanitize_filename(episode_title)
+        return (
+            title,
+            os.path.join(stream_dir, f"{title}.ogg"),
+            os.path.join(stream_dir, f"{title}.{format['format']}"),
+            os.path.join(destdir, f"{title}.mkv"),
+        )
+
+    def aria2_batch_entries(self, ep, quality, streams, headers, manifest):
+        """
+        生成一集需要批量下载的流
+
+        已完整存在或可以从媒体库复用的流不需要下载。streams 是
+        (类型, 流信息, 文件路径) 的列表。
+        """
+        for kind, stream, dest in streams:
+            if stream is None or self.streams_mode not in (kind, "both"):
+                continue
+            if self.prepare_partial_download(dest, "aria2"):
+                continue
+            stream_info = self.stream_record(kind, ep, stream, quality)
+            if self.reuse_library_stream(stream, dest, manifest, stream_info):
+                continue
+            header = dict(headers)
+            header.setdefault(
+                "referer", ep.get("share_url") or "https://www.bilibili.com"
+            )
+            yield Aria2Entry(self.select_stream_urls(stream, headers), dest, header)
+
+    def start_aria2_batch(
+        self,
+        episodes,
+        destdir,
+        quality,
+        headers,
+        keyword,
+        prefetched,
+        manifest,
+        stream_dir,
+        threads=16,
+    ):
+        """
+        用一个 aria2c 进程在后台下载所有选中剧集的流
+
+        已完整存在、可以从媒体库复用或解析失败的流不加入批量下载，
+        解析结果保存到 prefetched 供下载循环使用。
+
+        Returns:
+            tuple: (Aria2Batch 或 None, cid 到该集批量下载的流路径列表的映射)
+        """
+        streams_mode = self.streams_mode
+        entries = []
+        paths = {}
+        for i, ep in enumerate(episodes):
+            cid = ep["cid"]
+            downloads = prefetched.get(cid)
+            if downloads is None:
+                try:
+                    downloads = self.get_bangumi_downloads(
+                        ep["aid"],
+                        cid,
+                        quality,
+                        headers,
+                        (ep.get("duration") or 0) / 1000,
+                    )
+                except Exception as e:
+                    logger.warning(
+                        "解析剧集下载信息失败，下载时重试", index=i + 1, error=str(e)
+                    )
+                    continue
+                prefetched[cid] = downloads
+            format, video, audio = downloads
+            title, audio_dest, video_dest, merged_dest = self.episode_files(
+                ep, i, format, destdir, stream_dir
+            )
+            if keyword and keyword not in title:
+                continue
+            if streams_mode == "both" and self.path_exists(merged_dest):
+                continue
+            for entry in self.aria2_batch_entries(
+                ep,
+                format["quality"],
+                (("video", video, video_dest), ("audio", audio, audio_dest)),
+                headers,
+                manifest,
+            ):
+                entries.append(entry)
+                paths.setdefault(cid, []).append(entry.dest)
+
+        if not entries:
+            return None, {}
+        download_settings = self.settings.download
+        batch = Aria2Batch(
+            entries,
+            stream_dir,
+            jobs=download_settings.aria2_batch_jobs,
+            num=threads,
+            multi_source=download_settings.multi_source,
+            min_speed=download_settings.mirror_min_speed,
+            preallocate=download_settings.preallocate,
+            stall_speed=download_settings.stall_min_speed * 1024,
+            stall_window=download_settings.stall_window,
+        )
+        if not batch.start():
+            batch.close()
+            return None, {}
+        logger.info(
+            "已启动批量下载",
+            files=len(entries),
+            episodes=len(paths),
+            jobs=download_settings.aria2_batch_jobs,
+        )
+        return batch, paths
+
+    def has_required_streams(self, audio, video):
+        """检查下载信息中是否有需要下载的流，缺少时记录警告。"""
+        if self.streams_mode == "audio":
+            if audio is None:
+                logger.warning("音频信息不存在，跳过")
+                return False
+        elif video is None:
+            logger.warning("Video information does not exist, skipping")
+            return False
+        return True
+
+    @staticmethod
+    def write_enumerate_info(destdir, index, ep, audio, video):
+        """在 enumerate.txt 中记录一集的 aid、cid 和流地址，用于调试。"""
+        aurl = get_stream_urls(audio) if audio else []
+        vurl = get_stream_urls(video) if video else []
+        enumerate_path = os.path.join(destdir, "enumerate.txt")
+        with open(enumerate_path, "a", encoding="utf-8") as f:
+            f.write("# Bilibili Bangumi Downloader - 枚举信息 \n\n")
+            f.write(f"# 序号: {index}\n")
+            f.write(f"# aid: {ep['aid']}\n")
+            f.write(f"# cid: {ep['cid']}\n")
+            f.write(f"# refurl: {ep.get('share_url', '')}\n\n")
+            f.write(f"# 音频URL: {' '.join(aurl)}\n")
+            f.write(f"# 视频URL: {' '.join(vurl)}\n\n\n")
+
+    @staticmethod
+    def is_preview(manifest, merged_dest):
+        """合并文件是否是已发布的低清晰度版本。"""
+        return bool((manifest.get_output(merged_dest) or {}).get("preview"))
+
+    def use_aria2_batch(self, downloader_type, clip, progressive, claims):
+        """
+        是否用一个 aria2c 进程批量下载整季的流
+
+        片段、渐进式下载和共享任务存储按集决定下载内容，不能提前批量下载。
+        """
+        return (
+            self.settings.download.aria2_batch
+            and downloader_type.lower() == "aria2"
+            and clip is None
+            and not progressive
+            and claims is None
+        )
+
+    def wait_for_batch(self, batch, pending, title):
+        """等待批量下载中这一集的流完成，未完成的流留给逐流下载重试。"""
+        done = batch.wait(pending)
+        for path in pending:
+            self.refresh_paths(path, path + ".aria2")
+        if len(done) < len(pending):
+            logger.warning(
+                "批量下载未完成的流将单独下载",
+                episode=title,
+                failed=len(pending) - len(done),
+            )
+
+    def refresh_claimed_episode(
+        self, title, audio_dest, video_dest, merged_dest, destdir
+    ):
+        """
+        重新检查领取到的剧集的文件
+
+        其他进程可能在扫描目录之后写入了这一集的文件 (例如接管过期的租约时
+        留下的未完成下载)。
+        """
+        streams_mode = self.streams_mode
+        outputs = [merged_dest]
+        if streams_mode != "both":
+            stream_dest = audio_dest if streams_mode == "audio" else video_dest
+            outputs.append(
+                self.single_stream_output(streams_mode, stream_dest, destdir, title)
+            )
+        self.refresh_paths(
+            *outputs,
+            *(
+                dest + suffix
+                for dest in (audio_dest, video_dest)
+                for suffix in ("", ".st", RESUME_META_SUFFIX, ".aria2")
+            ),
+        )
+
+    def download_episode_clip(
+        self,
+        ep,
+        index,
+        title,
+        streams,
+        clip,
+        quality,
+        destdir,
+        download_list_path,
+        headers=None,
+        refurl="",
+        work_dir=None,
+        validator=None,
+        manifest=None,
+    ):
+        """
+        下载一集中时间窗口内的片段
+
+        Returns:
+            str: 片段文件路径 (已存在时直接返回)
+        """
+        label = "-".join(f"{t:g}" for t in clip)
+        ext = SINGLE_STREAM_EXTENSIONS.get(self.streams_mode, ".mkv")
+        clip_dest = os.path.join(destdir, f"{title}.clip_{label}{ext}")
+        if self.output_is_complete(clip_dest, None, validator, len(streams)):
+            logger.info(f"片段已存在，跳过: {clip_dest}")
+            return clip_dest
+        logger.info(f"正在下载第 {index+1} 集的片段 {label}")
+        self.download_clip(
+            streams,
+            clip_dest,
+            clip,
+            headers,
+            refurl,
+            work_dir=work_dir,
+            validator=validator,
+        )
+        # 片段不是完整剧集，不记录 ep_id
+        manifest.record_output(
+            clip_dest,
+            clip_of=ep.get("id") or ep.get("ep_id"),
+            cid=ep["cid"],
+            quality=quality,
+            size=os.path.getsize(clip_dest),
+            clip=label,
+        )
+        with open(download_list_path, "a", encoding="utf-8") as f:
+            f.write(
+                f"{title} | - | - | "
+                f"{os.path.basename(clip_dest)} # 状态: 已完成 (片段)\n"
+            )
+        return clip_dest
+
+    def download_episode_stream(
+        self,
+        ep,
+        title,
+        stream,
+        stream_dest,
+        quality,
+        destdir,
+        download_list_path,
+        manifest=None,
+        expected_duration=None,
+        validator=None,
+        **options,
+    ):
+        """
+        只下载一集的音频或视频，可选地封装为独立文件
+
+        Returns:
+            str: 输出文件路径 (已存在时直接返回)
+        """
+        streams_mode = self.streams_mode
+        output_dest = self.single_stream_output(
+            streams_mode, stream_dest, destdir, title
+        )
+        if self.settings.download.single_stream_remux:
+            complete = self.output_is_complete(
+                output_dest, expected_duration, validator, 1
+            )
+        else:
+            # 原始流已经从临时目录放到下载目录
+            complete = output_dest != stream_dest and self.path_exists(output_dest)
+        if complete:
+            logger.info(f"目标文件已存在，跳过下载: {output_dest}")
+            self.record_existing_output(
+                manifest, output_dest, ep, quality, streams=streams_mode
+            )
+            return output_dest
+        output_dest = self.download_single_stream(
+            stream,
+            stream_dest,
+            output_dest,
+            self.stream_record(streams_mode, ep, stream, quality),
+            manifest=manifest,
+            expected_duration=expected_duration,
+            validator=validator,
+            **options,
+        )
+        manifest.record_output(
+            output_dest,
+            ep_id=ep.get("id") or ep.get("ep_id"),
+            cid=ep["cid"],
+            quality=quality,
+            size=os.path.getsize(output_dest),
+            streams=streams_mode,
+        )
+        kind = "音频" if streams_mode == "audio" else "视频"
+        with open(download_list_path, "a", encoding="utf-8") as f:
+            f.write(
+                f"{title} | {os.path.basename(stream_dest)} | "
+                f"{os.path.basename(output_dest)} # 状态: 已完成 (仅{kind})\n"
+            )
+        return output_dest
+
+    def publish_episode_preview(
+        self, ep, index, title, quality, audio_dest, merged_dest, **options
+    ):
+        """
+        下载并发布一集的低清晰度版本
+
+        Returns:
+            bool: 是否已发布；没有更低的清晰度或下载失败时返回 False，
+            由调用方直接下载目标清晰度
+        """
+        try:
+            preview = self.get_preview_downloads(
+                ep["aid"],
+                ep["cid"],
+                quality,
+                options.get("headers"),
+                options.get("expected_duration") or 0,
+            )
+            if preview is None:
+                return False
+            logger.info(f"正在下载第 {index+1} 集的低清晰度版本")
+            self.publish_preview(ep, preview, audio_dest, merged_dest, **options)
+        except (DownloadError, MergeError) as e:
+            logger.warning(
+                f"低清晰度版本下载失败，直接下载目标清晰度: {title}", error=str(e)
+            )
+            return False
+        return True
+
+    @staticmethod
+    def finish_upgrades(upgrader, upgrades, transcoder=None):
+        """等待后台清晰度升级完成，升级成功的文件交给转码队列。"""
+        if upgrader is None:
+            return
+        if upgrades:
+            logger.info("等待后台清晰度升级完成", count=len(upgrades))
+        upgrader.shutdown(wait=True)
+        for dest, future in upgrades:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error("后台升级失败，保留低清晰度版本", dest=dest, error=str(e))
+                continue
+            if transcoder is not None:
+                transcoder.submit(dest)
+
+    def stream_merge_and_record(
+        self,
+        ep,
+        title,
+        audio,
+        video,
+        merged_dest,
+        quality,
+        download_list_path,
+        transcoder=None,
+        headers=None,
+        refurl="",
+        manifest=None,
+        expected_duration=None,
+        validator=None,
+    ):
+        """
+        流式下载并合并一集，成功后记录到下载清单和下载列表
+
+        Returns:
+            bool: 是否合并成功，失败时由调用方改为下载文件后合并
+        """
+        if not self.stream_merge_episode(
+            audio, video, merged_dest, headers, refurl, expected_duration, validator
+        ):
+            return False
+        manifest.record_output(
+            merged_dest,
+            ep_id=ep.get("id") or ep.get("ep_id"),
+            cid=ep["cid"],
+            quality=quality,
+            size=os.path.getsize(merged_dest),
+            streamed=True,
+        )
+        if transcoder is not None:
+            transcoder.submit(merged_dest)
+        with open(download_list_path, "a", encoding="utf-8") as f:
+            f.write(
+                f"{title} | - | - | "
+                f"{os.path.basename(merged_dest)} # 状态: 已合并 (流式)\n"
+            )
+        return True
+
+    def fetch_episode_stream(
+        self, kind, index, stream, dest, download_list_path, **fetch_options
+    ):
+        """
+        下载一集的音频或视频流，失败时在下载列表的最后一行记录状态
+
+        Returns:
+            bool: 是否下载成功
+        """
+        label = "音频" if kind == "audio" else "视频"
+        logger.info(f"正在下载{label}...")
+        try:
+            self.fetch_stream(stream, dest, **fetch_options)
+        except DownloadError as e:
+            logger.error(f"下载第 {index+1} 集{label}失败。跳过。", error=str(e))
+            # 更新下载列表状态
+            with open(download_list_path, encoding="utf-8") as f:
+                lines = f.readlines()
+            with open(download_list_path, "w", encoding="utf-8") as f:
+                for line in lines[:-1]:  # 除最后一行外的所有行
+                    f.write(line)
+                # 为最后一行添加状态
+                last_line = lines[-1].strip()
+                f.write(f"{last_line} # 状态: {label}下载失败\n")
+            return False
+        return True
+
+    def download_episode_streams(
+        self, index, title, streams, merged_dest, download_list_path, **fetch_options
+    ):
+        """
+        下载合并所需的音视频流，已存在或可以复用的流跳过
+
+        Args:
+            streams: (类型, 流信息, 文件路径, 清单记录) 的列表，按音频、视频排列
+
+        Returns:
+            bool: 流是否全部就绪，某个流下载失败时返回 False
+        """
+        ready = [
+            self.stream_ready(
+                stream,
+                dest,
+                fetch_options["downloader_type"],
+                fetch_options["manifest"],
+                info,
+            )
+            for _, stream, dest, info in streams
+        ]
+        # 检查音频和视频文件是否都已存在
+        if all(ready):
+            logger.info(f"音频和视频文件已存在，跳过下载，直接合并: {title}")
+            return True
+
+        # 记录下载信息到文件
+        names = " | ".join(os.path.basename(dest) for _, _, dest, _ in streams)
+        with open(download_list_path, "a", encoding="utf-8") as f:
+            f.write(f"{title} | {names} | {os.path.basename(merged_dest)}\n")
+
+        for (kind, stream, dest, info), exists in zip(streams, ready, strict=True):
+            if exists:
+                label = "音频" if kind == "audio" else "视频"
+                logger.info(f"{label}文件已存在，跳过下载: {dest}")
+            elif not self.fetch_episode_stream(
+                kind,
+                index,
+                stream,
+                dest,
+                download_list_path,
+                stream_info=info,
+                **fetch_options,
+            ):
+                return False
+        return True
+
+    @staticmethod
+    def mark_download_list(download_list_path, audio_dest, video_dest, status):
+        """在下载列表中这一集的行末尾记录状态。"""
+        with open(download_list_path, encoding="utf-8") as f:
+            lines = f.readlines()
+        with open(download_list_path, "w", encoding="utf-8") as f:
+            for line in lines:
+                if (
+                    f"{os.path.basename(audio_dest)}" in line
+                    and f"{os.path.basename(video_dest)}" in line
+                ):
+                    f.write(f"{line.strip()} # 状态: {status}\n")
+                else:
+                    f.write(line)
+
+    def merge_and_record(
+        self,
+        ep,
+        index,
+        title,
+        audio_dest,
+        video_dest,
+        merged_dest,
+        quality,
+        download_list_path,
+        transcoder=None,
+        doclean=False,
+        manifest=None,
+        expected_duration=None,
+        validator=None,
+        work_dir=None,
+    ):
+        """
+        合并一集的音视频流，成功后记录到下载清单并交给转码队列
+
+        Raises:
+            MergeError: 合并失败
+        """
+        logger.info(f"正在合并第 {index+1} 集: {title}...")
+        if not self.merge_streams(
+            audio_dest,
+            video_dest,
+            merged_dest,
+            expected_duration,
+            validator,
+            work_dir=work_dir,
+        ):
+            logger.error(f"第 {index+1} 集合并失败。")
+            self.mark_download_list(
+                download_list_path, audio_dest, video_dest, "合并失败"
+            )
+            raise MergeError(f"第 {index+1} 集合并失败。")
+
+        logger.info(f"第 {index+1} 集合并成功。")
+        manifest.record_output(
+            merged_dest,
+            ep_id=ep.get("id") or ep.get("ep_id"),
+            cid=ep["cid"],
+            quality=quality,
+            size=os.path.getsize(merged_dest),
+            audio=os.path.basename(audio_dest),
+            video=os.path.basename(video_dest),
+        )
+        if transcoder is not None:
+            transcoder.submit(merged_dest)
+        if doclean:
+            self.remove_path(audio_dest)
+            self.remove_path(video_dest)
+            manifest.remove_stream(audio_dest)
+            manifest.remove_stream(video_dest)
+        self.mark_download_list(
+            download_list_path,
+            audio_dest,
+            video_dest,
+            "已合并 (文件已清理)" if doclean else "已合并",
+        )
+
+    @staticmethod
+    def episode_status(failed, produced):
+        """剧集的结束状态，用于进度回调和共享任务存储。"""
+        if failed:
+            return "failed"
+        return "completed" if produced else "skipped"
+
+    def stream_ready(self, stream, dest, downloader_type, manifest, stream_info):
+        """
+        检查流文件是否可以直接用于合并
+
+        未完成的下载 (.st 或 .aria2) 当前下载器可以续传的保留，其他的删除；
+        已存在的流先校验，损坏的删除后单独重新下载；其他目录中已经下载过
+        相同的流时直接链接。
+        """
+        exists = self.prepare_partial_download(dest, downloader_type)
+        if exists and not self.check_stream(stream, dest, manifest, stream_info):
+            self.discard_stream(dest, manifest)
+            exists = False
+        if not exists:
+            exists = self.reuse_library_stream(stream, dest, manifest, stream_info)
+        return exists
+
     def download_all_from_info_with_quality(
         self,
         info,
@@ -422,8 +2163,20 @@ class BangumiDownloader:
         downloader_type=DEFAULT_DOWNLOADER,
         keyword="",
         threads=16,
+        clip=None,
+        progress=None,
+        cancel_event=None,
+        resolved=None,
     ):
-        """根据番剧信息下载所有集数并合并。"""
+        """
+        根据番剧信息下载所有集数并合并。
+
+        clip 为 (开始秒, 结束秒) 时只下载每集中该时间窗口的片段。
+        progress(序号, 剧集, 状态) 在每集开始 (running) 和结束 (completed、
+        skipped 或 failed) 时调用；cancel_event 被设置后不再开始新的剧集。
+        resolved 是 cid 到已解析的下载信息 (get_bangumi_downloads 的结果)
+        的映射 (例如来自下载计划)，其中的剧集不再请求 playurl。
+        """
         if headers is None:
             headers = {}
 
@@ -442,6 +2195,10 @@ class BangumiDownloader:
 
         # 创建下载目录
         os.makedirs(destdir, exist_ok=True)
+        manifest = DownloadManifest(destdir)
+        # 一次扫描代替每集多次 stat，运行中写入和删除的文件同步更新到快照
+        self._snapshots = {}
+        self.snapshot_directory(destdir)
 
         # 创建或清空下载列表文件
         download_list_path = os.path.join(destdir, "download_list.txt")
@@ -457,47 +2214,97 @@ class BangumiDownloader:
         with open(enumerate_path, "w", encoding="utf-8") as f:
             f.write("# Bilibili Bangumi Downloader - 枚举信息 \n\n")
 
-        for i, ep in enumerate(episodes):
+        validator = self.create_output_validator(destdir, episodes, manifest)
+        # 片段只占剧集的一小部分，不按完整剧集估算磁盘空间
+        prefetched = dict(resolved or {})
+        if clip is None:
+            prefetched.update(
+                self.preflight_disk_space(
+                    episodes, destdir, quality, headers, doclean, manifest, prefetched
+                )
+            )
+        stream_dir = self.stream_directory(destdir)
+        if stream_dir != destdir:
+            logger.info("音视频流将在临时目录中下载和合并", scratch=stream_dir)
+            self.snapshot_directory(stream_dir)
+
+        # 渐进式下载：先发布低清晰度版本，目标清晰度由后台线程下载后替换
+        progressive = (
+            self.settings.download.progressive_quality > 0
+            and clip is None
+            and self.streams_mode == "both"
+        )
+        upgrader, upgrade_downloader, upgrades = None, None, []
+        if progressive:
+            upgrader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upgrade")
+            # 后台升级使用独立的实例，流选择结果、镜像大小和目录快照不与
+            # 下载循环共享
+            upgrade_downloader = self.fork()
+        transcoder = self.create_transcoder() if clip is None else None
+
+        # 配置了共享任务存储时只下载本进程领取到的剧集
+        claims = EpisodeClaims.from_settings(self.settings, info, destdir)
+        self._claims = claims
+        work = (
+            claims.episodes(episodes, cancel_event)
+            if claims is not None
+            else enumerate(episodes)
+        )
+
+        # 批量模式：一个 aria2c 进程在后台下载全部流，循环中依次等待每一集
+        # 的流完成后合并，批量下载失败的流由下面的逐流下载重试
+        batch, batch_paths = None, {}
+        if self.use_aria2_batch(downloader_type, clip, progressive, claims):
+            batch, batch_paths = self.start_aria2_batch(
+                episodes,
+                destdir,
+                quality,
+                headers,
+                keyword,
+                prefetched,
+                manifest,
+                stream_dir,
+                threads,
+            )
+
+        for i, ep in work:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("下载已取消", remaining=len(episodes) - i)
+                break
+            if progress is not None:
+                progress(i, ep, "running")
+            merged_before = len(merged_files)
+            failed = False
             try:
                 aid = ep["aid"]
                 cid = ep["cid"]
                 refurl = ep.get("share_url", "")  # 使用 .get 保证安全
 
-                format, video, audio = self.get_bangumi_downloads(
-                    aid, cid, quality, headers
-                )
+                # 第一集的下载信息在估算磁盘空间时已经获取
+                downloads = prefetched.pop(cid, None)
+                if downloads is None:
+                    downloads = self.get_bangumi_downloads(
+                        aid, cid, quality, headers, (ep.get("duration") or 0) / 1000
+                    )
+                format, video, audio = downloads
 
-                if video is None:
-                    logger.warning("Video information does not exist, skipping")
+                streams_mode = self.streams_mode
+                if not self.has_required_streams(audio, video):
                     continue
 
-                aurl = audio["base_url"]
-                vurl = video["base_url"]
-
                 # 记录调试信息到文件
-                enumerate_path = os.path.join(destdir, "enumerate.txt")
-                with open(enumerate_path, "a", encoding="utf-8") as f:
-                    f.write("# Bilibili Bangumi Downloader - 枚举信息 \n\n")
-                    f.write(f"# 序号: {i}\n")
-                    f.write(f"# aid: {aid}\n")
-                    f.write(f"# cid: {cid}\n")
-                    f.write(f"# refurl: {refurl}\n\n")
-                    f.write(f"# 音频URL: {aurl}\n")
-                    f.write(f"# 视频URL: {vurl}\n\n\n")
+                self.write_enumerate_info(destdir, i, ep, audio, video)
 
                 # 清晰度
-                new_description = format["new_description"]
-                display_desc = format["display_desc"]
                 quality = format["quality"]
-                video_format = format["format"]
-
-                # 使用从API返回的剧集标题作为文件名
-                episode_title = (
-                    ep.get("share_copy", f"Episode_{i+1}")
-                    + new_description
-                    + display_desc
+                episode_title_safe, audio_dest, video_dest, merged_dest = (
+                    self.episode_files(ep, i, format, destdir, stream_dir)
                 )
-                episode_title_safe = self.sanitize_filename(episode_title)
+
+                if claims is not None:
+                    self.refresh_claimed_episode(
+                        episode_title_safe, audio_dest, video_dest, merged_dest, destdir
+                    )
 
                 # 检查关键字过滤
                 if keyword and keyword not in episode_title_safe:
@@ -510,19 +2317,81 @@ class BangumiDownloader:
                     f"正在下载剧集 {i+1}/{len(episodes)}: {episode_title_safe} (aid={aid}, cid={cid})"
                 )
 
+                if cid in batch_paths:
+                    self.wait_for_batch(batch, batch_paths.pop(cid), episode_title_safe)
+
                 logger.info(f"开始下载 {episode_title_safe}")
 
-                # 使用剧集标题定义文件路径
-                audio_dest = os.path.join(destdir, f"{episode_title_safe}.ogg")
-                video_dest = os.path.join(
-                    destdir, f"{episode_title_safe}.{video_format}"
-                )
-                merged_dest = os.path.join(destdir, f"{episode_title_safe}.mkv")
+                expected_duration = (ep.get("duration") or 0) / 1000 or None
+
+                options = {
+                    "headers": headers,
+                    "refurl": refurl,
+                    "downloader_type": downloader_type,
+                    "threads": threads,
+                    "manifest": manifest,
+                    "expected_duration": expected_duration,
+                    "validator": validator,
+                }
+
+                # 片段模式：只下载时间窗口内的子分段
+                if clip is not None:
+                    clip_streams = [
+                        (kind, stream)
+                        for kind, stream in (("video", video), ("audio", audio))
+                        if streams_mode in (kind, "both")
+                    ]
+                    merged_files.append(
+                        self.download_episode_clip(
+                            ep,
+                            i,
+                            episode_title_safe,
+                            clip_streams,
+                            clip,
+                            quality,
+                            destdir,
+                            download_list_path,
+                            headers=headers,
+                            refurl=refurl,
+                            work_dir=stream_dir,
+                            validator=validator,
+                            manifest=manifest,
+                        )
+                    )
+                    continue
+
+                # 只需要音频或视频时不合并，可选地封装为独立文件
+                if streams_mode != "both":
+                    audio_only = streams_mode == "audio"
+                    merged_files.append(
+                        self.download_episode_stream(
+                            ep,
+                            episode_title_safe,
+                            audio if audio_only else video,
+                            audio_dest if audio_only else video_dest,
+                            quality,
+                            destdir,
+                            download_list_path,
+                            doclean=doclean,
+                            **options,
+                        )
+                    )
+                    continue
 
-                # 检查目标文件是否已存在，如果存在则跳过下载和合并
-                if os.path.exists(merged_dest):
+                # 检查目标文件是否已完整存在，如果存在则跳过下载和合并
+                complete = self.output_is_complete(
+                    merged_dest, expected_duration, validator
+                )
+                # 已发布的低清晰度版本只需要在后台升级
+                published = (
+                    progressive and complete and self.is_preview(manifest, merged_dest)
+                )
+                if published:
+                    logger.info(f"已有低清晰度版本，等待升级: {merged_dest}")
+                elif complete:
                     logger.info(f"目标文件已存在，跳过下载和合并: {merged_dest}")
                     merged_files.append(merged_dest)
+                    self.record_existing_output(manifest, merged_dest, ep, quality)
 
                     # 更新下载列表状态
                     with open(download_list_path, "a", encoding="utf-8") as f:
@@ -530,163 +2399,136 @@ class BangumiDownloader:
                             f"{episode_title_safe} | {os.path.basename(audio_dest)} | {os.path.basename(video_dest)} | {os.path.basename(merged_dest)} # 状态: 已跳过 (文件已存在)\n"
                         )
                     continue
-
-                # 检查是否存在未完成的下载文件 (.st 或 .aria2)，如果存在则需要重新下载
-                def has_incomplete_download(file_path):
-                    return os.path.exists(file_path + ".st") or os.path.exists(
-                        file_path + ".aria2"
+                elif progressive:
+                    published = self.publish_episode_preview(
+                        ep,
+                        i,
+                        episode_title_safe,
+                        quality,
+                        audio_dest,
+                        merged_dest,
+                        work_dir=stream_dir,
+                        **options,
                     )
-
-                audio_incomplete = has_incomplete_download(audio_dest)
-                video_incomplete = has_incomplete_download(video_dest)
-
-                # 如果文件存在但下载未完成，删除原文件和未完成的文件
-                if os.path.exists(audio_dest) and audio_incomplete:
-                    logger.info(f"音频文件下载未完成，删除并重新下载: {audio_dest}")
-                    os.remove(audio_dest)
-                    if os.path.exists(audio_dest + ".st"):
-                        os.remove(audio_dest + ".st")
-                    if os.path.exists(audio_dest + ".aria2"):
-                        os.remove(audio_dest + ".aria2")
-                    audio_exists = False
-                elif os.path.exists(audio_dest):
-                    audio_exists = True
-                else:
-                    audio_exists = False
-
-                if os.path.exists(video_dest) and video_incomplete:
-                    logger.info(f"视频文件下载未完成，删除并重新下载: {video_dest}")
-                    os.remove(video_dest)
-                    if os.path.exists(video_dest + ".st"):
-                        os.remove(video_dest + ".st")
-                    if os.path.exists(video_dest + ".aria2"):
-                        os.remove(video_dest + ".aria2")
-                    video_exists = False
-                elif os.path.exists(video_dest):
-                    video_exists = True
-                else:
-                    video_exists = False
-
-                # 检查音频和视频文件是否都已存在
-                if audio_exists and video_exists:
-                    logger.info(
-                        f"音频和视频文件已存在，跳过下载，直接合并: {episode_title_safe}"
+                if published:
+                    future = upgrader.submit(
+                        upgrade_downloader.upgrade_episode,
+                        ep,
+                        quality,
+                        audio_dest,
+                        video_dest,
+                        merged_dest,
+                        work_dir=stream_dir,
+                        doclean=doclean,
+                        **options,
                     )
-                else:
-                    # 记录下载信息到文件
+                    upgrades.append((merged_dest, future))
+                    merged_files.append(merged_dest)
                     with open(download_list_path, "a", encoding="utf-8") as f:
                         f.write(
-                            f"{episode_title_safe} | {os.path.basename(audio_dest)} | {os.path.basename(video_dest)} | {os.path.basename(merged_dest)}\n"
+                            f"{episode_title_safe} | - | - | "
+                            f"{os.path.basename(merged_dest)} "
+                            "# 状态: 已发布低清晰度版本 (后台升级)\n"
                         )
+                    continue
 
-                    # 下载音频 (如果不存在)
-                    if not audio_exists:
-                        logger.info("正在下载音频...")
-                        try:
-                            self.download_bangumi(
-                                aurl,
-                                audio_dest,
-                                headers=headers,
-                                refurl=refurl,
-                                downloader_type=downloader_type,
-                                num=threads,
-                            )
-                        except DownloadError as e:
-                            logger.error(
-                                f"下载第 {i+1} 集音频失败。跳过。",
-                                error=str(e),
-                            )
-                            # 更新下载列表状态
-                            with open(download_list_path, encoding="utf-8") as f:
-                                lines = f.readlines()
-                            with open(download_list_path, "w", encoding="utf-8") as f:
-                                for line in lines[:-1]:  # 除最后一行外的所有行
-                                    f.write(line)
-                                # 为最后一行添加状态
-                                last_line = lines[-1].strip()
-                                f.write(f"{last_line} # 状态: 音频下载失败\n")
-                            continue  # 如果音频下载失败则跳过此剧集
-                    else:
-                        logger.info(f"音频文件已存在，跳过下载: {audio_dest}")
-
-                    # 下载视频 (如果不存在)
-                    if not video_exists:
-                        logger.info("正在下载视频...")
-                        try:
-                            self.download_bangumi(
-                                vurl,
-                                video_dest,
-                                headers=headers,
-                                refurl=refurl,
-                                downloader_type=downloader_type,
-                                num=threads,
-                            )
-                        except DownloadError as e:
-                            logger.error(
-                                f"下载第 {i+1} 集视频失败。清理音频并跳过。",
-                                error=str(e),
-                            )
-                            # 更新下载列表状态
-                            with open(download_list_path, encoding="utf-8") as f:
-                                lines = f.readlines()
-                            with open(download_list_path, "w", encoding="utf-8") as f:
-                                for line in lines[:-1]:  # 除最后一行外的所有行
-                                    f.write(line)
-                                # 为最后一行添加状态
-                                last_line = lines[-1].strip()
-                                f.write(f"{last_line} # 状态: 视频下载失败\n")
-                            # 如果视频下载失败且刚下载了音频，则清理已下载的音频文件
-                            if not audio_exists and os.path.exists(audio_dest):
-                                os.remove(audio_dest)
-                            continue  # 如果视频下载失败则跳过此剧集
-                    else:
-                        logger.info(f"视频文件已存在，跳过下载: {video_dest}")
+                # 流式合并：没有需要续传的本地文件时直接合并，不写中间文件
+                if self.settings.download.stream_merge and self.can_stream_merge(
+                    audio_dest, video_dest
+                ):
+                    logger.info(f"正在流式下载并合并第 {i+1} 集: {episode_title_safe}")
+                    if self.stream_merge_and_record(
+                        ep,
+                        episode_title_safe,
+                        audio,
+                        video,
+                        merged_dest,
+                        quality,
+                        download_list_path,
+                        transcoder=transcoder,
+                        headers=headers,
+                        refurl=refurl,
+                        manifest=manifest,
+                        expected_duration=expected_duration,
+                        validator=validator,
+                    ):
+                        merged_files.append(merged_dest)
+                        continue
+                    logger.warning(
+                        f"流式合并失败，改为下载文件后合并: {episode_title_safe}"
+                    )
 
-                # 立即合并下载的音频和视频文件（优先下载合并）
-                logger.info(f"正在合并第 {i+1} 集: {episode_title_safe}...")
-                if VAMerger(audio_dest, video_dest, merged_dest).run():
-                    logger.info(f"第 {i+1} 集合并成功。")
-                    merged_files.append(merged_dest)
-                    if doclean:
-                        os.remove(audio_dest)
-                        os.remove(video_dest)
+                streams = [
+                    (kind, stream, dest, self.stream_record(kind, ep, stream, quality))
+                    for kind, stream, dest in (
+                        ("audio", audio, audio_dest),
+                        ("video", video, video_dest),
+                    )
+                ]
+                if not self.download_episode_streams(
+                    i,
+                    episode_title_safe,
+                    streams,
+                    merged_dest,
+                    download_list_path,
+                    headers=headers,
+                    refurl=refurl,
+                    downloader_type=downloader_type,
+                    num=threads,
+                    manifest=manifest,
+                ):
+                    # 已校验的流保留，下次运行只需重新下载失败的流
+                    failed = True
+                    continue
 
-                    # 更新下载列表状态
-                    with open(download_list_path, encoding="utf-8") as f:
-                        lines = f.readlines()
-                    with open(download_list_path, "w", encoding="utf-8") as f:
-                        for line in lines:
-                            if (
-                                f"{os.path.basename(audio_dest)}" in line
-                                and f"{os.path.basename(video_dest)}" in line
-                            ):
-                                if doclean:
-                                    f.write(
-                                        f"{line.strip()} # 状态: 已合并 (文件已清理)\n"
-                                    )
-                                else:
-                                    f.write(f"{line.strip()} # 状态: 已合并\n")
-                            else:
-                                f.write(line)
-                else:
-                    logger.error(f"第 {i+1} 集合并失败。")
-                    # 更新下载列表状态
-                    with open(download_list_path, encoding="utf-8") as f:
-                        lines = f.readlines()
-                    with open(download_list_path, "w", encoding="utf-8") as f:
-                        for line in lines:
-                            if (
-                                f"{os.path.basename(audio_dest)}" in line
-                                and f"{os.path.basename(video_dest)}" in line
-                            ):
-                                f.write(f"{line.strip()} # 状态: 合并失败\n")
-                            else:
-                                f.write(line)
-                    raise MergeError(f"第 {i+1} 集合并失败。")
+                # 立即合并下载的音频和视频文件（优先下载合并）
+                self.merge_and_record(
+                    ep,
+                    i,
+                    episode_title_safe,
+                    audio_dest,
+                    video_dest,
+                    merged_dest,
+                    quality,
+                    download_list_path,
+                    transcoder=transcoder,
+                    doclean=doclean,
+                    manifest=manifest,
+                    expected_duration=expected_duration,
+                    validator=validator,
+                    work_dir=stream_dir,
+                )
+                merged_files.append(merged_dest)
 
             except Exception as e:
                 logger.error(f"处理第 {i+1} 集时出错", error=str(e))
+                failed = True
                 continue  # 继续处理下一集
+            except BaseException:
+                # 被中断 (Ctrl-C) 的剧集没有完成
+                failed = True
+                raise
+            finally:
+                status = self.episode_status(failed, len(merged_files) > merged_before)
+                if claims is not None:
+                    claims.finish(status)
+                if progress is not None:
+                    progress(i, ep, status)
+
+        if claims is not None:
+            claims.close()
+            self._claims = None
+        if batch is not None:
+            batch.close()
+
+        self.finish_upgrades(upgrader, upgrades, transcoder)
+
+        if transcoder is not None:
+            self.finish_transcodes(transcoder, manifest)
+
+        if validator is not None:
+            validator.save()
+        self._snapshots = {}
 
         logger.info(f"下载和合并完成。共合并 {len(merged_files)} 个文件:")
         for file in merged_files:
@@ -0,0 +1,212 @@
+"""批量下载多个季度"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from bili_downloader.utils.logger import logger
+
+SEASON_URL = "https://www.bilibili.com/bangumi/play/ss{}"
+
+
+def read_url_list(lines):
+    """读取 URL 列表，忽略空行和 ``#`` 开头的注释，重复的 URL 只保留一次。"""
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#") and line not in urls:
+            urls.append(line)
+    return urls
+
+
+def season_title(info):
+    """季度的标题，用作批量下载时的子目录名。"""
+    return info.get("season_title") or info.get("title") or ""
+
+
+@dataclass
+class BatchItem:
+    """批量下载中的一个 URL"""
+
+    url: str
+    season_id: int | None = None  # 展开的相关季度
+    title: str = ""
+    directory: str = ""
+    episodes: int = 0
+    files: list[str] = field(default_factory=list)
+    error: str = ""
+    failed: int = 0  # 下载失败的剧集数
+    duplicate_of: str = ""  # 与列表中较早的 URL 属于同一季度
+    shared: int = 0  # 已在其他季度中下载的剧集数
+    info: dict | None = field(default=None, repr=False)
+
+
+def related_season_ids(info):
+    """季度信息的 ``seasons`` 数组中列出的相关季度 (续作、剧场版、OVA 等)。"""
+    return [
+        season["season_id"]
+        for season in info.get("seasons") or []
+        if season.get("season_id")
+    ]
+
+
+def _resolve_all(items, fetch, downloader, directory, workers):
+    """并发获取各项的季度信息，失败的项记录错误。"""
+
+    def resolve(item):
+        try:
+            item.info = fetch(item)
+        except Exception as e:
+            logger.error("解析URL失败", url=item.url, error=str(e))
+            item.error = str(e)
+            return
+        item.title = season_title(item.info)
+        item.episodes = len(item.info.get("episodes") or [])
+        name = downloader.sanitize_filename(
+            item.title or str(item.info.get("season_id"))
+        )
+        item.directory = os.path.join(directory, name)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(resolve, items))
+
+
+def resolve_items(
+    urls, downloader, directory, headers=None, workers=4, all_seasons=False
+):
+    """
+    解析所有 URL 的季度信息
+
+    每个季度下载到 directory 中以季度标题命名的子目录，指向同一季度的
+    URL 只下载一次。all_seasons 为 True 时同时加入各季度的相关季度。
+    """
+    items = [BatchItem(url) for url in urls]
+    _resolve_all(
+        items,
+        lambda item: downloader.get_detailed_info_from_url(item.url, headers),
+        downloader,
+        directory,
+        workers,
+    )
+
+    if all_seasons:
+        known = {item.info.get("season_id") for item in items if item.info}
+        related = []
+        for item in items:
+            for season_id in related_season_ids(item.info or {}):
+                if season_id not in known:
+                    known.add(season_id)
+                    related.append(
+                        BatchItem(SEASON_URL.format(season_id), season_id=season_id)
+                    )
+        # 相关季度的信息通过季度缓存获取
+        _resolve_all(
+            related,
+            lambda item: downloader.get_season_info(item.season_id, headers),
+            downloader,
+            directory,
+            workers,
+        )
+        logger.info("展开相关季度", count=len(related))
+        items += related
+
+    seen = {}
+    for item in items:
+        if item.info is None:
+            continue
+        key = item.info.get("season_id") or item.directory
+        if key in seen:
+            item.duplicate_of = seen[key]
+        else:
+            seen[key] = item.url
+    dedupe_episodes(items)
+    return items
+
+
+def dedupe_episodes(items):
+    """多个季度中都出现的剧集 (相同 cid) 只保留在第一个季度中。"""
+    seen = set()
+    for item in items:
+        if item.info is None or item.duplicate_of:
+            continue
+        episodes = []
+        for ep in item.info.get("episodes") or []:
+            key = ep.get("cid")
+            if key is not None and key in seen:
+                item.shared += 1
+                continue
+            seen.add(key)
+            episodes.append(ep)
+        if item.shared:
+            # 不修改缓存中的季度信息
+            item.info = dict(item.info, episodes=episodes)
+            item.episodes = len(episodes)
+
+
+def run_batch(
+    urls,
+    directory,
+    downloader_factory,
+    headers=None,
+    workers=2,
+    threads=16,
+    all_seasons=False,
+    **download_options,
+):
+    """
+    批量下载多个季度
+
+    Args:
+        urls: URL 列表
+        directory: 下载根目录
+        downloader_factory: 创建 BangumiDownloader 的函数，每个季度使用
+            独立的实例
+        workers: 同时下载的季度数
+        threads: 所有季度合计的下载线程数
+        all_seasons: 同时下载各季度的相关季度
+        download_options: 传给 download_all_from_info_with_quality 的其他参数
+
+    Returns:
+        list[BatchItem]: 与 urls 顺序一致的结果
+    """
+    workers = max(1, workers)
+    items = resolve_items(
+        urls, downloader_factory(), directory, headers, workers, all_seasons
+    )
+    pending = [
+        item for item in items if item.info is not None and not item.duplicate_of
+    ]
+    # 下载线程数是全局限制，平均分给同时进行的季度
+    per_season = max(1, threads // min(workers, max(1, len(pending))))
+    logger.info(
+        "批量下载开始",
+        urls=len(items),
+        seasons=len(pending),
+        workers=workers,
+        threads=per_season,
+    )
+
+    def download(item):
+        def progress(index, ep, status):
+            if status == "failed":
+                item.failed += 1
+
+        try:
+            item.files = (
+                downloader_factory().download_all_from_info_with_quality(
+                    item.info,
+                    item.directory,
+                    headers=headers,
+                    threads=per_season,
+                    progress=progress,
+                    **download_options,
+                )
+                or []
+            )
+        except Exception as e:
+            logger.error("季度下载失败", url=item.url, error=str(e))
+            item.error = str(e)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(download, pending))
+    return items
@@ -0,0 +1,225 @@
+"""CDN 节点选择策略模块"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from fnmatch import fnmatch
+from pathlib import Path
+from urllib.parse import urlparse, urlunparse
+
+from bili_downloader.utils.logger import logger
+
+# 新样本在指数滑动平均中的权重
+EWMA_ALPHA = 0.3
+# 可以安全改写到其他 upos 主机的路径前缀
+REWRITABLE_PATH_PREFIX = "/upgcxcode/"
+
+
+@dataclass
+class HostStats:
+    """单个主机的历史传输评分"""
+
+    throughput: float = 0.0  # 字节/秒 (指数滑动平均)
+    ttfb: float = 0.0  # 秒 (指数滑动平均)
+    samples: int = 0
+    failures: int = 0
+    updated_at: float = 0.0
+
+    def update(self, throughput: float, ttfb: float | None = None) -> None:
+        """加入一次新的测量结果。"""
+        if self.samples == 0:
+            self.throughput = throughput
+            self.ttfb = ttfb or 0.0
+        else:
+            self.throughput += EWMA_ALPHA * (throughput - self.throughput)
+            if ttfb is not None:
+                self.ttfb += EWMA_ALPHA * (ttfb - self.ttfb)
+        self.samples += 1
+        self.updated_at = time.time()
+
+    @property
+    def score(self) -> float:
+        """综合评分，吞吐量越高、首字节时间越短评分越高。"""
+        return self.throughput / (1.0 + self.ttfb)
+
+
+def _host_of(url: str) -> str:
+    return urlparse(url).hostname or ""
+
+
+def _matches(host: str, patterns: list[str]) -> bool:
+    return any(fnmatch(host, pattern) for pattern in patterns)
+
+
+class CdnPolicy:
+    """CDN 主机偏好策略"""
+
+    def __init__(
+        self,
+        preferred_hosts=None,
+        pinned_hosts=None,
+        blocked_hosts=None,
+        rewrite_hosts=False,
+        demote_ratio=0.5,
+        stats_max_age=7 * 24 * 3600,
+        stats_path=None,
+    ):
+        self.preferred_hosts = list(preferred_hosts or [])
+        self.pinned_hosts = list(pinned_hosts or [])
+        self.blocked_hosts = list(blocked_hosts or [])
+        self.rewrite_hosts = rewrite_hosts
+        self.demote_ratio = demote_ratio
+        self.stats_max_age = stats_max_age
+        self.stats_path = Path(stats_path) if stats_path else None
+        self._lock = threading.Lock()
+        self.stats: dict[str, HostStats] = self._load_stats()
+
+    @classmethod
+    def from_settings(cls, settings) -> "CdnPolicy":
+        """根据配置创建策略对象。"""
+        cdn = settings.cdn
+        return cls(
+            preferred_hosts=cdn.preferred_hosts,
+            pinned_hosts=cdn.pinned_hosts,
+            blocked_hosts=cdn.blocked_hosts,
+            rewrite_hosts=cdn.rewrite_hosts,
+            demote_ratio=cdn.demote_ratio,
+            stats_max_age=cdn.stats_max_age_days * 24 * 3600,
+            stats_path=settings.get_config_dir() / "cdn_stats.json",
+        )
+
+    def _load_stats(self) -> dict[str, HostStats]:
+        if not self.stats_path or not self.stats_path.exists():
+            return {}
+        try:
+            with open(self.stats_path, encoding="utf-8") as f:
+                data = json.load(f)
+            return {host: HostStats(**values) for host, values in data.items()}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(
+                "无法读取CDN评分文件", path=str(self.stats_path), error=str(e)
+            )
+            return {}
+
+    def save(self) -> None:
+        """原子地把评分写回磁盘。"""
+        if not self.stats_path:
+            return
+        with self._lock:
+            data = {host: asdict(stats) for host, stats in self.stats.items()}
+        try:
+            self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.stats_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.stats_path)
+        except OSError as e:
+            logger.warning(
+                "无法保存CDN评分文件", path=str(self.stats_path), error=str(e)
+            )
+
+    def is_blocked(self, host: str) -> bool:
+        return _matches(host, self.blocked_hosts)
+
+    def _fresh_stats(self, host: str) -> HostStats | None:
+        stats = self.stats.get(host)
+        if not stats or not stats.samples:
+            return None
+        if time.time() - stats.updated_at > self.stats_max_age:
+            return None
+        return stats
+
+    def rewrite(self, urls: list[str]) -> list[str]:
+        """
+        改写流地址: 去掉被屏蔽的主机，并把 upos 路径复制到固定/首选主机上
+
+        Args:
+            urls: 原始地址列表
+
+        Returns:
+            list[str]: 改写并去重后的地址列表
+        """
+        targets = list(self.pinned_hosts)
+        if self.rewrite_hosts:
+            # 只有不含通配符的首选主机才能作为改写目标
+            targets += [
+                h for h in self.preferred_hosts if not any(c in h for c in "*?[")
+            ]
+
+        result = []
+        for url in urls:
+            parsed = urlparse(url)
+            if targets and parsed.path.startswith(REWRITABLE_PATH_PREFIX):
+                for target in targets:
+                    rewritten = urlunparse(
+                        parsed._replace(scheme="https", netloc=target)
+                    )
+                    if rewritten not in result:
+                        result.append(rewritten)
+            if not self.is_blocked(parsed.hostname or "") and url not in result:
+                result.append(url)
+
+        if not result:
+            logger.warning("所有地址的主机均被屏蔽，忽略屏蔽列表", count=len(urls))
+            return list(urls)
+        return result
+
+    def order(self, urls: list[str]) -> list[str]:
+        """
+        按策略排序地址: 固定主机 > 评分正常的主机 > 被降级的主机
+
+        同一级别内先按首选列表顺序排序，再按历史评分从高到低排序，
+        没有评分的主机排在有评分的主机之后。
+        """
+        scores = {}
+        for url in urls:
+            stats = self._fresh_stats(_host_of(url))
+            if stats:
+                scores[url] = stats.score
+        best = max(scores.values(), default=0.0)
+
+        def preference(host: str) -> int:
+            for index, pattern in enumerate(self.preferred_hosts):
+                if fnmatch(host, pattern):
+                    return index
+            return len(self.preferred_hosts)
+
+        def sort_key(item):
+            index, url = item
+            host = _host_of(url)
+            pinned = host in self.pinned_hosts
+            score = scores.get(url)
+            demoted = (
+                score is not None and best > 0 and score < best * self.demote_ratio
+            )
+            return (
+                not pinned,
+                demoted,
+                preference(host),
+                score is None,
+                -score if score is not None else 0.0,
+                index,
+            )
+
+        return [url for _, url in sorted(enumerate(urls), key=sort_key)]
+
+    def record(self, url: str, throughput: float, ttfb: float | None = None) -> None:
+        """记录一次成功传输的吞吐量(字节/秒)和首字节时间。"""
+        host = _host_of(url)
+        if not host or throughput <= 0:
+            return
+        with self._lock:
+            stats = self.stats.setdefault(host, HostStats())
+            stats.update(throughput, ttfb)
+
+    def record_failure(self, url: str) -> None:
+        """记录一次失败的传输，失败会按零吞吐量计入评分从而使主机降级。"""
+        host = _host_of(url)
+        if not host:
+            return
+        with self._lock:
+            stats = self.stats.setdefault(host, HostStats())
+            stats.update(0.0)
+            stats.failures += 1
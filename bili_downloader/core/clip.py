@@ -0,0 +1,233 @@
+"""片段下载模块"""
+
+import os
+import re
+import struct
+from dataclasses import dataclass
+
+import requests
+
+from bili_downloader.core.integrity import find_sidx, get_segment_base
+from bili_downloader.core.mp4 import find_box, iter_boxes, iter_file_boxes
+from bili_downloader.utils.logger import logger
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+
+def parse_timestamp(text):
+    """把 "90"、"1:30"、"00:01:30.5" 解析为秒。"""
+    parts = text.strip().split(":")
+    if not 1 <= len(parts) <= 3 or not all(
+        re.fullmatch(r"\d+(\.\d+)?", p) for p in parts
+    ):
+        raise ValueError(f"无法解析时间: {text}")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_clip(text):
+    """
+    解析 ``START-END`` 形式的时间窗口
+
+    Returns:
+        tuple[float, float]: (开始秒, 结束秒)
+
+    Raises:
+        ValueError: 格式错误或结束时间不晚于开始时间
+    """
+    start, sep, end = (text or "").partition("-")
+    if not sep:
+        raise ValueError(f"片段格式应为 START-END: {text}")
+    start, end = parse_timestamp(start), parse_timestamp(end)
+    if end <= start:
+        raise ValueError(f"片段结束时间必须晚于开始时间: {text}")
+    return start, end
+
+
+@dataclass
+class ClipPlan:
+    """一个流需要下载的字节范围"""
+
+    init: bytes  # 初始化段 (ftyp + moov)
+    byte_range: tuple[int, int]  # 覆盖时间窗口的子分段 (含结束字节)
+    start: float  # 第一个子分段的开始时间(秒)
+    end: float  # 最后一个子分段的结束时间(秒)
+
+    @property
+    def size(self) -> int:
+        return self.byte_range[1] - self.byte_range[0] + 1
+
+
+def _open_range(urls, start, end, headers=None, timeout=30):
+    """依次在各镜像上请求字节范围，返回成功的响应。"""
+    errors = []
+    for url in urls:
+        request_headers = dict(headers or {})
+        request_headers["Range"] = f"bytes={start}-{end}"
+        try:
+            response = requests.get(
+                url, headers=request_headers, stream=True, timeout=timeout
+            )
+            response.raise_for_status()
+            if response.status_code != 206:
+                response.close()
+                raise requests.RequestException("服务器不支持范围请求")
+            return response
+        except requests.RequestException as e:
+            errors.append(f"{url}: {e}")
+    raise requests.RequestException("所有镜像均请求失败: " + "; ".join(errors))
+
+
+def fetch_range(urls, start, end, headers=None, timeout=30):
+    """下载一段字节范围到内存。"""
+    with _open_range(urls, start, end, headers, timeout) as response:
+        data = response.content
+    if len(data) != end - start + 1:
+        raise requests.RequestException(f"范围请求返回 {len(data)} 字节")
+    return data
+
+
+def select_subsegments(sidx, anchor, start, end):
+    """
+    选出覆盖时间窗口的子分段
+
+    Returns:
+        tuple[int, int]: 第一个和最后一个子分段的序号
+    """
+    if any(ref.reference_type for ref in sidx.references):
+        raise ValueError("不支持分层的段索引")
+    subsegments = sidx.subsegments(anchor)
+    if not subsegments:
+        raise ValueError("段索引中没有子分段")
+    selected = [
+        i for i, (_, _, s, e) in enumerate(subsegments) if e > start and s < end
+    ]
+    if not selected:
+        raise ValueError("片段超出了剧集时长")
+    first, last = selected[0], selected[-1]
+    # 从关键帧 (SAP) 开始的子分段才能独立解码
+    while first > 0 and not sidx.references[first].starts_with_sap:
+        first -= 1
+    return first, last
+
+
+def plan_clip(stream, urls, start, end, headers=None):
+    """
+    读取初始化段和段索引，计算时间窗口需要的字节范围
+
+    Raises:
+        ValueError: 流条目没有段索引信息或索引无法解析
+        requests.RequestException: 网络请求失败
+    """
+    segment_base = get_segment_base(stream)
+    if segment_base is None:
+        raise ValueError("流条目没有 SegmentBase 信息")
+    (init_start, init_end), (index_start, index_end) = segment_base
+    head_start = min(init_start, index_start)
+    head = fetch_range(urls, head_start, max(init_end, index_end), headers)
+
+    index = head[index_start - head_start : index_end - head_start + 1]
+    sidx, anchor = find_sidx(index, index_start)
+    first, last = select_subsegments(sidx, anchor, start, end)
+    subsegments = sidx.subsegments(anchor)
+    return ClipPlan(
+        init=head[init_start - head_start : init_end - head_start + 1],
+        byte_range=(subsegments[first][0], subsegments[last][1]),
+        start=subsegments[first][2],
+        end=subsegments[last][3],
+    )
+
+
+def media_timescale(init):
+    """读取初始化段中轨道的时间刻度 (mdhd)。"""
+    mdhd = find_box(init, ["moov", "trak", "mdia", "mdhd"])
+    if mdhd is None:
+        raise ValueError("初始化段中没有 mdhd")
+    version = init[mdhd.payload_offset]
+    skip = 16 if version == 1 else 8
+    return struct.unpack_from(">I", init, mdhd.payload_offset + 4 + skip)[0]
+
+
+def shift_fragment(moof, ticks):
+    """把 moof 中 tfdt 的解码时间向前平移 ticks (原地修改)。"""
+    root = find_box(moof, ["moof"])
+    if root is None:
+        return
+    for traf in iter_boxes(moof, root.payload_offset, root.end):
+        if traf.type != "traf":
+            continue
+        tfdt = find_box(moof, ["tfdt"], traf.payload_offset, traf.end)
+        if tfdt is None:
+            continue
+        pos = tfdt.payload_offset + 4
+        if moof[tfdt.payload_offset] == 1:
+            (value,) = struct.unpack_from(">Q", moof, pos)
+            struct.pack_into(">Q", moof, pos, max(0, value - ticks))
+        else:
+            (value,) = struct.unpack_from(">I", moof, pos)
+            struct.pack_into(">I", moof, pos, max(0, value - ticks))
+
+
+def _rebase_fragments(part, out, ticks):
+    """把 part 中的 moof/mdat 复制到 out，分片时间戳前移 ticks。"""
+    for box in iter_file_boxes(part):
+        part.seek(box.offset)
+        if box.type == "moof":
+            moof = bytearray(part.read(box.size))
+            shift_fragment(moof, ticks)
+            out.write(moof)
+        elif box.type == "mdat":
+            remaining = box.size
+            while remaining > 0:
+                chunk = part.read(min(DEFAULT_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError("分片数据不完整")
+                out.write(chunk)
+                remaining -= len(chunk)
+
+
+def write_clip(plan, urls, dest, origin=None, headers=None, timeout=30):
+    """
+    下载计划中的子分段，与初始化段拼接为独立的 fMP4 文件
+
+    Args:
+        origin: 输出时间戳的零点(秒)，默认为计划的开始时间
+
+    Returns:
+        int: 下载的字节数
+    """
+    origin = plan.start if origin is None else origin
+    ticks = round(origin * media_timescale(plan.init))
+    part_path = f"{dest}.part"
+    start, end = plan.byte_range
+    received = 0
+    try:
+        with (
+            _open_range(urls, start, end, headers, timeout) as response,
+            open(part_path, "wb") as part,
+        ):
+            for chunk in response.iter_content(DEFAULT_CHUNK_SIZE):
+                part.write(chunk)
+                received += len(chunk)
+        if received != plan.size:
+            raise requests.RequestException(f"传输不完整: {received}/{plan.size}")
+
+        with open(part_path, "rb") as part, open(dest, "wb") as out:
+            out.write(plan.init)
+            _rebase_fragments(part, out, ticks)
+    except BaseException:
+        if os.path.exists(dest):
+            os.remove(dest)
+        raise
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    logger.info(
+        "片段下载完成",
+        dest=dest,
+        bytes=received,
+        window=f"{plan.start:.1f}-{plan.end:.1f}",
+    )
+    return received
@@ -0,0 +1,70 @@
+"""目录文件名快照 (一次扫描代替逐个文件的存在性检查)"""
+
+import contextlib
+import os
+import threading
+
+
+class DirSnapshot:
+    """目录文件名快照"""
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self._lock = threading.Lock()
+        self._names = set()
+        self.refresh()
+
+    def refresh(self):
+        """重新扫描目录。"""
+        names = set()
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    names.add(entry.name)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._names = names
+
+    def covers(self, path):
+        """路径是否直接位于快照目录中。"""
+        return os.path.dirname(os.path.abspath(path)) == self.directory
+
+    def exists(self, path):
+        """判断路径是否存在，快照目录以外的路径直接查询文件系统。"""
+        if not self.covers(path):
+            return os.path.exists(path)
+        with self._lock:
+            return os.path.basename(path) in self._names
+
+    def add(self, path):
+        """记录新创建的文件。"""
+        if self.covers(path):
+            with self._lock:
+                self._names.add(os.path.basename(path))
+
+    def discard(self, path):
+        """记录已删除的文件。"""
+        if self.covers(path):
+            with self._lock:
+                self._names.discard(os.path.basename(path))
+
+    def update(self, path):
+        """重新检查一个路径 (例如外部进程可能创建或删除的文件)。"""
+        if os.path.exists(path):
+            self.add(path)
+        else:
+            self.discard(path)
+
+    def remove(self, path):
+        """删除快照中存在的文件。"""
+        if not self.exists(path):
+            return False
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        self.discard(path)
+        return True
+
+    def names(self):
+        with self._lock:
+            return set(self._names)
@@ -0,0 +1,187 @@
+"""下载计划 (解析结果的 JSON 表示，可以在其他机器上执行)"""
+
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+from bili_downloader.core.mirror import get_stream_urls
+from bili_downloader.core.planner import estimate_bytes, stream_bandwidth
+from bili_downloader.utils.logger import logger
+
+PLAN_VERSION = 1
+# 地址中没有 deadline 参数时假定的有效期(秒)
+DEFAULT_URL_TTL = 3600
+# 距离过期不足此时间(秒)的地址视为已过期，避免下载到一半失效
+EXPIRY_MARGIN = 300
+
+
+def url_expiry(url):
+    """从 playurl 地址的 ``deadline`` 参数获取过期时间 (Unix 时间戳)。"""
+    try:
+        return float(parse_qs(urlparse(url).query)["deadline"][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+def stream_expiry(stream, default=None):
+    """流的全部地址中最早的过期时间。"""
+    expiries = [url_expiry(url) for url in get_stream_urls(stream)]
+    expiries = [expiry for expiry in expiries if expiry is not None]
+    return min(expiries) if expiries else default
+
+
+def build_plan(downloader, info, destdir, quality, headers=None, keyword="", url=""):
+    """
+    解析季度中每一集的下载信息，生成下载计划
+
+    无法解析的剧集记录错误，执行时重新解析。
+
+    Returns:
+        dict: 可以序列化为 JSON 的下载计划
+    """
+    now = time.time()
+    streams_mode = downloader.streams_mode
+    episodes = []
+    for i, ep in enumerate(info.get("episodes") or []):
+        duration = (ep.get("duration") or 0) / 1000
+        # 文件名不依赖剧集在子集中的序号
+        ep = dict(ep, share_copy=ep.get("share_copy", f"Episode_{i + 1}"))
+        entry = {"index": i + 1, "episode": ep}
+        downloader.last_stream_choice = None
+        try:
+            format, video, audio = downloader.get_bangumi_downloads(
+                ep["aid"], ep["cid"], quality, headers, duration
+            )
+        except Exception as e:
+            logger.error("解析剧集下载信息失败", index=i + 1, error=str(e))
+            entry["error"] = str(e)
+            episodes.append(entry)
+            continue
+
+        title, audio_dest, video_dest, merged_dest = downloader.episode_files(
+            ep, i, format, destdir
+        )
+        if keyword and keyword not in title:
+            continue
+        streams = {}
+        for kind, stream, dest in (
+            ("video", video, video_dest),
+            ("audio", audio, audio_dest),
+        ):
+            if stream is None or streams_mode not in (kind, "both"):
+                continue
+            streams[kind] = {
+                "stream": stream,
+                "urls": get_stream_urls(stream),
+                "expires_at": stream_expiry(stream, now + DEFAULT_URL_TTL),
+                "expected_bytes": estimate_bytes(stream_bandwidth(stream), duration),
+                "file": os.path.basename(dest),
+            }
+        choice = downloader.last_stream_choice
+        if choice is not None:
+            # 流选择策略的取舍 (编码、码率以及与其他编码的差异)
+            entry["stream_choice"] = choice.describe()
+        if streams_mode == "both":
+            output = merged_dest
+        else:
+            stream_dest = audio_dest if streams_mode == "audio" else video_dest
+            output = downloader.single_stream_output(
+                streams_mode, stream_dest, destdir, title
+            )
+        entry.update(
+            title=title,
+            format=format,
+            streams=streams,
+            output=os.path.basename(output),
+            expected_bytes=sum(s["expected_bytes"] for s in streams.values()),
+        )
+        episodes.append(entry)
+
+    return {
+        "version": PLAN_VERSION,
+        "created_at": now,
+        "url": url,
+        "season_id": info.get("season_id"),
+        "season_title": info.get("season_title") or info.get("title") or "",
+        "directory": destdir,
+        "quality": quality,
+        "streams": streams_mode,
+        "episodes": episodes,
+    }
+
+
+def load_plan(f):
+    """
+    读取下载计划
+
+    Raises:
+        ValueError: 文件不是支持的下载计划
+    """
+    plan = json.load(f)
+    if not isinstance(plan, dict) or plan.get("version") != PLAN_VERSION:
+        raise ValueError("不支持的下载计划版本")
+    return plan
+
+
+def parse_episode_spec(spec):
+    """解析剧集选择 (例如 ``1,3-5``)，返回序号集合，为空表示全部。"""
+    selected = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        try:
+            first, last = int(start), int(end or start)
+        except ValueError:
+            raise ValueError(f"无效的剧集选择: {part}") from None
+        if first < 1 or last < first:
+            raise ValueError(f"无效的剧集选择: {part}")
+        selected.update(range(first, last + 1))
+    return selected
+
+
+def is_current(entry, now, margin=EXPIRY_MARGIN):
+    """剧集在计划中的下载信息是否完整且所有地址尚未过期。"""
+    streams = entry.get("streams")
+    if entry.get("error") or not streams:
+        return False
+    return all(s["expires_at"] > now + margin for s in streams.values())
+
+
+def plan_downloads(plan, selected=None, now=None):
+    """
+    按计划准备执行
+
+    Returns:
+        tuple: (季度信息, cid 到下载信息的映射)。地址已过期的剧集不在
+        映射中，下载时重新解析。
+    """
+    now = time.time() if now is None else now
+    episodes = []
+    resolved = {}
+    for entry in plan["episodes"]:
+        if selected and entry["index"] not in selected:
+            continue
+        ep = entry["episode"]
+        episodes.append(ep)
+        if is_current(entry, now):
+            streams = entry["streams"]
+            resolved[ep["cid"]] = (
+                entry["format"],
+                streams.get("video", {}).get("stream"),
+                streams.get("audio", {}).get("stream"),
+            )
+    logger.info(
+        "执行下载计划",
+        episodes=len(episodes),
+        resolved=len(resolved),
+        expired=len(episodes) - len(resolved),
+    )
+    info = {
+        "season_id": plan.get("season_id"),
+        "season_title": plan.get("season_title", ""),
+        "episodes": episodes,
+    }
+    return info, resolved
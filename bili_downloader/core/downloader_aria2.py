@@ -1,9 +1,20 @@
 import os
+import shlex
 import shutil
 import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, field
 
+from bili_downloader.core.watchdog import (
+    StallWatchdog,
+    file_bytes,
+    process_bytes_written,
+    run_with_watchdog,
+)
 from bili_downloader.utils.logger import logger
 from bili_downloader.utils.print_utils import print_warning
+from bili_downloader.utils.process import terminate_process
 
 
 def find_executable(name):
@@ -46,27 +57,42 @@ if not aria2c_path:
 
 
 class DownloaderAria2:
-    def __init__(self, url, num, dest, header=None, max_retry=3):
-        self.url = url
+    def __init__(
+        self,
+        url,
+        num,
+        dest,
+        header=None,
+        max_retry=3,
+        multi_source=False,
+        min_speed=0,
+        stall_speed=0,
+        stall_window=0,
+        preallocate=True,
+    ):
+        # url 可以是单个地址，也可以是按优先级排序的镜像地址列表
+        self.urls = [url] if isinstance(url, str) else list(url)
+        self.url = self.urls[0]
         self.num = num if num <= 16 else 16
         self.dest = dest
         self.header = header if header is not None else {}
         self.max_retry = max_retry
+        self.multi_source = multi_source
+        self.min_speed = min_speed  # 单连接最低速度(KiB/s)，0 表示不限制
+        self.stall_speed = stall_speed  # 停滞判定的吞吐量下限(字节/秒)
+        self.stall_window = stall_window  # 停滞判定的时间窗口(秒)
+        self.preallocate = preallocate  # 是否预分配文件空间
 
-    def run(self):
-        """
-        使用 aria2c 下载文件。
-        返回 True 表示成功，False 表示失败。
-        """
-        # 确保下载器可用
-        if aria2c_path is None:
-            logger.error("未找到Aria2c可执行文件。无法下载文件。")
-            return False
+    def _attempt_urls(self, attempt):
+        """返回本次尝试使用的地址列表。"""
+        if self.multi_source:
+            # 多源模式: 所有镜像同时参与分段下载
+            return self.urls
+        # 单源模式: 每次重试轮换到下一个镜像
+        return [self.urls[(attempt - 1) % len(self.urls)]]
 
-        # 确保目标目录存在
-        os.makedirs(os.path.dirname(self.dest), exist_ok=True)
-
-        # 构建 aria2c 命令参数列表
+    def _build_command(self):
+        """构建不含下载地址的 aria2c 命令参数列表。"""
         cmd = [
             aria2c_path,
             "-x",
@@ -89,6 +115,20 @@ class DownloaderAria2:
             "--max-tries=0",  # 无限重试直到成功
         ]
 
+        # 支持 fallocate 的系统上一次性分配文件空间以减少碎片，
+        # 否则不预分配，避免 aria2 默认的写零预分配
+        if self.preallocate and hasattr(os, "posix_fallocate"):
+            cmd.append("--file-allocation=falloc")
+        else:
+            cmd.append("--file-allocation=none")
+
+        if len(self.urls) > 1:
+            # 根据各镜像的实测速度选择连接
+            cmd.append("--uri-selector=feedback")
+        if self.min_speed > 0:
+            # 丢弃速度低于阈值的连接，aria2 会改用其他镜像
+            cmd.append(f"--lowest-speed-limit={self.min_speed}K")
+
         # 添加请求头
         for key, value in self.header.items():
             # 特殊处理 User-Agent 和 Referer
@@ -114,29 +154,48 @@ class DownloaderAria2:
                     cmd.extend(["--header", f"{key}: {escaped_value}"])
                 else:
                     cmd.extend(["--header", f"{key}: {value}"])
+        return cmd
+
+    def run(self):
+        """
+        使用 aria2c 下载文件。
+        返回 True 表示成功，False 表示失败。
+        """
+        # 确保下载器可用
+        if aria2c_path is None:
+            logger.error("未找到Aria2c可执行文件。无法下载文件。")
+            return False
 
-        # 添加URL
-        cmd.append(self.url)
+        # 确保目标目录存在
+        os.makedirs(os.path.dirname(self.dest), exist_ok=True)
 
-        logger.info("正在执行下载命令", command=" ".join(cmd))
+        cmd = self._build_command()
 
         for attempt in range(1, self.max_retry + 1):
+            # 添加URL
+            attempt_cmd = cmd + self._attempt_urls(attempt)
+            logger.info("正在执行下载命令", command=" ".join(attempt_cmd))
             try:
-                # 使用 subprocess.run 执行命令
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding="utf-8",
+                # 在看门狗监控下执行命令，吞吐量持续过低时终止并重试
+                result = run_with_watchdog(
+                    attempt_cmd,
+                    self.dest,
+                    min_speed=self.stall_speed,
+                    window=self.stall_window,
                 )
 
                 if result.returncode == 0:
                     logger.info("Download successful", dest=self.dest)
                     return True
+                elif result.stalled:
+                    logger.warning(
+                        f"尝试 {attempt} 停滞，URL: {self.url}",
+                        stderr=result.stderr,
+                    )
                 else:
                     logger.warning(
-                        f"尝试 {attempt} 失败，URL: {self.url}。返回码: {result.returncode}",
+                        f"尝试 {attempt} 失败，URL: {self.url}。"
+                        f"返回码: {result.returncode}",
                         stdout=result.stdout,
                         stderr=result.stderr,
                     )
@@ -158,3 +217,231 @@ class DownloaderAria2:
             else:
                 logger.error(f"所有 {self.max_retry} 次尝试均已失败，URL: {self.url}.")
         return False
+
+
+def _option_value(value):
+    """输入文件中的选项值不能包含换行等控制字符。"""
+    return "".join(char for char in str(value) if ord(char) >= 32)
+
+
+@dataclass
+class Aria2Entry:
+    """批量下载中的一个文件"""
+
+    urls: list[str]
+    dest: str
+    header: dict = field(default_factory=dict)
+
+
+class Aria2Batch:
+    """
+    使用一个 aria2c 进程下载多个文件
+
+    所有文件写入一个 aria2 输入文件 (``-i``)，每个条目带有自己的
+    out、dir、header 和 referer 选项，由一个 ``aria2c -j N`` 进程下载，
+    整个季度共享连接和 TLS 会话。
+
+    每个文件完成时 aria2 调用 ``--on-download-complete`` 钩子把路径
+    写入完成记录，调用方可以在其他文件仍在下载时处理已完成的文件。
+    不支持 shell 钩子的系统上在进程退出后按控制文件 (.aria2) 是否
+    消失判断每个文件是否完成。
+    """
+
+    def __init__(
+        self,
+        entries,
+        work_dir,
+        jobs=4,
+        num=16,
+        multi_source=False,
+        min_speed=0,
+        preallocate=True,
+        max_tries=5,
+        stall_speed=0,
+        stall_window=0,
+    ):
+        self.entries = list(entries)
+        self.jobs = max(1, jobs)
+        self.num = num if num <= 16 else 16
+        self.multi_source = multi_source
+        self.min_speed = min_speed
+        self.preallocate = preallocate
+        self.max_tries = max_tries
+        # 所有文件合计的吞吐量持续低于下限时终止 aria2c，未完成的文件由调用方
+        # 单独重新下载
+        self.watchdog = StallWatchdog(stall_speed, stall_window)
+        self.stalled = False
+        # 输入文件、钩子和完成记录放在隐藏的临时目录中
+        os.makedirs(work_dir, exist_ok=True)
+        self.work_dir = tempfile.mkdtemp(prefix=".aria2_batch_", dir=work_dir)
+        self.input_path = os.path.join(self.work_dir, "input.txt")
+        self.done_path = os.path.join(self.work_dir, "completed.txt")
+        self.hook_path = None
+        self.process = None
+
+    def write_input_file(self):
+        """生成 aria2 输入文件，返回其路径。"""
+        lines = []
+        for entry in self.entries:
+            urls = entry.urls if self.multi_source else entry.urls[:1]
+            lines.append("\t".join(urls))
+            lines.append(f"  out={_option_value(os.path.basename(entry.dest))}")
+            lines.append(
+                f"  dir={_option_value(os.path.dirname(os.path.abspath(entry.dest)))}"
+            )
+            for key, value in entry.header.items():
+                if key.lower() == "user-agent":
+                    lines.append(f"  user-agent={_option_value(value)}")
+                elif key.lower() == "referer":
+                    lines.append(f"  referer={_option_value(value)}")
+                else:
+                    lines.append(
+                        f"  header={_option_value(key)}: {_option_value(value)}"
+                    )
+        with open(self.input_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return self.input_path
+
+    def _write_hook(self):
+        """生成完成钩子：aria2 调用时第三个参数是文件路径。"""
+        if os.name != "posix":
+            return None
+        hook_path = os.path.join(self.work_dir, "on-complete.sh")
+        with open(hook_path, "w", encoding="utf-8") as f:
+            f.write("#!/bin/sh\n")
+            f.write(f"printf '%s\\n' \"$3\" >> {shlex.quote(self.done_path)}\n")
+        os.chmod(hook_path, 0o755)
+        return hook_path
+
+    def command(self):
+        cmd = [
+            aria2c_path,
+            "-i",
+            self.input_path,
+            "-j",
+            str(self.jobs),  # 同时下载的文件数
+            "-x",
+            str(self.num),
+            "-s",
+            str(self.num),
+            "-k",
+            "1M",
+            "--continue=true",
+            "--auto-file-renaming=false",
+            "--allow-overwrite=true",
+            "--check-certificate=false",
+            "--console-log-level=warn",
+            "--summary-interval=0",
+            "--retry-wait=1",
+            # 批量下载中的失败文件由调用方单独重新下载，不无限重试
+            f"--max-tries={self.max_tries}",
+        ]
+        if self.preallocate and hasattr(os, "posix_fallocate"):
+            cmd.append("--file-allocation=falloc")
+        else:
+            cmd.append("--file-allocation=none")
+        if self.multi_source:
+            cmd.append("--uri-selector=feedback")
+        if self.min_speed > 0:
+            cmd.append(f"--lowest-speed-limit={self.min_speed}K")
+        if self.hook_path:
+            cmd.append(f"--on-download-complete={self.hook_path}")
+        return cmd
+
+    def start(self):
+        """
+        启动 aria2c
+
+        Returns:
+            bool: 未找到 aria2c 或启动失败时为 False
+        """
+        if aria2c_path is None:
+            logger.error("未找到Aria2c可执行文件。无法批量下载。")
+            return False
+        if not self.entries:
+            return False
+        for entry in self.entries:
+            os.makedirs(os.path.dirname(os.path.abspath(entry.dest)), exist_ok=True)
+        self.write_input_file()
+        self.hook_path = self._write_hook()
+        cmd = self.command()
+        logger.info(
+            "正在执行批量下载命令", files=len(self.entries), command=" ".join(cmd)
+        )
+        try:
+            self.process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            logger.error("无法启动 aria2c", error=str(e))
+            return False
+        return True
+
+    def completed(self):
+        """已完成下载的文件路径。"""
+        try:
+            with open(self.done_path, encoding="utf-8") as f:
+                return {
+                    os.path.abspath(line.rstrip("\n")) for line in f if line.strip()
+                }
+        except OSError:
+            return set()
+
+    def wait(self, paths, poll_interval=0.5):
+        """
+        等待指定的文件下载结束
+
+        Returns:
+            set: 其中下载成功的文件路径
+        """
+        pending = {os.path.abspath(path) for path in paths}
+        while pending:
+            done = self.completed()
+            if pending <= done:
+                return pending
+            if self.process is None or self.process.poll() is not None:
+                # 进程已退出：文件存在且控制文件已消失的下载已完成
+                return {
+                    path
+                    for path in pending
+                    if path in done
+                    or (os.path.exists(path) and not os.path.exists(path + ".aria2"))
+                }
+            if self._check_stall(pending - done):
+                continue
+            time.sleep(poll_interval)
+        return set()
+
+    def _check_stall(self, pending):
+        """
+        对写入量采样，吞吐量持续低于下限时终止 aria2c
+
+        Returns:
+            bool: aria2c 已被终止
+        """
+        if not self.watchdog.enabled:
+            return False
+        written = process_bytes_written(self.process.pid)
+        if written is None:
+            written = sum(file_bytes(path) for path in pending)
+        if not self.watchdog.sample(written):
+            return False
+        logger.warning(
+            "批量下载吞吐量持续低于下限，终止下载进程",
+            pending=len(pending),
+            min_speed=self.watchdog.min_speed,
+            window=self.watchdog.window,
+        )
+        self.stalled = True
+        terminate_process(self.process)
+        return True
+
+    def close(self):
+        """结束仍在运行的 aria2c 并删除临时文件。"""
+        if self.process is not None:
+            terminate_process(self.process)
+        if self.process is not None and self.process.returncode and not self.stalled:
+            logger.warning("批量下载进程返回错误", returncode=self.process.returncode)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
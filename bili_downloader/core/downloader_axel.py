@@ -1,7 +1,12 @@
+import json
 import os
 import shutil
+import struct
 import subprocess
 
+import requests
+
+from bili_downloader.core.watchdog import run_with_watchdog
 from bili_downloader.utils.logger import logger
 from bili_downloader.utils.print_utils import print_warning
 
@@ -44,14 +49,182 @@ if not axel_path:
     axel_path = None
     print_warning("未找到axel可执行文件。axel下载器将无法工作。")
 
+# 记录远程文件校验信息的续传元数据文件后缀
+RESUME_META_SUFFIX = ".st.json"
+
+
+def fetch_remote_validators(url, headers=None, timeout=10):
+    """
+    获取远程文件的大小和校验信息 (ETag / Last-Modified)
+
+    使用只请求一个字节的 Range 请求，以便从 Content-Range 中得到文件总大小。
+
+    Returns:
+        dict | None: {"size", "etag", "last_modified"}，获取失败时返回 None
+    """
+    request_headers = dict(headers or {})
+    request_headers["Range"] = "bytes=0-0"
+    request_headers["Accept-Encoding"] = "identity"
+    try:
+        with requests.get(
+            url, headers=request_headers, stream=True, timeout=timeout
+        ) as resp:
+            resp.raise_for_status()
+            content_range = resp.headers.get("Content-Range", "")
+            if "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                size = int(total) if total.isdigit() else 0
+            else:
+                size = int(resp.headers.get("Content-Length", 0) or 0)
+            if size <= 0:
+                return None
+            return {
+                "size": size,
+                "etag": resp.headers.get("ETag", ""),
+                "last_modified": resp.headers.get("Last-Modified", ""),
+            }
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning("无法获取远程文件信息", url=url, error=str(e))
+        return None
+
+
+def read_state_file_size(state_file):
+    """
+    从 axel 状态文件中解析文件总大小
+
+    状态文件格式: int 连接数, off_t 已下载字节数，然后每个连接一对
+    off_t (当前字节, 最后字节)。最后一个连接的最后字节 + 1 即为文件大小。
+    无法识别时返回 0。
+    """
+    try:
+        with open(state_file, "rb") as f:
+            data = f.read()
+    except OSError:
+        return 0
+    if len(data) < 4:
+        return 0
+    (conn_count,) = struct.unpack_from("=i", data, 0)
+    if conn_count <= 0 or len(data) != 4 + 8 + conn_count * 16:
+        return 0
+    last_byte = max(
+        struct.unpack_from("=q", data, 4 + 8 + i * 16 + 8)[0] for i in range(conn_count)
+    )
+    return last_byte + 1 if last_byte > 0 else 0
+
+
+def validators_match(local, remote):
+    """判断本地记录的校验信息与远程文件是否一致。"""
+    if not local or not remote or local.get("size") != remote.get("size"):
+        return False
+    # 优先比较 ETag，没有 ETag 时比较 Last-Modified
+    if local.get("etag") and remote.get("etag"):
+        return local["etag"] == remote["etag"]
+    if local.get("last_modified") and remote.get("last_modified"):
+        return local["last_modified"] == remote["last_modified"]
+    return True
+
 
 class DownloaderAxel:
-    def __init__(self, url, num, dest, header=None, max_retry=3):
-        self.url = url
+    def __init__(
+        self,
+        url,
+        num,
+        dest,
+        header=None,
+        max_retry=3,
+        multi_source=False,
+        stall_speed=0,
+        stall_window=0,
+    ):
+        # url 可以是单个地址，也可以是按优先级排序的镜像地址列表
+        self.urls = [url] if isinstance(url, str) else list(url)
+        self.url = self.urls[0]
         self.num = num
         self.dest = dest
         self.header = header if header is not None else {}
         self.max_retry = max_retry
+        self.multi_source = multi_source
+        self.stall_speed = stall_speed  # 停滞判定的吞吐量下限(字节/秒)
+        self.stall_window = stall_window  # 停滞判定的时间窗口(秒)
+
+    def _attempt_urls(self, attempt):
+        """返回本次尝试使用的地址列表。"""
+        if self.multi_source:
+            # 多源模式: axel 会把连接分配到所有镜像上
+            return self.urls
+        # 单源模式: 每次重试轮换到下一个镜像
+        return [self.urls[(attempt - 1) % len(self.urls)]]
+
+    @property
+    def state_file(self):
+        return self.dest + ".st"
+
+    @property
+    def meta_file(self):
+        return self.dest + RESUME_META_SUFFIX
+
+    def _discard_partial(self):
+        """删除不可续传的部分下载文件及其状态文件。"""
+        for path in (self.dest, self.state_file, self.meta_file):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"无法移除文件 {path}", error=str(e))
+
+    def _load_resume_meta(self):
+        """读取续传元数据，没有元数据时从状态文件推断文件大小。"""
+        if os.path.exists(self.meta_file):
+            try:
+                with open(self.meta_file, encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        size = read_state_file_size(self.state_file)
+        return {"size": size} if size else None
+
+    def _save_resume_meta(self):
+        """状态文件存在时记录远程文件的校验信息，供下次续传时比对。"""
+        if not os.path.exists(self.state_file) or os.path.exists(self.meta_file):
+            return
+        remote = fetch_remote_validators(self.url, self.header)
+        if not remote:
+            return
+        try:
+            with open(self.meta_file, "w", encoding="utf-8") as f:
+                json.dump(remote, f)
+        except OSError as e:
+            logger.warning("无法保存续传信息", path=self.meta_file, error=str(e))
+
+    def _prepare_resume(self):
+        """
+        检查状态文件能否用于续传
+
+        远程文件大小和校验信息与本地记录一致时保留部分文件由 axel 续传，
+        否则删除部分文件从头下载。
+        """
+        if not os.path.exists(self.state_file):
+            # 没有状态文件时遗留的元数据已无意义
+            if os.path.exists(self.meta_file):
+                os.remove(self.meta_file)
+            return
+        if not os.path.exists(self.dest):
+            self._discard_partial()
+            return
+
+        local = self._load_resume_meta()
+        remote = fetch_remote_validators(self.url, self.header)
+        if validators_match(local, remote):
+            logger.info("从状态文件续传", dest=self.dest, size=remote["size"])
+            return
+
+        logger.info(
+            "远程文件已变化或无法校验，重新下载",
+            dest=self.dest,
+            local=local,
+            remote=remote,
+        )
+        self._discard_partial()
 
     def run(self):
         """
@@ -66,13 +239,8 @@ class DownloaderAxel:
         # 确保目标目录存在
         os.makedirs(os.path.dirname(self.dest), exist_ok=True)
 
-        # 清除可能存在的不完整状态文件
-        state_file = self.dest + ".st"
-        if os.path.exists(state_file):
-            try:
-                os.remove(state_file)
-            except Exception as e:
-                logger.warning(f"无法移除状态文件 {state_file}", error=str(e))
+        # 检查是否可以从状态文件续传
+        self._prepare_resume()
 
         # 构建 axel 命令参数列表
         cmd = [
@@ -118,26 +286,26 @@ class DownloaderAxel:
             else:
                 cmd.extend(["-H", f"{key}: {value}"])
 
-        # 添加URL
-        cmd.append(self.url)
-
-        logger.info("正在执行下载命令", command=" ".join(cmd))
-
         for attempt in range(1, self.max_retry + 1):
+            # 添加URL
+            attempt_cmd = cmd + self._attempt_urls(attempt)
+            logger.info("正在执行下载命令", command=" ".join(attempt_cmd))
             try:
-                # 使用 subprocess.run 执行命令
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding="utf-8",
-                    timeout=300,  # 设置5分钟超时
+                # 在看门狗监控下执行命令，吞吐量持续过低时终止并重试
+                result = run_with_watchdog(
+                    attempt_cmd,
+                    self.dest,
+                    min_speed=self.stall_speed,
+                    window=self.stall_window,
                 )
 
                 if result.returncode == 0:
                     logger.info("Download successful", dest=self.dest)
+                    if os.path.exists(self.meta_file):
+                        os.remove(self.meta_file)
                     return True
+                elif result.stalled:
+                    logger.error(f"尝试 {attempt} 停滞，URL: {self.url}")
                 else:
                     logger.warning(
                         f"尝试 {attempt} 失败，URL: {self.url}。返回码: {result.returncode}",
@@ -145,8 +313,6 @@ class DownloaderAxel:
                     )
                     # 不立即退出，如果还有重试次数则继续
 
-            except subprocess.TimeoutExpired:
-                logger.error(f"尝试 {attempt} 超时，URL: {self.url}")
             except subprocess.SubprocessError as e:
                 logger.error(
                     f"尝试 {attempt} 失败，URL: {self.url}，子进程错误",
@@ -158,6 +324,9 @@ class DownloaderAxel:
                     error=str(e),
                 )
 
+            # 保留状态文件，下一次尝试 (或下一次运行) 会从中断处继续
+            self._save_resume_meta()
+
             if attempt < self.max_retry:
                 logger.info(f"正在重试... ({attempt}/{self.max_retry})")
             else:
@@ -0,0 +1,120 @@
+"""下载完整性校验模块"""
+
+import hashlib
+import os
+
+from bili_downloader.core.mp4 import iter_boxes, parse_sidx
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _parse_range(value):
+    """把 "起始-结束" 形式的字节范围解析为整数元组。"""
+    if not value or "-" not in str(value):
+        return None
+    start, end = str(value).split("-", 1)
+    try:
+        return int(start), int(end)
+    except ValueError:
+        return None
+
+
+def get_segment_base(stream):
+    """
+    获取 DASH 流条目的初始化段和索引段字节范围
+
+    兼容 playurl 返回的 ``segment_base`` 和 ``SegmentBase`` 两种写法。
+
+    Returns:
+        tuple[tuple[int, int], tuple[int, int]] | None: (初始化段范围, 索引段范围)
+    """
+    segment_base = stream.get("segment_base") or stream.get("SegmentBase") or {}
+    init_range = _parse_range(
+        segment_base.get("initialization") or segment_base.get("Initialization")
+    )
+    index_range = _parse_range(
+        segment_base.get("index_range") or segment_base.get("indexRange")
+    )
+    if not init_range or not index_range:
+        return None
+    return init_range, index_range
+
+
+def find_sidx(data, base_offset):
+    """
+    在索引段数据中查找 sidx 盒子
+
+    Args:
+        data: 索引段数据
+        base_offset: data 在文件中的起始位置
+
+    Returns:
+        tuple[Sidx, int]: sidx 和其在文件中的结束位置 (子分段偏移的参考点)
+
+    Raises:
+        ValueError: 数据中没有合法的 sidx 盒子
+    """
+    for box in iter_boxes(data):
+        if box.type == "sidx":
+            sidx, end = parse_sidx(data, box.offset)
+            return sidx, base_offset + end
+    raise ValueError("索引段中没有sidx盒子")
+
+
+def expected_size_from_index(path, stream):
+    """
+    根据本地文件中的 sidx 段索引计算流文件应有的大小
+
+    Returns:
+        int: 应有的文件大小，流条目没有 SegmentBase 信息时返回 0
+
+    Raises:
+        ValueError: 文件过短或索引段损坏
+    """
+    segment_base = get_segment_base(stream)
+    if not segment_base:
+        return 0
+    _, (index_start, index_end) = segment_base
+    with open(path, "rb") as f:
+        f.seek(index_start)
+        data = f.read(index_end - index_start + 1)
+    if len(data) != index_end - index_start + 1:
+        raise ValueError("文件长度不足以包含索引段")
+    sidx, anchor = find_sidx(data, index_start)
+    return sidx.total_size(anchor)
+
+
+def verify_stream_file(path, stream, expected_size=0):
+    """
+    校验下载完成的流文件
+
+    Args:
+        path: 流文件路径
+        stream: playurl 返回的 DASH 流条目
+        expected_size: 服务器报告的文件大小 (Content-Length)，未知时为 0
+
+    Returns:
+        tuple[bool, str]: (是否完整, 失败原因)
+    """
+    if not os.path.exists(path):
+        return False, "文件不存在"
+    actual_size = os.path.getsize(path)
+    if expected_size and actual_size != expected_size:
+        return False, f"文件大小 {actual_size} 与服务器报告的 {expected_size} 不一致"
+
+    try:
+        index_size = expected_size_from_index(path, stream)
+    except (OSError, ValueError) as e:
+        return False, f"索引段校验失败: {e}"
+    if index_size and actual_size != index_size:
+        return False, f"文件大小 {actual_size} 与段索引计算的 {index_size} 不一致"
+    return True, ""
+
+
+def hash_file(path, algorithm="sha256"):
+    """流式计算文件哈希值。"""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
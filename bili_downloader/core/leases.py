@@ -0,0 +1,382 @@
+"""多进程共享的剧集任务队列 (SQLite 租约)"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from bili_downloader.exceptions import LeaseLostError
+from bili_downloader.utils.logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    queue TEXT NOT NULL,
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (queue, key)
+);
+"""
+
+# 任务状态
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def default_owner():
+    """当前进程的标识 (主机名:进程号:随机后缀)。"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+@dataclass
+class WorkItem:
+    """一个被领取的任务"""
+
+    queue: str
+    key: str
+    position: int
+    attempts: int
+    owner: str
+    lease_expires: float
+
+
+class LeaseStore:
+    """共享的任务和租约存储"""
+
+    def __init__(self, path, clock=time.time):
+        self.path = str(path)
+        self.clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # 事务手动控制，领取时需要 BEGIN IMMEDIATE 先取得写锁。共享卷通常是
+        # 网络文件系统，不使用依赖共享内存的 WAL 模式
+        self._conn = sqlite3.connect(
+            self.path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, sql_list):
+        """在一个写事务中执行多条语句，返回最后一条的游标。"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = None
+                for sql, params in sql_list:
+                    cursor = self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor
+
+    def enqueue(self, queue, keys):
+        """
+        登记任务
+
+        已存在的任务保持不变，之前失败的任务重新排队，因此每个进程都可以
+        登记同一个季度的全部剧集。
+        """
+        now = self.clock()
+        self._transaction(
+            [
+                (
+                    "INSERT INTO work_items (queue, key, position, updated_at) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT (queue, key) DO UPDATE SET "
+                    "status = 'pending', attempts = 0, error = '', "
+                    "updated_at = excluded.updated_at WHERE status = 'failed'",
+                    (queue, str(key), position, now),
+                )
+                for position, key in enumerate(keys)
+            ]
+        )
+
+    def claim(self, queue, owner, lease_seconds, max_attempts=3, keys=None):
+        """
+        领取队列中的下一个任务
+
+        可以领取排队中的任务和租约已过期的任务。过期任务的尝试次数已经
+        用完时标记为失败。keys 不为空时只领取其中的任务。
+
+        Returns:
+            WorkItem | None: 领取到的任务，没有可领取的任务时为 None
+        """
+        with self._lock:
+            now = self.clock()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE work_items SET status = 'failed', owner = NULL, "
+                    "error = '租约过期次数过多', updated_at = ? "
+                    "WHERE queue = ? AND status = 'leased' AND lease_expires <= ? "
+                    "AND attempts >= ?",
+                    (now, queue, now, max_attempts),
+                )
+                rows = self._conn.execute(
+                    "SELECT key, position, attempts FROM work_items "
+                    "WHERE queue = ? AND (status = 'pending' OR "
+                    "(status = 'leased' AND lease_expires <= ?)) "
+                    "ORDER BY position",
+                    (queue, now),
+                ).fetchall()
+                item = None
+                for key, position, attempts in rows:
+                    if keys is not None and key not in keys:
+                        continue
+                    item = WorkItem(
+                        queue, key, position, attempts + 1, owner, now + lease_seconds
+                    )
+                    self._conn.execute(
+                        "UPDATE work_items SET status = 'leased', owner = ?, "
+                        "lease_expires = ?, attempts = ?, updated_at = ? "
+                        "WHERE queue = ? AND key = ?",
+                        (owner, item.lease_expires, item.attempts, now, queue, key),
+                    )
+                    break
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return item
+
+    def renew(self, item, lease_seconds):
+        """
+        续约
+
+        Returns:
+            bool: 租约仍属于 item.owner 时为 True
+        """
+        now = self.clock()
+        cursor = self._transaction(
+            [
+                (
+                    "UPDATE work_items SET lease_expires = ?, updated_at = ? "
+                    "WHERE queue = ? AND key = ? AND owner = ? AND status = 'leased'",
+                    (now + lease_seconds, now, item.queue, item.key, item.owner),
+                )
+            ]
+        )
+        if cursor.rowcount:
+            item.lease_expires = now + lease_seconds
+        return cursor.rowcount > 0
+
+    def complete(self, item):
+        """标记任务完成，租约已被其他进程接管时不做修改。"""
+        return self._finish(item, DONE, "")
+
+    def fail(self, item, error="", max_attempts=3):
+        """任务失败：尝试次数未用完时重新排队，否则标记为失败。"""
+        status = PENDING if item.attempts < max_attempts else FAILED
+        return self._finish(item, status, error)
+
+    def _finish(self, item, status, error):
+        cursor = self._transaction(
+            [
+                (
+                    "UPDATE work_items SET status = ?, owner = NULL, "
+                    "lease_expires = NULL, error = ?, updated_at = ? "
+                    "WHERE queue = ? AND key = ? AND owner = ? AND status = 'leased'",
+                    (status, error, self.clock(), item.queue, item.key, item.owner),
+                )
+            ]
+        )
+        if not cursor.rowcount:
+            logger.warning("任务租约已被其他进程接管", queue=item.queue, key=item.key)
+        return cursor.rowcount > 0
+
+    def counts(self, queue):
+        """队列中各状态的任务数。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM work_items WHERE queue = ? "
+                "GROUP BY status",
+                (queue,),
+            ).fetchall()
+        return dict(rows)
+
+    def next_expiry(self, queue, keys=None):
+        """
+        其他进程持有的租约中最早的过期时间
+
+        Returns:
+            float | None: 没有进行中的任务时为 None
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, lease_expires FROM work_items "
+                "WHERE queue = ? AND status = 'leased'",
+                (queue,),
+            ).fetchall()
+        expiries = [exp for key, exp in rows if keys is None or key in keys]
+        return min(expiries) if expiries else None
+
+
+class Heartbeat:
+    """在后台线程中定期为租约续约"""
+
+    def __init__(self, store, item, lease_seconds):
+        self.store = store
+        self.item = item
+        self.lease_seconds = lease_seconds
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"lease-{item.key}", daemon=True
+        )
+
+    def _run(self):
+        # 每个租约周期续约三次，一两次写入失败 (例如数据库繁忙) 不会丢失租约
+        interval = max(1.0, self.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            try:
+                if not self.store.renew(self.item, self.lease_seconds):
+                    logger.warning(
+                        "租约已丢失", queue=self.item.queue, key=self.item.key
+                    )
+                    self.lost.set()
+                    return
+            except sqlite3.Error as e:
+                logger.warning("续约失败", key=self.item.key, error=str(e))
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class EpisodeClaims:
+    """
+    为一次下载运行领取剧集
+
+    ``episodes()`` 依次产出本进程领取到的 ``(序号, 剧集)``，每一集结束时
+    调用 ``finish()``。没有可领取的剧集但其他进程仍持有租约时等待，
+    它们的租约过期后接管，直到队列中的剧集全部完成或失败。本次运行中
+    失败的剧集重新排队，由其他进程或下一次运行重试。
+    """
+
+    def __init__(
+        self,
+        store,
+        queue,
+        owner=None,
+        lease_seconds=300,
+        max_attempts=3,
+        poll_interval=10.0,
+        sleep=time.sleep,
+    ):
+        self.store = store
+        self.queue = queue
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self._current = None
+        self._heartbeat = None
+        # 本次运行中失败的任务键
+        self._failed = set()
+
+    @classmethod
+    def from_settings(cls, settings, info, destdir):
+        """按配置创建，未配置共享存储时返回 None。"""
+        download = settings.download
+        if not download.lease_store:
+            return None
+        queue = str(info.get("season_id") or os.path.basename(os.path.abspath(destdir)))
+        return cls(
+            LeaseStore(download.lease_store),
+            queue,
+            lease_seconds=download.lease_seconds,
+            max_attempts=download.lease_attempts,
+        )
+
+    @staticmethod
+    def episode_key(ep, index):
+        """剧集的任务键，重新上传 (cid 变化) 的剧集是新的任务。"""
+        return str(ep.get("cid") or ep.get("id") or index)
+
+    def episodes(self, episodes, cancel_event=None):
+        by_key = {self.episode_key(ep, i): (i, ep) for i, ep in enumerate(episodes)}
+        self.store.enqueue(self.queue, list(by_key))
+        logger.info(
+            "使用共享任务队列",
+            queue=self.queue,
+            owner=self.owner,
+            store=self.store.path,
+        )
+        while cancel_event is None or not cancel_event.is_set():
+            keys = by_key.keys() - self._failed
+            item = self.store.claim(
+                self.queue,
+                self.owner,
+                self.lease_seconds,
+                self.max_attempts,
+                keys=keys,
+            )
+            if item is None:
+                expiry = self.store.next_expiry(self.queue, keys)
+                if expiry is None:
+                    break
+                # 其他进程仍在下载，等待它们完成或租约过期
+                self.sleep(
+                    min(self.poll_interval, max(0.1, expiry - self.store.clock()))
+                )
+                continue
+            if item.attempts > 1:
+                logger.info(
+                    "接管过期或失败的任务", key=item.key, attempts=item.attempts
+                )
+            self._current = item
+            self._heartbeat = Heartbeat(self.store, item, self.lease_seconds).start()
+            yield by_key[item.key]
+        logger.info(
+            "共享任务队列已处理完毕", queue=self.queue, **self.store.counts(self.queue)
+        )
+
+    @property
+    def lost(self):
+        """当前剧集的租约是否已被其他进程接管。"""
+        return self._heartbeat is not None and self._heartbeat.lost.is_set()
+
+    def check(self):
+        """
+        确认当前剧集的租约仍属于本进程
+
+        Raises:
+            LeaseLostError: 租约已被其他进程接管
+        """
+        if self.lost:
+            raise LeaseLostError(f"剧集租约已被其他进程接管: {self._current.key}")
+
+    def finish(self, status, error=""):
+        """结束当前剧集的租约：成功或跳过时完成，失败时重新排队。"""
+        item, self._current = self._current, None
+        if item is None:
+            return
+        self._heartbeat.stop()
+        self._heartbeat = None
+        if status == "failed":
+            self._failed.add(item.key)
+            self.store.fail(item, error, self.max_attempts)
+        else:
+            self.store.complete(item)
+
+    def close(self):
+        self.finish("failed", "下载中断")
+        self.store.close()
@@ -0,0 +1,220 @@
+"""全局媒体库索引模块"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from bili_downloader.core.manifest import MANIFEST_FILENAME
+from bili_downloader.utils.logger import logger
+
+LIBRARY_FILENAME = "library.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS streams (
+    path TEXT PRIMARY KEY,
+    cid INTEGER NOT NULL,
+    stream_id INTEGER,
+    codecs TEXT NOT NULL DEFAULT '',
+    quality INTEGER,
+    kind TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS streams_key
+    ON streams (cid, stream_id, codecs, quality);
+"""
+
+INSERT_SQL = (
+    "INSERT OR REPLACE INTO streams (path, cid, stream_id, codecs, quality, "
+    "kind, size, mtime, sha256, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+@dataclass
+class LibraryEntry:
+    """索引中的一个流文件"""
+
+    path: str
+    cid: int
+    stream_id: int | None
+    codecs: str
+    quality: int | None
+    kind: str
+    size: int
+    mtime: float
+    sha256: str | None = None
+
+    def is_current(self):
+        """文件仍然存在且大小和修改时间与记录一致。"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return stat.st_size == self.size and stat.st_mtime == self.mtime
+
+
+def _row(entry):
+    return (
+        os.path.abspath(entry.path),
+        entry.cid,
+        entry.stream_id,
+        entry.codecs or "",
+        entry.quality,
+        entry.kind or "",
+        entry.size,
+        entry.mtime,
+        entry.sha256,
+        time.time(),
+    )
+
+
+def _under(path, root):
+    """path 是否位于 root 目录中 (包括子目录)。"""
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def find_manifests(root):
+    """递归查找目录中的下载清单。"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        # 跳过隐藏目录 (例如合并临时目录)
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        if MANIFEST_FILENAME in filenames:
+            yield os.path.join(dirpath, MANIFEST_FILENAME)
+
+
+def entries_from_manifest(manifest_path):
+    """
+    读取一个下载清单中仍然有效的流文件
+
+    文件不存在或大小与清单不一致的条目会被忽略。
+    """
+    directory = os.path.dirname(os.path.abspath(manifest_path))
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            streams = json.load(f).get("streams", {})
+    except (OSError, ValueError) as e:
+        logger.warning("无法读取下载清单", path=manifest_path, error=str(e))
+        return []
+
+    entries = []
+    for name, info in streams.items():
+        if not info.get("cid"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if info.get("size") is not None and info["size"] != stat.st_size:
+            continue
+        entries.append(
+            LibraryEntry(
+                path=path,
+                cid=info["cid"],
+                stream_id=info.get("stream_id"),
+                codecs=info.get("codecs") or "",
+                quality=info.get("quality"),
+                kind=info.get("kind") or "",
+                size=stat.st_size,
+                mtime=stat.st_mtime,
+                sha256=info.get("sha256"),
+            )
+        )
+    return entries
+
+
+class LibraryIndex:
+    """跨目录的流文件索引"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # 下载线程和重建线程共用一个连接，由锁保证串行访问
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get_config_dir() / LIBRARY_FILENAME)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, entry):
+        """记录 (或更新) 一个已校验的流文件。"""
+        self.record_many([entry])
+
+    def record_many(self, entries):
+        with self._lock, self._conn:
+            self._conn.executemany(INSERT_SQL, [_row(e) for e in entries])
+
+    def remove(self, path):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM streams WHERE path = ?", (os.path.abspath(path),)
+            )
+
+    def find(self, cid, stream_id, codecs="", quality=None, exclude=None):
+        """
+        查找可以复用的流文件
+
+        已失效 (被删除或修改) 的条目会从索引中移除。
+
+        Returns:
+            LibraryEntry | None: 最近记录的有效副本
+        """
+        exclude = os.path.abspath(exclude) if exclude else None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, cid, stream_id, codecs, quality, kind, size, mtime, "
+                "sha256 FROM streams WHERE cid = ? AND stream_id IS ? "
+                "AND codecs = ? AND quality IS ? ORDER BY recorded_at DESC",
+                (cid, stream_id, codecs or "", quality),
+            ).fetchall()
+        for row in rows:
+            entry = LibraryEntry(*row)
+            if entry.path == exclude:
+                continue
+            if entry.is_current():
+                return entry
+            self.remove(entry.path)
+        return None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM streams").fetchone()[0]
+
+    def rebuild(self, roots, workers=4):
+        """
+        扫描目录中的下载清单重建索引
+
+        只替换位于 roots 中的条目，其他目录的条目保持不变。
+
+        Returns:
+            int: 写入的条目数
+        """
+        roots = [os.path.abspath(os.path.expanduser(root)) for root in roots]
+        manifests = [path for root in roots for path in find_manifests(root)]
+        entries = []
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for result in executor.map(entries_from_manifest, manifests):
+                entries.extend(result)
+
+        with self._lock, self._conn:
+            existing = [
+                row[0] for row in self._conn.execute("SELECT path FROM streams")
+            ]
+            stale = [(p,) for p in existing if any(_under(p, r) for r in roots)]
+            self._conn.executemany("DELETE FROM streams WHERE path = ?", stale)
+            self._conn.executemany(INSERT_SQL, [_row(e) for e in entries])
+        logger.info("媒体库索引已重建", manifests=len(manifests), streams=len(entries))
+        return len(entries)
@@ -0,0 +1,86 @@
+"""下载清单模块"""
+
+import json
+import os
+import threading
+import time
+
+from bili_downloader.utils.logger import logger
+
+MANIFEST_FILENAME = ".bili_manifest.json"
+MANIFEST_VERSION = 1
+
+
+class DownloadManifest:
+    """下载目录清单"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILENAME)
+        self._lock = threading.RLock()
+        self.data = self._load()
+        # 尚未写入的修改，None 表示删除
+        self._changes = {"streams": {}, "outputs": {}}
+
+    def _load(self):
+        empty = {"version": MANIFEST_VERSION, "streams": {}, "outputs": {}}
+        if not os.path.exists(self.path):
+            return empty
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("无法读取下载清单，将重新创建", path=self.path, error=str(e))
+            return empty
+        data.setdefault("streams", {})
+        data.setdefault("outputs", {})
+        return data
+
+    def save(self):
+        """原子地写入清单文件。"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            data = self._load()
+            for section, changes in self._changes.items():
+                for name, info in changes.items():
+                    if info is None:
+                        data[section].pop(name, None)
+                    else:
+                        data[section][name] = info
+            self.data = data
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._changes = {"streams": {}, "outputs": {}}
+
+    def get_stream(self, filename):
+        with self._lock:
+            return self.data["streams"].get(os.path.basename(filename))
+
+    def record_stream(self, filename, **info):
+        """记录一个已校验的音视频流文件。"""
+        with self._lock:
+            info["recorded_at"] = time.time()
+            name = os.path.basename(filename)
+            self.data["streams"][name] = self._changes["streams"][name] = info
+            self.save()
+
+    def remove_stream(self, filename):
+        with self._lock:
+            name = os.path.basename(filename)
+            if self.data["streams"].pop(name, None) is not None:
+                self._changes["streams"][name] = None
+                self.save()
+
+    def get_output(self, filename):
+        with self._lock:
+            return self.data["outputs"].get(os.path.basename(filename))
+
+    def record_output(self, filename, **info):
+        """记录一个合并完成的输出文件。"""
+        with self._lock:
+            info["recorded_at"] = time.time()
+            name = os.path.basename(filename)
+            self.data["outputs"][name] = self._changes["outputs"][name] = info
+            self.save()
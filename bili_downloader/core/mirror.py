@@ -0,0 +1,146 @@
+"""DASH 镜像测速模块"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import requests
+
+from bili_downloader.utils.logger import logger
+
+# 测速时请求的字节数
+DEFAULT_PROBE_BYTES = 256 * 1024
+# 单个镜像测速超时时间(秒)
+DEFAULT_PROBE_TIMEOUT = 5
+
+
+@dataclass
+class MirrorProbe:
+    """单个镜像的测速结果"""
+
+    url: str
+    ttfb: float = 0.0  # 首字节时间(秒)
+    throughput: float = 0.0  # 吞吐量(字节/秒)
+    total_size: int = 0  # 从 Content-Range 得到的文件总大小
+    error: str = ""
+
+    @property
+    def host(self) -> str:
+        return urlparse(self.url).netloc
+
+    @property
+    def ok(self) -> bool:
+        return not self.error and self.throughput > 0
+
+
+def get_stream_urls(stream: dict) -> list[str]:
+    """
+    获取 DASH 流条目的全部下载地址
+
+    Args:
+        stream: playurl 返回的 dash.video / dash.audio 条目
+
+    Returns:
+        list[str]: 主地址在前、备用地址在后的去重地址列表
+    """
+    urls = []
+    for key in ("base_url", "baseUrl"):
+        url = stream.get(key)
+        if url and url not in urls:
+            urls.append(url)
+    for key in ("backup_url", "backupUrl"):
+        for url in stream.get(key) or []:
+            if url and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def probe_mirror(
+    url: str,
+    headers: dict | None = None,
+    probe_bytes: int = DEFAULT_PROBE_BYTES,
+    timeout: float = DEFAULT_PROBE_TIMEOUT,
+) -> MirrorProbe:
+    """
+    通过 Range 请求下载文件开头的一小段数据来测量镜像速度
+
+    Args:
+        url: 镜像地址
+        headers: 请求头 (需要包含 Referer)
+        probe_bytes: 测速下载的字节数
+        timeout: 超时时间(秒)
+
+    Returns:
+        MirrorProbe: 测速结果，失败时 error 字段非空
+    """
+    headers = dict(headers or {})
+    headers["Range"] = f"bytes=0-{probe_bytes - 1}"
+    # 测速需要原始字节数，避免压缩影响吞吐量计算
+    headers["Accept-Encoding"] = "identity"
+
+    result = MirrorProbe(url=url)
+    start = time.monotonic()
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+            resp.raise_for_status()
+            content_range = resp.headers.get("Content-Range", "")
+            if "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                result.total_size = int(total) if total.isdigit() else 0
+            elif resp.status_code == 200:
+                result.total_size = int(resp.headers.get("Content-Length", 0) or 0)
+
+            received = 0
+            for chunk in resp.iter_content(chunk_size=16 * 1024):
+                if not result.ttfb:
+                    result.ttfb = time.monotonic() - start
+                received += len(chunk)
+                if received >= probe_bytes:
+                    break
+                if time.monotonic() - start > timeout:
+                    break
+
+        elapsed = max(time.monotonic() - start, 1e-6)
+        result.throughput = received / elapsed
+    except (requests.exceptions.RequestException, ValueError) as e:
+        result.error = str(e)
+    return result
+
+
+def rank_mirrors(
+    urls: list[str],
+    headers: dict | None = None,
+    probe_bytes: int = DEFAULT_PROBE_BYTES,
+    timeout: float = DEFAULT_PROBE_TIMEOUT,
+) -> list[MirrorProbe]:
+    """
+    并发测速所有镜像并按吞吐量排序
+
+    Args:
+        urls: 镜像地址列表
+        headers: 请求头
+        probe_bytes: 测速下载的字节数
+        timeout: 超时时间(秒)
+
+    Returns:
+        list[MirrorProbe]: 成功的镜像按吞吐量从高到低排列，失败的镜像排在最后
+    """
+    if not urls:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        probes = list(
+            executor.map(lambda u: probe_mirror(u, headers, probe_bytes, timeout), urls)
+        )
+
+    ranked = sorted(probes, key=lambda p: (not p.ok, -p.throughput, p.ttfb))
+    for probe in ranked:
+        logger.debug(
+            "镜像测速结果",
+            host=probe.host,
+            ttfb=round(probe.ttfb, 3),
+            throughput=int(probe.throughput),
+            error=probe.error,
+        )
+    return ranked
@@ -0,0 +1,206 @@
+"""ISO BMFF (MP4) 盒子解析模块"""
+
+import struct
+from dataclasses import dataclass, field
+
+BOX_HEADER_SIZE = 8
+
+
+@dataclass
+class Box:
+    """盒子的位置信息"""
+
+    type: str
+    offset: int  # 盒子起始位置 (含头部)
+    size: int  # 盒子总大小 (含头部)
+    header_size: int
+
+    @property
+    def payload_offset(self) -> int:
+        return self.offset + self.header_size
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+def parse_box_header(data, offset=0):
+    """
+    解析盒子头部
+
+    Returns:
+        tuple[int, str, int] | None: (盒子大小, 类型, 头部长度)，数据不足时返回 None
+    """
+    if len(data) - offset < BOX_HEADER_SIZE:
+        return None
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    header_size = BOX_HEADER_SIZE
+    if size == 1:
+        if len(data) - offset < 16:
+            return None
+        (size,) = struct.unpack_from(">Q", data, offset + 8)
+        header_size = 16
+    elif size == 0:
+        # 盒子一直延伸到数据末尾
+        size = len(data) - offset
+    return size, box_type.decode("latin-1"), header_size
+
+
+def iter_boxes(data, start=0, end=None):
+    """遍历内存中一段数据里的同级盒子。"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset < end:
+        header = parse_box_header(data, offset)
+        if header is None:
+            return
+        size, box_type, header_size = header
+        if size < header_size or offset + size > end:
+            return
+        yield Box(box_type, offset, size, header_size)
+        offset += size
+
+
+def iter_file_boxes(f, start=0, end=None):
+    """遍历文件中的同级盒子，只读取盒子头部。"""
+    if end is None:
+        f.seek(0, 2)
+        end = f.tell()
+    offset = start
+    while offset + BOX_HEADER_SIZE <= end:
+        f.seek(offset)
+        head = f.read(16)
+        if len(head) < BOX_HEADER_SIZE:
+            return
+        size, box_type = struct.unpack_from(">I4s", head, 0)
+        box_type = box_type.decode("latin-1")
+        header_size = BOX_HEADER_SIZE
+        if size == 1:
+            if len(head) < 16:
+                return
+            (size,) = struct.unpack_from(">Q", head, 8)
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            return
+        yield Box(box_type, offset, size, header_size)
+        offset += size
+
+
+def find_box(data, path, start=0, end=None):
+    """按路径 (例如 ``["moov", "trak"]``) 查找第一个匹配的盒子。"""
+    for box in iter_boxes(data, start, end):
+        if box.type == path[0]:
+            if len(path) == 1:
+                return box
+            return find_box(data, path[1:], box.payload_offset, box.end)
+    return None
+
+
+@dataclass
+class SidxReference:
+    """sidx 中的一个子分段引用"""
+
+    reference_type: int
+    referenced_size: int
+    subsegment_duration: int
+    starts_with_sap: bool
+
+
+@dataclass
+class Sidx:
+    """段索引盒子 (Segment Index Box)"""
+
+    timescale: int
+    earliest_presentation_time: int
+    first_offset: int
+    references: list[SidxReference] = field(default_factory=list)
+
+    def total_size(self, anchor):
+        """
+        计算文件总大小
+
+        Args:
+            anchor: sidx 盒子结束位置 (即子分段偏移的参考点)
+        """
+        return (
+            anchor
+            + self.first_offset
+            + sum(ref.referenced_size for ref in self.references)
+        )
+
+    def subsegments(self, anchor):
+        """
+        列出每个子分段的字节范围和时间范围
+
+        Returns:
+            list[tuple[int, int, float, float]]:
+                (起始字节, 结束字节(含), 开始秒, 结束秒)
+        """
+        result = []
+        offset = anchor + self.first_offset
+        time = self.earliest_presentation_time
+        for ref in self.references:
+            start_sec = time / self.timescale
+            end_sec = (time + ref.subsegment_duration) / self.timescale
+            result.append(
+                (offset, offset + ref.referenced_size - 1, start_sec, end_sec)
+            )
+            offset += ref.referenced_size
+            time += ref.subsegment_duration
+        return result
+
+
+def parse_sidx(data, offset=0):
+    """
+    解析 sidx 盒子
+
+    Args:
+        data: 包含完整 sidx 盒子的数据
+        offset: sidx 盒子在 data 中的起始位置
+
+    Returns:
+        tuple[Sidx, int]: 解析结果和盒子的结束位置 (相对于 data)
+
+    Raises:
+        ValueError: 数据不是合法的 sidx 盒子
+    """
+    header = parse_box_header(data, offset)
+    if header is None or header[1] != "sidx":
+        raise ValueError("不是sidx盒子")
+    size, _, header_size = header
+    if offset + size > len(data):
+        raise ValueError("sidx盒子数据不完整")
+
+    pos = offset + header_size
+    version = data[pos]
+    pos += 4  # version + flags
+    _reference_id, timescale = struct.unpack_from(">II", data, pos)
+    pos += 8
+    if version == 0:
+        earliest, first_offset = struct.unpack_from(">II", data, pos)
+        pos += 8
+    else:
+        earliest, first_offset = struct.unpack_from(">QQ", data, pos)
+        pos += 16
+    _reserved, count = struct.unpack_from(">HH", data, pos)
+    pos += 4
+    if pos + count * 12 > offset + size:
+        raise ValueError("sidx引用数量与盒子大小不符")
+
+    sidx = Sidx(timescale, earliest, first_offset)
+    for _ in range(count):
+        ref, duration, sap = struct.unpack_from(">III", data, pos)
+        pos += 12
+        sidx.references.append(
+            SidxReference(
+                reference_type=ref >> 31,
+                referenced_size=ref & 0x7FFFFFFF,
+                subsegment_duration=duration,
+                starts_with_sap=bool(sap >> 31),
+            )
+        )
+    if timescale == 0:
+        raise ValueError("sidx时间刻度为0")
+    return sidx, offset + size
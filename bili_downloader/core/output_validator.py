@@ -0,0 +1,401 @@
+"""合并输出文件校验模块"""
+
+import json
+import os
+import struct
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from bili_downloader.core.mp4 import find_box, iter_boxes, iter_file_boxes
+from bili_downloader.core.vamerger import find_executable
+from bili_downloader.utils.fileops import place_file
+from bili_downloader.utils.logger import logger
+
+CACHE_FILENAME = ".bili_validate_cache.json"
+OUTPUT_EXTENSIONS = (".mkv", ".mp4", ".m4a", ".mka")
+MERGE_TEMP_MARKER = ".merging"
+
+# Matroska 元素 ID
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+INFO_ID = 0x1549A966
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+CLUSTER_ID = 0x1F43B675
+
+ffprobe_path = find_executable("ffprobe")
+
+
+def merge_temp_path(path):
+    """合并时使用的临时文件名，保留扩展名以便 ffmpeg 推断容器格式。"""
+    root, ext = os.path.splitext(path)
+    return f"{root}{MERGE_TEMP_MARKER}{ext}"
+
+
+@dataclass
+class MediaInfo:
+    """容器的时长和流数量"""
+
+    duration: float | None  # 秒，无法得到时为 None
+    streams: int
+
+
+@dataclass
+class ValidationResult:
+    """输出文件校验结果"""
+
+    ok: bool
+    reason: str = ""
+    duration: float | None = None
+    streams: int = 0
+
+
+def _read_vint(f, keep_marker=False):
+    """读取 EBML 变长整数，返回 (值, 长度)；文件结束时返回 (None, 0)。"""
+    first = f.read(1)
+    if not first:
+        return None, 0
+    byte = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not byte & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("无效的EBML变长整数")
+    rest = f.read(length - 1)
+    if len(rest) != length - 1:
+        return None, 0
+    value = byte if keep_marker else byte & (mask - 1)
+    for b in rest:
+        value = (value << 8) | b
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = -1  # 未知大小
+    return value, length
+
+
+def _iter_children(f, end):
+    """遍历当前位置到 end 之间的子元素，生成 (ID, 大小)，调用方负责读取或跳过内容。"""
+    while f.tell() < end:
+        child_id, _ = _read_vint(f, keep_marker=True)
+        child_size, _ = _read_vint(f)
+        if child_id is None or child_size is None or child_size < 0:
+            return
+        yield child_id, child_size
+
+
+def _read_info(f, end, timecode_scale):
+    """解析 Info 元素，返回 (TimecodeScale, Duration)。"""
+    duration = None
+    for child_id, child_size in _iter_children(f, end):
+        payload = f.read(child_size)
+        if child_id == TIMECODE_SCALE_ID:
+            timecode_scale = int.from_bytes(payload, "big")
+        elif child_id == DURATION_ID and child_size in (4, 8):
+            fmt = ">f" if child_size == 4 else ">d"
+            duration = struct.unpack(fmt, payload)[0]
+    return timecode_scale, duration
+
+
+def _count_tracks(f, end):
+    """统计 Tracks 元素中的 TrackEntry 数量。"""
+    tracks = 0
+    for child_id, child_size in _iter_children(f, end):
+        if child_id == TRACK_ENTRY_ID:
+            tracks += 1
+        f.seek(child_size, 1)
+    return tracks
+
+
+def probe_matroska(path):
+    """
+    解析 Matroska 头部得到时长和轨道数量
+
+    Raises:
+        ValueError: 不是 Matroska 文件或头部不完整
+    """
+    with open(path, "rb") as f:
+        element_id, _ = _read_vint(f, keep_marker=True)
+        if element_id != EBML_ID:
+            raise ValueError("不是Matroska文件")
+        size, _ = _read_vint(f)
+        f.seek(size, 1)
+
+        element_id, _ = _read_vint(f, keep_marker=True)
+        if element_id != SEGMENT_ID:
+            raise ValueError("缺少Segment元素")
+        _read_vint(f)
+
+        timecode_scale = 1_000_000
+        duration = None
+        tracks = None
+        while duration is None or tracks is None:
+            element_id, _ = _read_vint(f, keep_marker=True)
+            size, _ = _read_vint(f)
+            if element_id is None or size is None:
+                break
+            if element_id == CLUSTER_ID or size < 0:
+                # 头部元素都应该在第一个 Cluster 之前
+                break
+            start = f.tell()
+            if element_id == INFO_ID:
+                timecode_scale, duration = _read_info(f, start + size, timecode_scale)
+            elif element_id == TRACKS_ID:
+                tracks = _count_tracks(f, start + size)
+            f.seek(start + size)
+
+    if tracks is None:
+        raise ValueError("缺少Tracks元素")
+    seconds = duration * timecode_scale / 1e9 if duration else None
+    return MediaInfo(duration=seconds, streams=tracks)
+
+
+def probe_mp4(path):
+    """
+    解析 MP4 的 moov 盒子得到时长和轨道数量
+
+    Raises:
+        ValueError: 不是 MP4 文件或缺少 moov
+    """
+    with open(path, "rb") as f:
+        boxes = list(iter_file_boxes(f))
+        if not boxes or boxes[0].type != "ftyp":
+            raise ValueError("不是MP4文件")
+        moov = next((b for b in boxes if b.type == "moov"), None)
+        if moov is None:
+            raise ValueError("缺少moov盒子")
+        f.seek(moov.offset)
+        data = f.read(moov.size)
+
+    tracks = sum(
+        1 for b in iter_boxes(data, moov.header_size, moov.size) if b.type == "trak"
+    )
+    mvhd = find_box(data, ["mvhd"], moov.header_size, moov.size)
+    if mvhd is None:
+        raise ValueError("缺少mvhd盒子")
+    pos = mvhd.payload_offset
+    if data[pos] == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, pos + 4 + 16)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, pos + 4 + 8)
+
+    if not duration:
+        # 分片 MP4 的总时长记录在 mvex/mehd 中
+        mehd = find_box(data, ["mvex", "mehd"], moov.header_size, moov.size)
+        if mehd is not None:
+            pos = mehd.payload_offset
+            fmt = ">Q" if data[pos] == 1 else ">I"
+            (duration,) = struct.unpack_from(fmt, data, pos + 4)
+
+    seconds = duration / timescale if duration and timescale else None
+    return MediaInfo(duration=seconds, streams=tracks)
+
+
+def probe_ffprobe(path):
+    """
+    使用 ffprobe 获取时长和流数量
+
+    Raises:
+        ValueError: ffprobe 不可用或无法解析文件
+    """
+    if ffprobe_path is None:
+        raise ValueError("未找到ffprobe可执行文件")
+    cmd = [
+        ffprobe_path,
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration:stream=codec_type",
+        "-of",
+        "json",
+        path,
+    ]
+    try:
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, encoding="utf-8", timeout=60
+        )
+    except (subprocess.SubprocessError, OSError) as e:
+        raise ValueError(f"ffprobe执行失败: {e}") from e
+    if result.returncode != 0:
+        raise ValueError(f"ffprobe无法解析文件: {result.stderr.strip()}")
+    data = json.loads(result.stdout or "{}")
+    duration = data.get("format", {}).get("duration")
+    return MediaInfo(
+        duration=float(duration) if duration else None,
+        streams=len(data.get("streams", [])),
+    )
+
+
+def probe_media(path):
+    """依次尝试原生 Matroska / MP4 解析和 ffprobe，返回媒体信息。"""
+    errors = []
+    for probe in (probe_matroska, probe_mp4, probe_ffprobe):
+        try:
+            return probe(path)
+        except (OSError, ValueError, struct.error) as e:
+            errors.append(str(e))
+    raise ValueError("; ".join(errors))
+
+
+class OutputValidator:
+    """带缓存的输出文件校验器"""
+
+    def __init__(self, directory, tolerance=5.0, workers=4):
+        self.directory = directory
+        self.tolerance = tolerance
+        self.workers = workers
+        self.cache_path = os.path.join(directory, CACHE_FILENAME)
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+        # 本次运行中已经与文件状态核对过的缓存条目，之后无需再次 stat
+        self._fresh = set()
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """原子地写入缓存文件。"""
+        with self._lock:
+            data = dict(self._cache)
+        try:
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning("无法保存校验缓存", path=self.cache_path, error=str(e))
+
+    def media_info(self, path):
+        """获取媒体信息，文件大小和修改时间未变化时直接使用缓存。"""
+        key = os.path.basename(path)
+        with self._lock:
+            entry = self._cache.get(key)
+            fresh = key in self._fresh and self._in_directory(path)
+        if entry and fresh:
+            if entry.get("error"):
+                raise ValueError(entry["error"])
+            return MediaInfo(duration=entry.get("duration"), streams=entry["streams"])
+
+        stat = os.stat(path)
+        if (
+            entry
+            and entry.get("size") == stat.st_size
+            and entry.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            if entry.get("error"):
+                raise ValueError(entry["error"])
+            return MediaInfo(duration=entry.get("duration"), streams=entry["streams"])
+
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        try:
+            info = probe_media(path)
+            entry.update(duration=info.duration, streams=info.streams)
+        except ValueError as e:
+            entry["error"] = str(e)
+            with self._lock:
+                self._cache[key] = entry
+            raise
+        with self._lock:
+            self._cache[key] = entry
+        return info
+
+    def _in_directory(self, path):
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.directory)
+
+    def forget(self, path):
+        """文件被删除或改写后调用，下次校验时重新读取文件状态。"""
+        with self._lock:
+            self._fresh.discard(os.path.basename(path))
+
+    def move(self, src, dst):
+        """把文件放到最终位置 (同一文件系统内原子重命名)，并转移其缓存条目。"""
+        place_file(src, dst)
+        with self._lock:
+            self._fresh.discard(os.path.basename(src))
+            self._fresh.discard(os.path.basename(dst))
+            entry = self._cache.pop(os.path.basename(src), None)
+            if entry is not None:
+                self._cache[os.path.basename(dst)] = entry
+
+    def validate(self, path, expected_duration=None, expected_streams=2):
+        """
+        校验一个输出文件
+
+        Args:
+            path: 输出文件路径
+            expected_duration: 剧集时长(秒)，未知时只检查容器结构
+            expected_streams: 期望的流数量
+
+        Returns:
+            ValidationResult: 校验结果
+        """
+        try:
+            info = self.media_info(path)
+        except FileNotFoundError:
+            return ValidationResult(False, "文件不存在")
+        except (OSError, ValueError) as e:
+            return ValidationResult(False, f"无法解析容器: {e}")
+
+        result = ValidationResult(True, duration=info.duration, streams=info.streams)
+        if info.streams < expected_streams:
+            result.ok = False
+            result.reason = f"流数量 {info.streams} 少于期望的 {expected_streams}"
+        elif info.duration is None:
+            result.ok = False
+            result.reason = "容器中没有时长信息"
+        elif expected_duration:
+            allowed = max(self.tolerance, expected_duration * 0.01)
+            if abs(info.duration - expected_duration) > allowed:
+                result.ok = False
+                result.reason = (
+                    f"时长 {info.duration:.1f}s "
+                    f"与剧集时长 {expected_duration:.1f}s 不符"
+                )
+        return result
+
+    def validate_directory(self, expected_durations=None, expected_streams=2):
+        """
+        并行校验目录中的所有输出文件并预热缓存
+
+        Args:
+            expected_durations: 文件名到剧集时长(秒)的映射
+
+        Returns:
+            dict[str, ValidationResult]: 文件名到校验结果的映射
+        """
+        expected_durations = expected_durations or {}
+        if not os.path.isdir(self.directory):
+            return {}
+        names = [
+            entry.name
+            for entry in os.scandir(self.directory)
+            if entry.is_file()
+            and entry.name.lower().endswith(OUTPUT_EXTENSIONS)
+            and MERGE_TEMP_MARKER not in entry.name
+        ]
+        if not names:
+            return {}
+
+        def check(name):
+            return name, self.validate(
+                os.path.join(self.directory, name),
+                expected_durations.get(name),
+                expected_streams,
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            results = dict(executor.map(check, names))
+        with self._lock:
+            self._fresh.update(names)
+        self.save()
+        return results
@@ -0,0 +1,94 @@
+"""磁盘空间规划模块"""
+
+import os
+import shutil
+from dataclasses import dataclass
+
+# 估算的封装开销和码率波动余量
+DEFAULT_MARGIN = 0.05
+
+
+@dataclass
+class DiskPlan:
+    """磁盘空间估算结果"""
+
+    episodes: int
+    stream_bytes: int  # 所有剧集音视频流的估算大小
+    peak_bytes: int  # 下载过程中需要的最大磁盘空间
+    free_bytes: int
+    reserve_bytes: int = 0  # 需要保留的空闲空间
+
+    @property
+    def ok(self) -> bool:
+        return self.free_bytes - self.reserve_bytes >= self.peak_bytes
+
+    @property
+    def shortfall(self) -> int:
+        return max(0, self.peak_bytes + self.reserve_bytes - self.free_bytes)
+
+
+def stream_bandwidth(stream):
+    """获取 DASH 流的码率(比特/秒)，未知时返回 0。"""
+    if not stream:
+        return 0
+    return int(stream.get("bandwidth") or 0)
+
+
+def estimate_bytes(bandwidth, duration):
+    """根据码率(比特/秒)和时长(秒)估算字节数。"""
+    return int(bandwidth * duration / 8)
+
+
+def free_space(path):
+    """获取路径所在文件系统的可用空间，路径不存在时向上查找已存在的目录。"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+def plan_disk_usage(
+    durations,
+    bandwidth,
+    free_bytes,
+    doclean=False,
+    stream_merge=False,
+    reserve_bytes=0,
+    margin=DEFAULT_MARGIN,
+):
+    """
+    估算下载所需的磁盘空间
+
+    Args:
+        durations: 各剧集时长(秒)
+        bandwidth: 音视频流码率之和(比特/秒)
+        free_bytes: 当前可用空间
+        doclean: 合并后是否删除音视频流
+        stream_merge: 是否使用流式合并 (不写中间文件)
+        reserve_bytes: 需要保留的空闲空间
+        margin: 估算余量比例
+
+    Returns:
+        DiskPlan: 估算结果
+    """
+    sizes = [int(estimate_bytes(bandwidth, d) * (1 + margin)) for d in durations]
+    total = sum(sizes)
+    if stream_merge:
+        # 只写出最终文件
+        peak = total
+    elif doclean:
+        # 合并时当前剧集的音视频流和输出文件同时存在
+        peak = total + max(sizes, default=0)
+    else:
+        # 音视频流和输出文件都会保留
+        peak = total * 2
+    return DiskPlan(
+        episodes=len(sizes),
+        stream_bytes=total,
+        peak_bytes=peak,
+        free_bytes=free_bytes,
+        reserve_bytes=reserve_bytes,
+    )
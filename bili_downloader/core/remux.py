@@ -0,0 +1,743 @@
+"""内置 DASH 封装模块"""
+
+import heapq
+import os
+import struct
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+
+from bili_downloader.core.mp4 import Box, find_box, iter_boxes, iter_file_boxes
+from bili_downloader.exceptions import RemuxError
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+MP4_EXTENSIONS = (".mp4", ".m4v", ".m4a", ".mov")
+MATROSKA_EXTENSIONS = (".mkv", ".mka")
+
+VIDEO_CODECS = {
+    "avc1": ("V_MPEG4/ISO/AVC", "avcC"),
+    "avc3": ("V_MPEG4/ISO/AVC", "avcC"),
+    "hvc1": ("V_MPEGH/ISO/HEVC", "hvcC"),
+    "hev1": ("V_MPEGH/ISO/HEVC", "hvcC"),
+    "av01": ("V_AV1", "av1C"),
+}
+AUDIO_CODECS = {"mp4a": "A_AAC", "ec-3": "A_EAC3", "fLaC": "A_FLAC"}
+
+# 采样标志中的 sample_is_non_sync_sample 位
+NON_SYNC_SAMPLE = 0x00010000
+
+# Matroska 元素 ID
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+SEEK_HEAD_ID = 0x114D9B74
+INFO_ID = 0x1549A966
+TRACKS_ID = 0x1654AE6B
+CLUSTER_ID = 0x1F43B675
+CUES_ID = 0x1C53BB6B
+VOID_ID = 0xEC
+
+# 为 SeekHead 预留的空间，写完 Cues 后回填
+SEEK_HEAD_RESERVED = 160
+# 视频关键帧处开始新 Cluster 的最小间隔(毫秒)
+CLUSTER_MIN_DURATION = 5000
+
+
+@dataclass
+class Fragment:
+    """一个 moof + mdat 分片"""
+
+    moof: Box
+    mdat: Box | None
+    start: int  # 解码时间，轨道时间刻度
+    duration: int
+    explicit_base: bool
+
+
+@dataclass
+class Sample:
+    offset: int  # 在输入文件中的绝对位置
+    size: int
+    duration: int
+    cto: int
+    keyframe: bool
+
+
+@dataclass
+class Track:
+    """单轨 fMP4 输入"""
+
+    path: str
+    kind: str  # "video" 或 "audio"
+    fourcc: str
+    track_id: int
+    timescale: int
+    movie_timescale: int
+    trak: bytes
+    trex: bytes
+    codec_private: bytes | None = None
+    width: int = 0
+    height: int = 0
+    channels: int = 0
+    sample_rate: int = 0
+    offset: float = 0.0  # 编辑列表带来的呈现时间偏移(秒)
+    fragments: list[Fragment] = field(default_factory=list)
+
+    @property
+    def defaults(self):
+        """trex 中的默认 (采样描述索引, 时长, 大小, 标志)"""
+        return struct.unpack_from(">IIII", self.trex, 16)
+
+    @property
+    def duration(self) -> float:
+        """轨道时长(秒)"""
+        end = max((f.start + f.duration for f in self.fragments), default=0)
+        return max(0.0, end / self.timescale + self.offset)
+
+    def fragment_time(self, fragment) -> float:
+        return fragment.start / self.timescale + self.offset
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type.encode()) + payload
+
+
+def _child(data, parent, path):
+    return find_box(data, path, parent.payload_offset, parent.end)
+
+
+def _full_box_version(data, box):
+    return data[box.payload_offset]
+
+
+def _decoder_specific_info(data):
+    """从 esds 的 ES_Descriptor 中取出 AudioSpecificConfig。"""
+
+    def read_descriptor(pos):
+        tag = data[pos]
+        pos += 1
+        size = 0
+        for _ in range(4):
+            byte = data[pos]
+            pos += 1
+            size = (size << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+        return tag, pos, size
+
+    tag, pos, _ = read_descriptor(0)
+    if tag != 0x03:
+        raise RemuxError("esds中缺少ES_Descriptor")
+    flags = data[pos + 2]
+    pos += 3
+    if flags & 0x80:
+        pos += 2
+    if flags & 0x40:
+        pos += 1 + data[pos]
+    if flags & 0x20:
+        pos += 2
+    tag, pos, _ = read_descriptor(pos)
+    if tag != 0x04:
+        raise RemuxError("esds中缺少DecoderConfigDescriptor")
+    tag, pos, size = read_descriptor(pos + 13)
+    if tag != 0x05:
+        raise RemuxError("esds中缺少DecoderSpecificInfo")
+    return data[pos : pos + size]
+
+
+def _parse_sample_entry(track, trak, stsd):
+    """解析 stsd 中的第一个采样描述，得到编码参数。"""
+    entries = list(iter_boxes(trak, stsd.payload_offset + 8, stsd.end))
+    if len(entries) != 1:
+        raise RemuxError("只支持单个采样描述")
+    entry = entries[0]
+    track.fourcc = entry.type
+    pos = entry.payload_offset
+
+    if entry.type in VIDEO_CODECS:
+        track.kind = "video"
+        track.width, track.height = struct.unpack_from(">HH", trak, pos + 24)
+        config = find_box(trak, [VIDEO_CODECS[entry.type][1]], pos + 78, entry.end)
+        if config is None:
+            raise RemuxError(f"{entry.type} 缺少编码配置")
+        track.codec_private = trak[config.payload_offset : config.end]
+    elif entry.type in AUDIO_CODECS:
+        track.kind = "audio"
+        (track.channels,) = struct.unpack_from(">H", trak, pos + 16)
+        track.sample_rate = struct.unpack_from(">I", trak, pos + 24)[0] >> 16
+        if entry.type == "mp4a":
+            esds = find_box(trak, ["esds"], pos + 28, entry.end)
+            if esds is None:
+                raise RemuxError("mp4a 缺少esds")
+            track.codec_private = _decoder_specific_info(
+                trak[esds.payload_offset + 4 : esds.end]
+            )
+        elif entry.type == "fLaC":
+            dfla = find_box(trak, ["dfLa"], pos + 28, entry.end)
+            if dfla is None:
+                raise RemuxError("fLaC 缺少dfLa")
+            track.codec_private = b"fLaC" + trak[dfla.payload_offset + 4 : dfla.end]
+    else:
+        raise RemuxError(f"不支持的编码: {entry.type}")
+
+
+def _edit_offset(trak, root, timescale, movie_timescale):
+    """根据编辑列表计算呈现时间偏移(秒)。"""
+    elst = _child(trak, root, ["edts", "elst"])
+    if elst is None:
+        return 0.0
+    version = _full_box_version(trak, elst)
+    (count,) = struct.unpack_from(">I", trak, elst.payload_offset + 4)
+    pos = elst.payload_offset + 8
+    offset = 0.0
+    for _ in range(count):
+        if version == 1:
+            segment_duration, media_time = struct.unpack_from(">Qq", trak, pos)
+            pos += 20
+        else:
+            segment_duration, media_time = struct.unpack_from(">Ii", trak, pos)
+            pos += 12
+        if media_time == -1:
+            # 空编辑表示延迟开始
+            offset += segment_duration / movie_timescale
+            continue
+        offset -= media_time / timescale
+        break
+    return offset
+
+
+def _parse_tfhd(moof, tfhd, moof_offset, track):
+    """
+    解析 tfhd，得到分片的基准数据偏移和默认采样参数
+
+    Returns:
+        tuple[int, int, tuple[int, int, int]]: (标志, 基准偏移, (时长, 大小, 标志))
+    """
+    pos = tfhd.payload_offset
+    flags, track_id = struct.unpack_from(">II", moof, pos)
+    flags &= 0xFFFFFF
+    pos += 8
+    if track_id != track.track_id:
+        raise RemuxError("分片的轨道ID与moov不一致")
+    _, default_duration, default_size, default_flags = track.defaults
+    base = moof_offset
+    if flags & 0x1:
+        (base,) = struct.unpack_from(">Q", moof, pos)
+        pos += 8
+    if flags & 0x2:
+        pos += 4
+    if flags & 0x8:
+        (default_duration,) = struct.unpack_from(">I", moof, pos)
+        pos += 4
+    if flags & 0x10:
+        (default_size,) = struct.unpack_from(">I", moof, pos)
+        pos += 4
+    if flags & 0x20:
+        (default_flags,) = struct.unpack_from(">I", moof, pos)
+    return flags, base, (default_duration, default_size, default_flags)
+
+
+def _parse_tfdt(moof, traf):
+    """返回 tfdt 中的解码时间，没有 tfdt 时返回 None。"""
+    tfdt = _child(moof, traf, ["tfdt"])
+    if tfdt is None:
+        return None
+    fmt = ">Q" if _full_box_version(moof, tfdt) == 1 else ">I"
+    return struct.unpack_from(fmt, moof, tfdt.payload_offset + 4)[0]
+
+
+def _read_trun_sample(moof, pos, run_flags, cto_format, defaults):
+    """读取 trun 中一个采样的字段，返回 (时长, 大小, 标志, 合成时间偏移, 新位置)。"""
+    duration, size, sample_flags = defaults
+    cto = 0
+    if run_flags & 0x100:
+        (duration,) = struct.unpack_from(">I", moof, pos)
+        pos += 4
+    if run_flags & 0x200:
+        (size,) = struct.unpack_from(">I", moof, pos)
+        pos += 4
+    if run_flags & 0x400:
+        (sample_flags,) = struct.unpack_from(">I", moof, pos)
+        pos += 4
+    if run_flags & 0x800:
+        (cto,) = struct.unpack_from(cto_format, moof, pos)
+        pos += 4
+    return duration, size, sample_flags, cto, pos
+
+
+def _parse_trun(moof, trun, base, data_pos, defaults, track):
+    """
+    解析一个 trun 盒子
+
+    Returns:
+        tuple[list[Sample], int]: (采样列表, 下一个采样的数据位置)
+    """
+    pos = trun.payload_offset
+    version_flags, count = struct.unpack_from(">II", moof, pos)
+    version, run_flags = version_flags >> 24, version_flags & 0xFFFFFF
+    pos += 8
+    if run_flags & 0x1:
+        (data_offset,) = struct.unpack_from(">i", moof, pos)
+        data_pos = base + data_offset
+        pos += 4
+    first_defaults = defaults
+    if run_flags & 0x4:
+        (first_flags,) = struct.unpack_from(">I", moof, pos)
+        first_defaults = (defaults[0], defaults[1], first_flags)
+        pos += 4
+    cto_format = ">i" if version == 1 else ">I"
+    samples = []
+    for i in range(count):
+        duration, size, sample_flags, cto, pos = _read_trun_sample(
+            moof, pos, run_flags, cto_format, first_defaults if i == 0 else defaults
+        )
+        keyframe = track.kind == "audio" or not sample_flags & NON_SYNC_SAMPLE
+        samples.append(Sample(data_pos, size, duration, cto, keyframe))
+        data_pos += size
+    return samples, data_pos
+
+
+def parse_fragment(moof, moof_offset, track):
+    """
+    解析一个 moof 盒子
+
+    Returns:
+        tuple[int | None, list[Sample], bool]:
+            (tfdt 解码时间, 采样列表, 是否使用绝对数据偏移)
+    """
+    root = Box("moof", 0, len(moof), 8)
+    trafs = [b for b in iter_boxes(moof, root.header_size) if b.type == "traf"]
+    if len(trafs) != 1:
+        raise RemuxError("每个分片只支持一个traf")
+    traf = trafs[0]
+
+    tfhd = _child(moof, traf, ["tfhd"])
+    if tfhd is None:
+        raise RemuxError("traf缺少tfhd")
+    flags, base, defaults = _parse_tfhd(moof, tfhd, moof_offset, track)
+    decode_time = _parse_tfdt(moof, traf)
+
+    samples = []
+    data_pos = base
+    for trun in iter_boxes(moof, traf.payload_offset, traf.end):
+        if trun.type != "trun":
+            continue
+        run_samples, data_pos = _parse_trun(moof, trun, base, data_pos, defaults, track)
+        samples.extend(run_samples)
+    return decode_time, samples, bool(flags & 0x1)
+
+
+def _timescale(data, box):
+    """读取 mvhd / mdhd 中的时间刻度。"""
+    skip = 16 if _full_box_version(data, box) == 1 else 8
+    return struct.unpack_from(">I", data, box.payload_offset + 4 + skip)[0]
+
+
+def _find_trex(moov_data, root, track_id):
+    """返回轨道对应的 trex 盒子，没有时生成全部为默认值的 trex。"""
+    mvex = _child(moov_data, root, ["mvex"])
+    if mvex is not None:
+        for box in iter_boxes(moov_data, mvex.payload_offset, mvex.end):
+            if box.type != "trex":
+                continue
+            (trex_track_id,) = struct.unpack_from(
+                ">I", moov_data, box.payload_offset + 4
+            )
+            if trex_track_id == track_id:
+                return moov_data[box.offset : box.end]
+    return _box("trex", struct.pack(">IIIIII", 0, track_id, 1, 0, 0, 0))
+
+
+def _read_fragments(f, track):
+    """扫描 moov 之后的 moof / mdat，填充轨道的分片列表。"""
+    next_time = 0
+    for box in iter_file_boxes(f):
+        if box.type == "moof":
+            f.seek(box.offset)
+            decode_time, samples, explicit = parse_fragment(
+                f.read(box.size), box.offset, track
+            )
+            start = next_time if decode_time is None else decode_time
+            duration = sum(s.duration for s in samples)
+            track.fragments.append(Fragment(box, None, start, duration, explicit))
+            next_time = start + duration
+        elif box.type == "mdat" and track.fragments:
+            last = track.fragments[-1]
+            if last.mdat is None and box.offset == last.moof.end:
+                last.mdat = box
+
+
+def parse_track(path):
+    """
+    解析单轨 fMP4 输入的轨道信息和分片列表
+
+    Raises:
+        RemuxError: 输入不是受支持的单轨分片 MP4
+    """
+    with open(path, "rb") as f:
+        boxes = iter_file_boxes(f)
+        moov = next((b for b in boxes if b.type == "moov"), None)
+        if moov is None:
+            raise RemuxError("输入缺少moov盒子")
+        f.seek(moov.offset)
+        moov_data = f.read(moov.size)
+        root = Box("moov", 0, moov.size, moov.header_size)
+
+        traks = [b for b in iter_boxes(moov_data, root.header_size) if b.type == "trak"]
+        if len(traks) != 1:
+            raise RemuxError("输入必须只包含一条轨道")
+        trak = moov_data[traks[0].offset : traks[0].end]
+        trak_root = Box("trak", 0, len(trak), traks[0].header_size)
+
+        mvhd = _child(moov_data, root, ["mvhd"])
+        tkhd = _child(trak, trak_root, ["tkhd"])
+        mdhd = _child(trak, trak_root, ["mdia", "mdhd"])
+        stsd = _child(trak, trak_root, ["mdia", "minf", "stbl", "stsd"])
+        if None in (mvhd, tkhd, mdhd, stsd):
+            raise RemuxError("轨道信息不完整")
+
+        skip = 16 if _full_box_version(trak, tkhd) == 1 else 8
+        (track_id,) = struct.unpack_from(">I", trak, tkhd.payload_offset + 4 + skip)
+
+        track = Track(
+            path=path,
+            kind="",
+            fourcc="",
+            track_id=track_id,
+            timescale=_timescale(trak, mdhd),
+            movie_timescale=_timescale(moov_data, mvhd),
+            trak=trak,
+            trex=_find_trex(moov_data, root, track_id),
+        )
+        if not track.timescale or not track.movie_timescale:
+            raise RemuxError("时间刻度为0")
+        _parse_sample_entry(track, trak, stsd)
+        track.offset = _edit_offset(
+            trak, trak_root, track.timescale, track.movie_timescale
+        )
+        _read_fragments(f, track)
+    return track
+
+
+def _set_u32(data, pos, value):
+    struct.pack_into(">I", data, pos, value)
+
+
+def _copy_range(src, dst, offset, size):
+    src.seek(offset)
+    while size > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, size))
+        if not chunk:
+            raise RemuxError("输入数据不完整")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+def _mvhd(duration_ms, next_track_id):
+    matrix = struct.pack(">9I", 0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000)
+    return _box(
+        "mvhd",
+        struct.pack(">IIIII", 0, 0, 0, 1000, duration_ms)
+        + struct.pack(">IH", 0x00010000, 0x0100)
+        + b"\0" * 10
+        + matrix
+        + b"\0" * 24
+        + struct.pack(">I", next_track_id),
+    )
+
+
+def _output_trak(track, number):
+    """为输出文件重写轨道 ID，并把编辑列表换算到 1000 的影片时间刻度。"""
+    trak = bytearray(track.trak)
+    root = Box("trak", 0, len(trak), 8)
+    tkhd = _child(trak, root, ["tkhd"])
+    skip = 16 if _full_box_version(trak, tkhd) == 1 else 8
+    _set_u32(trak, tkhd.payload_offset + 4 + skip, number)
+
+    elst = _child(trak, root, ["edts", "elst"])
+    if elst is not None:
+        version = _full_box_version(trak, elst)
+        (count,) = struct.unpack_from(">I", trak, elst.payload_offset + 4)
+        pos = elst.payload_offset + 8
+        fmt, step = (">Q", 20) if version == 1 else (">I", 12)
+        for _ in range(count):
+            (segment_duration,) = struct.unpack_from(fmt, trak, pos)
+            scaled = segment_duration * 1000 // track.movie_timescale
+            struct.pack_into(fmt, trak, pos, scaled)
+            pos += step
+    return bytes(trak)
+
+
+def _write_mp4(tracks, files, out):
+    """把各轨道的分片按时间交织写成一个分片 MP4。"""
+    for track in tracks:
+        if any(f.explicit_base or f.mdat is None for f in track.fragments):
+            raise RemuxError("分片使用绝对数据偏移或缺少mdat")
+
+    duration_ms = round(max(t.duration for t in tracks) * 1000)
+    trexes = b""
+    for number, track in enumerate(tracks, 1):
+        trex = bytearray(track.trex)
+        _set_u32(trex, 12, number)
+        trexes += bytes(trex)
+    out.write(_box("ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso6mp41"))
+    out.write(
+        _box(
+            "moov",
+            _mvhd(duration_ms, len(tracks) + 1)
+            + b"".join(_output_trak(t, n) for n, t in enumerate(tracks, 1))
+            + _box("mvex", _box("mehd", struct.pack(">II", 0, duration_ms)) + trexes),
+        )
+    )
+
+    fragments = heapq.merge(
+        *[
+            [(t.fragment_time(f), index, f) for f in t.fragments]
+            for index, t in enumerate(tracks)
+        ],
+        key=lambda item: item[:2],
+    )
+    for sequence, (_, index, fragment) in enumerate(fragments, 1):
+        src = files[index]
+        src.seek(fragment.moof.offset)
+        moof = bytearray(src.read(fragment.moof.size))
+        root = Box("moof", 0, len(moof), fragment.moof.header_size)
+        mfhd = _child(moof, root, ["mfhd"])
+        tfhd = _child(moof, root, ["traf", "tfhd"])
+        if mfhd is not None:
+            _set_u32(moof, mfhd.payload_offset + 4, sequence)
+        _set_u32(moof, tfhd.payload_offset + 4, index + 1)
+        out.write(moof)
+        _copy_range(src, out, fragment.mdat.offset, fragment.mdat.size)
+
+
+def _ebml_id(element_id):
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+
+
+def _ebml_size(size):
+    length = 1
+    while size >= (1 << (7 * length)) - 1:
+        length += 1
+    return (size | (1 << (7 * length))).to_bytes(length, "big")
+
+
+def _element(element_id, payload):
+    return _ebml_id(element_id) + _ebml_size(len(payload)) + payload
+
+
+def _uint(element_id, value):
+    return _element(
+        element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big")
+    )
+
+
+def _float(element_id, value):
+    return _element(element_id, struct.pack(">d", value))
+
+
+def _string(element_id, value):
+    return _element(element_id, value.encode("utf-8"))
+
+
+def _void(size):
+    """占据 size 字节的 Void 元素。"""
+    if size - 2 <= 126:
+        return bytes([VOID_ID, 0x80 | (size - 2)]) + b"\0" * (size - 2)
+    return bytes([VOID_ID, 0x01]) + (size - 9).to_bytes(7, "big") + b"\0" * (size - 9)
+
+
+def _track_entry(number, track):
+    payload = (
+        _uint(0xD7, number)  # TrackNumber
+        + _uint(0x73C5, number)  # TrackUID
+        + _uint(0x83, 1 if track.kind == "video" else 2)  # TrackType
+        + _uint(0x9C, 0)  # FlagLacing
+        + _string(0x22B59C, "und")  # Language
+    )
+    if track.kind == "video":
+        payload += _string(0x86, VIDEO_CODECS[track.fourcc][0])
+    else:
+        payload += _string(0x86, AUDIO_CODECS[track.fourcc])
+    if track.codec_private:
+        payload += _element(0x63A2, track.codec_private)
+    if track.kind == "video":
+        payload += _element(0xE0, _uint(0xB0, track.width) + _uint(0xBA, track.height))
+    else:
+        payload += _element(
+            0xE1, _float(0xB5, float(track.sample_rate)) + _uint(0x9F, track.channels)
+        )
+    return _element(0xAE, payload)
+
+
+def _track_samples(index, track, src):
+    """按解码顺序逐个产生轨道的采样。"""
+    for fragment in track.fragments:
+        src.seek(fragment.moof.offset)
+        _, samples, _ = parse_fragment(
+            src.read(fragment.moof.size), fragment.moof.offset, track
+        )
+        dts = fragment.start
+        for sample in samples:
+            decode_sec = dts / track.timescale + track.offset
+            pts_ms = round(((dts + sample.cto) / track.timescale + track.offset) * 1000)
+            yield decode_sec, index, pts_ms, sample
+            dts += sample.duration
+
+
+def _write_matroska(tracks, files, out):
+    """把各轨道的采样按解码时间交织写成 Matroska。"""
+    duration_ms = max(t.duration for t in tracks) * 1000
+    has_video = any(t.kind == "video" for t in tracks)
+
+    out.write(
+        _element(
+            EBML_ID,
+            _uint(0x4286, 1)  # EBMLVersion
+            + _uint(0x42F7, 1)  # EBMLReadVersion
+            + _uint(0x42F2, 4)  # EBMLMaxIDLength
+            + _uint(0x42F3, 8)  # EBMLMaxSizeLength
+            + _string(0x4282, "matroska")  # DocType
+            + _uint(0x4287, 4)  # DocTypeVersion
+            + _uint(0x4285, 2),  # DocTypeReadVersion
+        )
+    )
+    out.write(_ebml_id(SEGMENT_ID) + b"\x01" + b"\0" * 7)
+    segment_start = out.tell()
+    out.write(_void(SEEK_HEAD_RESERVED))
+
+    positions = {INFO_ID: out.tell() - segment_start}
+    out.write(
+        _element(
+            INFO_ID,
+            _uint(0x2AD7B1, 1_000_000)  # TimecodeScale
+            + _string(0x4D80, "bili_downloader")  # MuxingApp
+            + _string(0x5741, "bili_downloader")  # WritingApp
+            + _float(0x4489, duration_ms),  # Duration
+        )
+    )
+    positions[TRACKS_ID] = out.tell() - segment_start
+    out.write(
+        _element(
+            TRACKS_ID,
+            b"".join(_track_entry(n, t) for n, t in enumerate(tracks, 1)),
+        )
+    )
+
+    cues = []
+    cluster_pos = None
+    cluster_time = 0
+
+    def close_cluster():
+        end = out.tell()
+        out.seek(cluster_pos + 4)
+        out.write(b"\x01" + (end - cluster_pos - 12).to_bytes(7, "big"))
+        out.seek(end)
+
+    samples = heapq.merge(
+        *[_track_samples(i, t, files[i]) for i, t in enumerate(tracks)],
+        key=lambda item: item[:2],
+    )
+    for _, index, pts_ms, sample in samples:
+        track = tracks[index]
+        relative = pts_ms - cluster_time
+        cluster_point = sample.keyframe and (track.kind == "video" or not has_video)
+        if (
+            cluster_pos is None
+            or not -32768 <= relative <= 32767
+            or (cluster_point and relative >= CLUSTER_MIN_DURATION)
+        ):
+            if cluster_pos is not None:
+                close_cluster()
+            cluster_pos = out.tell()
+            cluster_time = max(0, pts_ms)
+            relative = pts_ms - cluster_time
+            out.write(_ebml_id(CLUSTER_ID) + b"\x01" + b"\0" * 7)
+            out.write(_uint(0xE7, cluster_time))  # Timecode
+            if cluster_point:
+                cues.append((cluster_time, index + 1, cluster_pos - segment_start))
+
+        src = files[index]
+        src.seek(sample.offset)
+        data = src.read(sample.size)
+        if len(data) != sample.size:
+            raise RemuxError("采样数据不完整")
+        header = _ebml_size(index + 1) + struct.pack(
+            ">hB", relative, 0x80 if sample.keyframe else 0
+        )
+        out.write(_ebml_id(0xA3) + _ebml_size(len(header) + len(data)) + header)
+        out.write(data)
+    if cluster_pos is not None:
+        close_cluster()
+
+    if cues:
+        positions[CUES_ID] = out.tell() - segment_start
+        out.write(
+            _element(
+                CUES_ID,
+                b"".join(
+                    _element(
+                        0xBB,  # CuePoint
+                        _uint(0xB3, time)  # CueTime
+                        + _element(
+                            0xB7,  # CueTrackPositions
+                            _uint(0xF7, number) + _uint(0xF1, position),
+                        ),
+                    )
+                    for time, number, position in cues
+                ),
+            )
+        )
+
+    # 回填 SeekHead 和 Segment 大小
+    end = out.tell()
+    seek_head = _element(
+        SEEK_HEAD_ID,
+        b"".join(
+            _element(0x4DBB, _element(0x53AB, _ebml_id(eid)) + _uint(0x53AC, pos))
+            for eid, pos in positions.items()
+        ),
+    )
+    out.seek(segment_start)
+    out.write(seek_head + _void(SEEK_HEAD_RESERVED - len(seek_head)))
+    out.seek(segment_start - 7)
+    out.write((end - segment_start).to_bytes(7, "big"))
+    out.seek(end)
+
+
+def remux(inputs, output):
+    """
+    把多个单轨 fMP4 输入封装为一个文件
+
+    Args:
+        inputs: 输入文件路径列表 (通常为 [视频, 音频])
+        output: 输出文件路径，按扩展名选择 MP4 或 Matroska
+
+    Raises:
+        RemuxError: 输入或输出格式不受支持，调用方应退回到 ffmpeg
+    """
+    ext = os.path.splitext(output)[1].lower()
+    if ext in MATROSKA_EXTENSIONS:
+        writer = _write_matroska
+    elif ext in MP4_EXTENSIONS:
+        writer = _write_mp4
+    else:
+        raise RemuxError(f"不支持的输出格式: {ext}")
+
+    try:
+        tracks = [parse_track(path) for path in inputs]
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        raise RemuxError(f"无法解析输入: {e}") from e
+    if not tracks or any(not t.fragments for t in tracks):
+        raise RemuxError("输入中没有分片")
+
+    try:
+        with ExitStack() as stack:
+            files = [stack.enter_context(open(t.path, "rb")) for t in tracks]
+            out = stack.enter_context(open(output, "wb"))
+            writer(tracks, files, out)
+    except (RemuxError, OSError, ValueError, IndexError, struct.error) as e:
+        if os.path.exists(output):
+            os.remove(output)
+        if isinstance(e, RemuxError):
+            raise
+        raise RemuxError(f"封装失败: {e}") from e
@@ -0,0 +1,343 @@
+"""下载任务服务 (本地 HTTP 任务接口)"""
+
+import heapq
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, fields
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from bili_downloader.utils.logger import logger
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+
+# 任务可以覆盖的下载选项及其类型
+JOB_OPTIONS = {
+    "directory": str,
+    "quality": int,
+    "keyword": str,
+    "cleanup": bool,
+    "downloader": str,
+    "threads": int,
+}
+
+
+@dataclass
+class Job:
+    """一个下载任务"""
+
+    url: str
+    options: dict = field(default_factory=dict)
+    priority: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    title: str = ""
+    episodes: list[dict] = field(default_factory=list)
+    files: list[str] = field(default_factory=list)
+    error: str = ""
+    cancel_event: threading.Event = field(
+        default_factory=threading.Event, repr=False, compare=False
+    )
+
+    def update_episode(self, index, ep, status):
+        """下载过程中的剧集状态回调。"""
+        while len(self.episodes) <= index:
+            self.episodes.append({"index": len(self.episodes), "status": "queued"})
+        self.episodes[index].update(
+            title=ep.get("share_copy") or ep.get("title") or f"Episode_{index + 1}",
+            status=status,
+        )
+
+    def to_dict(self):
+        data = {
+            f.name: getattr(self, f.name)
+            for f in fields(self)
+            if f.name != "cancel_event"
+        }
+        data["episodes"] = [dict(episode) for episode in self.episodes]
+        data["files"] = list(self.files)
+        counts = {}
+        for episode in data["episodes"]:
+            counts[episode["status"]] = counts.get(episode["status"], 0) + 1
+        data["progress"] = counts
+        return data
+
+
+def parse_job_request(data):
+    """
+    校验提交的任务
+
+    Raises:
+        ValueError: 缺少 URL 或选项类型错误
+    """
+    if not isinstance(data, dict) or not data.get("url"):
+        raise ValueError("缺少 url")
+    options = {}
+    for name, value in (data.get("options") or {}).items():
+        expected = JOB_OPTIONS.get(name)
+        if expected is None:
+            raise ValueError(f"未知的选项: {name}")
+        if not isinstance(value, expected) or (
+            expected is int and isinstance(value, bool)
+        ):
+            raise ValueError(f"选项 {name} 应为 {expected.__name__}")
+        options[name] = value
+    priority = data.get("priority", 0)
+    if not isinstance(priority, int) or isinstance(priority, bool):
+        raise ValueError("priority 应为整数")
+    return Job(url=str(data["url"]), options=options, priority=priority)
+
+
+class JobManager:
+    """按优先级执行下载任务的工作线程池"""
+
+    def __init__(self, downloader, settings, workers=2):
+        # 每个任务使用 downloader.fork() 得到的实例，共享会话和缓存
+        self.downloader = downloader
+        self.settings = settings
+        self.workers = max(1, workers)
+        self._jobs = {}
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        for n in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"job-worker-{n}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """停止接收任务，取消进行中的任务并等待工作线程退出。"""
+        with self._condition:
+            self._stopping = True
+            for job in self._jobs.values():
+                job.cancel_event.set()
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, job):
+        with self._condition:
+            self._jobs[job.id] = job
+            # 优先级高的先执行，相同优先级按提交顺序
+            heapq.heappush(self._queue, (-job.priority, next(self._counter), job.id))
+            self._condition.notify()
+        logger.info("任务已提交", job=job.id, url=job.url, priority=job.priority)
+        return job
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._condition:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    def cancel(self, job_id):
+        """
+        取消任务
+
+        Returns:
+            Job | None: 被取消的任务，不存在时为 None
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancel_event.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = time.time()
+        logger.info("任务已取消", job=job_id)
+        return job
+
+    def _next_job(self):
+        with self._condition:
+            while True:
+                if self._stopping:
+                    return None
+                while self._queue:
+                    _, _, job_id = heapq.heappop(self._queue)
+                    job = self._jobs[job_id]
+                    if job.status == "queued":
+                        job.status = "running"
+                        job.started_at = time.time()
+                        return job
+                self._condition.wait()
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self.run_job(job)
+            except Exception as e:
+                logger.error("任务失败", job=job.id, error=str(e))
+                job.error = str(e)
+                job.status = "failed"
+            job.finished_at = time.time()
+
+    def run_job(self, job):
+        """执行一个任务。"""
+        download = self.settings.download
+        options = job.options
+        headers = self.settings.network.headers
+        downloader = self.downloader.fork()
+
+        info = downloader.get_detailed_info_from_url(job.url, headers)
+        job.title = info.get("season_title") or info.get("title") or ""
+        for index, ep in enumerate(info.get("episodes") or []):
+            job.update_episode(index, ep, "queued")
+        job.files = downloader.download_all_from_info_with_quality(
+            info,
+            options.get("directory") or self.settings.history.last_directory,
+            options.get("quality") or download.default_quality,
+            options.get("cleanup", download.cleanup_after_merge),
+            headers,
+            options.get("downloader") or download.default_downloader,
+            options.get("keyword", ""),
+            options.get("threads") or download.default_threads,
+            progress=job.update_episode,
+            cancel_event=job.cancel_event,
+        )
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+        elif any(episode["status"] == "failed" for episode in job.episodes):
+            job.status = "failed"
+            job.error = "部分剧集下载失败"
+        else:
+            job.status = "completed"
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """任务接口的请求处理"""
+
+    server_version = "bili-downloader"
+
+    def log_message(self, format, *args):
+        logger.debug("HTTP 请求", client=self.client_address[0], request=format % args)
+
+    def _send(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        return json.loads(raw.decode("utf-8"))
+
+    def do_GET(self):
+        manager = self.server.manager
+        if self.path == "/health":
+            self._send(HTTPStatus.OK, {"status": "ok"})
+        elif self.path == "/jobs":
+            self._send(
+                HTTPStatus.OK, {"jobs": [job.to_dict() for job in manager.list()]}
+            )
+        elif match := re.fullmatch(r"/jobs/(\w+)", self.path):
+            job = manager.get(match.group(1))
+            if job is None:
+                self._send(HTTPStatus.NOT_FOUND, {"error": "任务不存在"})
+            else:
+                self._send(HTTPStatus.OK, job.to_dict())
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {"error": "未知的路径"})
+
+    def do_POST(self):
+        manager = self.server.manager
+        if self.path == "/jobs":
+            try:
+                job = parse_job_request(self._read_json())
+            except ValueError as e:
+                self._send(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+                return
+            self._send(HTTPStatus.CREATED, manager.submit(job).to_dict())
+        elif match := re.fullmatch(r"/jobs/(\w+)/cancel", self.path):
+            job = manager.cancel(match.group(1))
+            if job is None:
+                self._send(HTTPStatus.NOT_FOUND, {"error": "任务不存在"})
+            else:
+                self._send(HTTPStatus.OK, job.to_dict())
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {"error": "未知的路径"})
+
+
+class JobServer(ThreadingHTTPServer):
+    """任务接口的 HTTP 服务"""
+
+    daemon_threads = True
+
+    def __init__(self, manager, host="127.0.0.1", port=8765):
+        super().__init__((host, port), JobRequestHandler)
+        self.manager = manager
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程中运行服务。"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class JobClient:
+    """任务接口的客户端"""
+
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _request(self, method, path, **kwargs):
+        response = self.session.request(
+            method, self.base_url + path, timeout=self.timeout, **kwargs
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def submit(self, url, priority=0, **options):
+        return self._request(
+            "POST", "/jobs", json={"url": url, "priority": priority, "options": options}
+        )
+
+    def get(self, job_id):
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def list(self):
+        return self._request("GET", "/jobs")["jobs"]
+
+    def cancel(self, job_id):
+        return self._request("POST", f"/jobs/{job_id}/cancel")
+
+    def wait(self, job_id, timeout=60, interval=0.1):
+        """等待任务结束，返回任务状态。"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job["status"] not in ("queued", "running"):
+                return job
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"任务 {job_id} 未在 {timeout} 秒内结束")
+            time.sleep(interval)
@@ -0,0 +1,214 @@
+"""流式合并 (HTTP 响应经命名管道直接送入 ffmpeg，不写中间文件)"""
+
+import errno
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import requests
+
+from bili_downloader.core import vamerger
+from bili_downloader.utils.logger import logger
+from bili_downloader.utils.process import StreamTail, terminate_process
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+FIFO_OPEN_POLL_INTERVAL = 0.05
+
+
+def is_supported():
+    """当前系统是否可以使用流式合并。"""
+    return hasattr(os, "mkfifo") and vamerger.ffmpeg_path is not None
+
+
+def _content_total(response, offset):
+    """根据响应头计算资源总大小，未知时返回 0。"""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit():
+        return offset + int(length)
+    return 0
+
+
+class StreamingMerger:
+    """把音视频 HTTP 流经命名管道直接送入 ffmpeg 合并"""
+
+    def __init__(
+        self,
+        audio_urls,
+        video_urls,
+        output,
+        headers=None,
+        timeout=30,
+        retries=3,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+    ):
+        self.audio_urls = [audio_urls] if isinstance(audio_urls, str) else audio_urls
+        self.video_urls = [video_urls] if isinstance(video_urls, str) else video_urls
+        self.output = output
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.retries = retries
+        self.chunk_size = chunk_size
+        self.bytes_fed = {}
+        self._errors = []
+        self._lock = threading.Lock()
+
+    def _fail(self, name, error, process):
+        with self._lock:
+            self._errors.append(f"{name}: {error}")
+        # 任一输入失败时立即终止 ffmpeg，避免另一个输入阻塞
+        terminate_process(process)
+
+    def _open_fifo(self, path, process):
+        """等待 ffmpeg 打开管道的读端，ffmpeg 提前退出时返回 None。"""
+        while True:
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                if process.poll() is not None:
+                    return None
+                time.sleep(FIFO_OPEN_POLL_INTERVAL)
+                continue
+            os.set_blocking(fd, True)
+            return os.fdopen(fd, "wb")
+
+    def _feed(self, name, urls, fifo_path, process):
+        """下载一个流并写入管道，失败时按 Range 在下一个镜像上继续。"""
+        written = 0
+        total = 0
+        try:
+            pipe = self._open_fifo(fifo_path, process)
+        except OSError as e:
+            self._fail(name, e, process)
+            return
+        if pipe is None:
+            return
+
+        with pipe:
+            attempt = 0
+            while attempt < max(1, self.retries) * len(urls):
+                url = urls[attempt % len(urls)]
+                attempt += 1
+                headers = dict(self.headers)
+                if written:
+                    headers["Range"] = f"bytes={written}-"
+                try:
+                    with requests.get(
+                        url, headers=headers, stream=True, timeout=self.timeout
+                    ) as response:
+                        response.raise_for_status()
+                        if written and response.status_code != 206:
+                            raise requests.RequestException("服务器不支持范围请求")
+                        total = _content_total(response, written) or total
+                        for chunk in response.iter_content(self.chunk_size):
+                            pipe.write(chunk)
+                            written += len(chunk)
+                    if total and written != total:
+                        raise requests.RequestException(
+                            f"传输不完整: {written}/{total}"
+                        )
+                    self.bytes_fed[name] = written
+                    return
+                except (BrokenPipeError, ValueError):
+                    # ffmpeg 已经退出，由调用方根据返回码判断结果
+                    self.bytes_fed[name] = written
+                    return
+                except requests.RequestException as e:
+                    logger.warning(
+                        "流式传输中断，尝试从断点继续",
+                        stream=name,
+                        url=url,
+                        offset=written,
+                        error=str(e),
+                    )
+        self._fail(name, "所有镜像均传输失败", process)
+
+    def run(self):
+        """
+        执行流式合并
+
+        Returns:
+            bool: 合并成功返回 True；失败时删除不完整的输出文件并返回 False
+        """
+        if not is_supported():
+            logger.warning("当前系统不支持流式合并")
+            return False
+
+        os.makedirs(os.path.dirname(self.output) or ".", exist_ok=True)
+        workdir = tempfile.mkdtemp(prefix="bili_merge_")
+        video_fifo = os.path.join(workdir, "video")
+        audio_fifo = os.path.join(workdir, "audio")
+        os.mkfifo(video_fifo)
+        os.mkfifo(audio_fifo)
+
+        cmd = [
+            vamerger.ffmpeg_path,
+            "-y",
+            "-i",
+            video_fifo,
+            "-i",
+            audio_fifo,
+            "-c",
+            "copy",
+            "-map",
+            "0:v",
+            "-map",
+            "1:a",
+            self.output,
+        ]
+        logger.info("正在执行流式合并", output=self.output)
+
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        stderr_tail = StreamTail(process.stderr)
+        feeders = [
+            threading.Thread(
+                target=self._feed,
+                args=(name, urls, fifo, process),
+                daemon=True,
+            )
+            for name, urls, fifo in (
+                ("video", self.video_urls, video_fifo),
+                ("audio", self.audio_urls, audio_fifo),
+            )
+        ]
+        try:
+            for feeder in feeders:
+                feeder.start()
+            process.wait()
+            for feeder in feeders:
+                feeder.join()
+        finally:
+            terminate_process(process)
+            stderr_tail.join(timeout=5)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if process.returncode == 0 and not self._errors:
+            logger.info("流式合并成功", output=self.output, bytes=self.bytes_fed)
+            return True
+
+        logger.error(
+            f"流式合并失败，输出文件: {self.output}",
+            returncode=process.returncode,
+            errors=self._errors,
+            stderr=stderr_tail.text(),
+        )
+        if os.path.exists(self.output):
+            os.remove(self.output)
+        return False
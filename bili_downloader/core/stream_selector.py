@@ -0,0 +1,193 @@
+"""音视频流选择策略模块"""
+
+import re
+from dataclasses import dataclass, field
+
+from bili_downloader.core.planner import estimate_bytes, stream_bandwidth
+
+# playurl 中的 codecid
+CODEC_IDS = {7: "avc", 12: "hevc", 13: "av1"}
+# codecs 字符串前缀
+CODEC_PREFIXES = {
+    "avc1": "avc",
+    "avc3": "avc",
+    "hev1": "hevc",
+    "hvc1": "hevc",
+    "av01": "av1",
+}
+
+# prefer-* 策略在首选编码不可用时的回退顺序
+PREFERENCE_ORDERS = {
+    "av1": ("av1", "hevc", "avc"),
+    "hevc": ("hevc", "av1", "avc"),
+    "avc": ("avc", "hevc", "av1"),
+}
+
+POLICY_MODES = ("default", "smallest", "prefer-av1", "prefer-hevc", "prefer-avc")
+MAX_BITRATE_MODE = "max-bitrate-under"
+
+
+@dataclass
+class SelectionPolicy:
+    """流选择策略"""
+
+    mode: str = "default"
+    max_bitrate: int = 0  # 比特/秒，仅用于 max-bitrate-under
+
+
+@dataclass
+class StreamChoice:
+    """选中的音视频流及其估算的代价"""
+
+    video: dict | None
+    audio: dict | None
+    policy: SelectionPolicy
+    duration: float = 0.0
+    alternatives: list[dict] = field(default_factory=list)  # 同清晰度的其他视频流
+
+    @property
+    def bandwidth(self) -> int:
+        return stream_bandwidth(self.video) + stream_bandwidth(self.audio)
+
+    @property
+    def estimated_bytes(self) -> int:
+        return estimate_bytes(self.bandwidth, self.duration)
+
+    def describe(self) -> str:
+        """描述选择结果以及与其他编码相比的差异。"""
+        if self.video is None:
+            return "没有可用的视频流"
+        parts = [
+            f"{codec_name(self.video).upper()} {self.video.get('id')}",
+            f"{self.bandwidth / 1e6:.2f} Mbps",
+        ]
+        if self.duration:
+            parts.append(f"约 {self.estimated_bytes / 1024**2:.0f} MiB/集")
+        text = f"策略 {format_policy(self.policy)}: " + ", ".join(parts)
+
+        others = []
+        for other in self.alternatives:
+            if other is self.video:
+                continue
+            bandwidth = stream_bandwidth(other) + stream_bandwidth(self.audio)
+            if not bandwidth:
+                continue
+            change = (self.bandwidth - bandwidth) / bandwidth * 100
+            others.append(f"{codec_name(other).upper()} {change:+.0f}%")
+        if others:
+            text += f" (相对 {', '.join(others)})"
+        return text
+
+
+def codec_name(stream):
+    """获取视频流的编码名称 (avc、hevc、av1)，未知时返回 codecs 字符串。"""
+    codec = CODEC_IDS.get(stream.get("codecid"))
+    if codec:
+        return codec
+    codecs = stream.get("codecs") or ""
+    return CODEC_PREFIXES.get(codecs.split(".", 1)[0], codecs)
+
+
+def _parse_bitrate(value):
+    """把 "3000"、"3000k"、"3.5M" 解析为比特/秒 (无后缀时单位为 kbps)。"""
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kKmM]?)(?:bps)?\s*", value)
+    if not match:
+        raise ValueError(f"无法解析码率: {value}")
+    number = float(match.group(1))
+    unit = match.group(2).lower()
+    return int(number * (1_000_000 if unit == "m" else 1000))
+
+
+def parse_policy(text):
+    """
+    解析策略字符串
+
+    Raises:
+        ValueError: 无法识别的策略
+    """
+    text = (text or "default").strip().lower()
+    if text.startswith(MAX_BITRATE_MODE):
+        _, _, value = text.partition("=")
+        return SelectionPolicy(MAX_BITRATE_MODE, _parse_bitrate(value))
+    if text not in POLICY_MODES:
+        raise ValueError(f"未知的流选择策略: {text}")
+    return SelectionPolicy(text)
+
+
+def format_policy(policy):
+    if policy.mode == MAX_BITRATE_MODE:
+        return f"{MAX_BITRATE_MODE}={policy.max_bitrate // 1000}k"
+    return policy.mode
+
+
+def _smallest(streams):
+    return min(streams, key=stream_bandwidth, default=None)
+
+
+def select_streams(
+    videos, audios, quality, policy=None, preferred_codecs=None, duration=0.0
+):
+    """
+    按策略选择视频流和音频流
+
+    Args:
+        videos: playurl dash.video 列表
+        audios: playurl dash.audio 列表
+        quality: 目标清晰度 (qn)
+        policy: 选择策略，默认为 ``default``
+        preferred_codecs: 清晰度格式中列出的第一个编码 (``default`` 策略使用)
+        duration: 剧集时长(秒)，用于估算字节数
+
+    Returns:
+        StreamChoice: 选择结果，没有可用视频流时 video 为 None
+    """
+    policy = policy or SelectionPolicy()
+    videos = videos or []
+    audios = audios or []
+    candidates = [v for v in videos if v.get("id") == quality]
+
+    audio = max(audios, key=lambda a: a.get("id", 0), default=None)
+
+    if policy.mode == "smallest":
+        audio = _smallest(audios)
+        video = _smallest(candidates)
+    elif policy.mode.startswith("prefer-"):
+        order = PREFERENCE_ORDERS[policy.mode.split("-", 1)[1]]
+
+        def rank(stream):
+            codec = codec_name(stream)
+            position = order.index(codec) if codec in order else len(order)
+            return position, stream_bandwidth(stream)
+
+        video = min(candidates, key=rank, default=None)
+    elif policy.mode == MAX_BITRATE_MODE:
+        # 不超过上限的最高清晰度，同一清晰度中取码率最高的
+        budget = policy.max_bitrate - stream_bandwidth(audio)
+        allowed = [
+            v
+            for v in videos
+            if v.get("id", 0) <= quality and stream_bandwidth(v) <= budget
+        ]
+        video = max(
+            allowed,
+            key=lambda v: (v.get("id", 0), stream_bandwidth(v)),
+            default=None,
+        )
+        if video is None:
+            # 没有满足上限的流时退回到码率最低的组合
+            audio = _smallest(audios)
+            video = _smallest(videos)
+        candidates = [v for v in videos if video and v.get("id") == video.get("id")]
+    else:
+        video = next(
+            (v for v in candidates if v.get("codecs") == preferred_codecs),
+            candidates[0] if candidates else None,
+        )
+
+    return StreamChoice(
+        video=video,
+        audio=audio,
+        policy=policy,
+        duration=duration or 0.0,
+        alternatives=candidates,
+    )
@@ -0,0 +1,234 @@
+"""季度订阅 (只下载新增或重新上传的剧集)"""
+
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+from bili_downloader.core.batch import season_title
+from bili_downloader.core.manifest import DownloadManifest
+from bili_downloader.utils.logger import logger
+
+SUBSCRIPTIONS_FILENAME = "subscriptions.json"
+
+
+@dataclass
+class Subscription:
+    """一个订阅的季度"""
+
+    season_id: int
+    url: str
+    directory: str
+    quality: int
+    title: str = ""
+    episodes: dict[str, int] = field(default_factory=dict)  # 已完成的 ep_id -> cid
+    interval: float = 0.0  # 当前检查间隔(秒)
+    next_poll: float = 0.0
+    finished: bool = False
+    last_error: str = ""
+
+
+def is_finished(info):
+    """季度是否已完结。"""
+    return (info.get("publish") or {}).get("is_finish") == 1
+
+
+def episode_changes(subscription, info):
+    """季度信息中新增或 cid 发生变化的剧集。"""
+    changes = []
+    for ep in info.get("episodes") or []:
+        ep_id = ep.get("id") or ep.get("ep_id")
+        if ep_id is None:
+            continue
+        if subscription.episodes.get(str(ep_id)) != ep.get("cid"):
+            changes.append(ep)
+    return changes
+
+
+def completed_episodes(directory):
+    """下载清单中已完成合并的剧集 (ep_id -> cid)，不包括低清晰度版本。"""
+    outputs = DownloadManifest(directory).data.get("outputs", {})
+    return {
+        str(output["ep_id"]): output.get("cid")
+        for output in outputs.values()
+        if output.get("ep_id") is not None and not output.get("preview")
+    }
+
+
+def next_interval(subscription, changed, base, maximum):
+    """连载中或有变化时使用基础间隔，已完结且没有变化时加倍。"""
+    if changed or not subscription.finished:
+        return base
+    return min(max(subscription.interval, base) * 2, maximum)
+
+
+def jittered(interval, jitter, rng=random):
+    """给检查间隔加上 ±jitter 比例的随机抖动，避免多个季度同时请求。"""
+    return interval * (1 + rng.uniform(-jitter, jitter))
+
+
+class SubscriptionStore:
+    """订阅的本地存储"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self.subscriptions: dict[int, Subscription] = self._load()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get_config_dir() / SUBSCRIPTIONS_FILENAME)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return {
+                int(season_id): Subscription(**values)
+                for season_id, values in data.items()
+            }
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("无法读取订阅文件", path=self.path, error=str(e))
+            return {}
+
+    def save(self):
+        """原子地把订阅写回磁盘。"""
+        with self._lock:
+            data = {
+                str(season_id): asdict(subscription)
+                for season_id, subscription in self.subscriptions.items()
+            }
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning("无法保存订阅文件", path=self.path, error=str(e))
+
+    def reload(self):
+        """重新读取订阅文件 (其他进程可能添加或删除了订阅)。"""
+        subscriptions = self._load()
+        with self._lock:
+            self.subscriptions = subscriptions
+
+    def update(self, subscription):
+        """保存一个订阅的检查结果，其他进程添加或删除的订阅保持不变。"""
+        subscriptions = self._load()
+        with self._lock:
+            if subscription.season_id in subscriptions:
+                subscriptions[subscription.season_id] = subscription
+            self.subscriptions = subscriptions
+        self.save()
+
+    def add(self, subscription):
+        with self._lock:
+            self.subscriptions[subscription.season_id] = subscription
+
+    def remove(self, season_id):
+        with self._lock:
+            return self.subscriptions.pop(season_id, None) is not None
+
+    def all(self):
+        with self._lock:
+            return sorted(self.subscriptions.values(), key=lambda s: s.next_poll)
+
+    def due(self, now):
+        """到了检查时间的订阅。"""
+        return [s for s in self.all() if s.next_poll <= now]
+
+
+class Watcher:
+    """按计划检查订阅的季度并下载新剧集"""
+
+    def __init__(
+        self,
+        store,
+        downloader_factory,
+        settings,
+        headers=None,
+        download_options=None,
+        clock=time.time,
+        sleep=time.sleep,
+        rng=None,
+    ):
+        self.store = store
+        self.downloader_factory = downloader_factory
+        self.settings = settings
+        self.headers = headers
+        self.download_options = download_options or {}
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+
+    def poll(self, subscription):
+        """
+        检查一个订阅
+
+        Returns:
+            int: 本次新完成的剧集数
+        """
+        watch = self.settings.watch
+        downloader = self.downloader_factory()
+        completed = 0
+        changed = False
+        try:
+            info = downloader.get_bangumi_info_by_season_id(
+                subscription.season_id, self.headers
+            )
+            subscription.title = season_title(info) or subscription.title
+            subscription.finished = is_finished(info)
+            changes = episode_changes(subscription, info)
+            changed = bool(changes)
+            if changes:
+                logger.info("发现新剧集", season=subscription.title, count=len(changes))
+                downloader.download_all_from_info_with_quality(
+                    dict(info, episodes=changes),
+                    subscription.directory,
+                    subscription.quality,
+                    headers=self.headers,
+                    **self.download_options,
+                )
+                done = completed_episodes(subscription.directory)
+                for ep in changes:
+                    ep_id = str(ep.get("id") or ep.get("ep_id"))
+                    if ep_id in done and done[ep_id] == ep.get("cid"):
+                        subscription.episodes[ep_id] = ep.get("cid")
+                        completed += 1
+            subscription.last_error = ""
+            interval = next_interval(
+                subscription, changed, watch.interval, watch.max_interval
+            )
+        except Exception as e:
+            logger.error("检查订阅失败", season_id=subscription.season_id, error=str(e))
+            subscription.last_error = str(e)
+            # 出错时同样逐次加倍，避免持续请求
+            interval = min(
+                max(subscription.interval, watch.interval) * 2, watch.max_interval
+            )
+        subscription.interval = interval
+        subscription.next_poll = self.clock() + jittered(
+            interval, watch.jitter, self.rng
+        )
+        self.store.update(subscription)
+        return completed
+
+    def run_once(self):
+        """检查所有到期的订阅，返回新完成的剧集数。"""
+        self.store.reload()
+        return sum(self.poll(s) for s in self.store.due(self.clock()))
+
+    def run_forever(self):
+        """持续运行，在最近的检查时间到来前休眠。"""
+        while True:
+            self.run_once()
+            subscriptions = self.store.all()
+            if subscriptions:
+                delay = subscriptions[0].next_poll - self.clock()
+            else:
+                delay = self.settings.watch.interval
+            self.sleep(max(1.0, delay))
@@ -0,0 +1,259 @@
+"""合并后转码模块"""
+
+import math
+import os
+import shlex
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from bili_downloader.core import vamerger
+from bili_downloader.core.output_validator import merge_temp_path
+from bili_downloader.utils.logger import logger
+from bili_downloader.utils.process import (
+    StreamTail,
+    priority_command,
+    terminate_process,
+)
+
+# 内置的转码预设 (只使用软件编码器)，音频直接复制
+TRANSCODE_PRESETS = {
+    "archive-hevc": ["-c:v", "libx265", "-preset", "medium", "-crf", "24"],
+    "archive-av1": ["-c:v", "libsvtav1", "-preset", "8", "-crf", "32"],
+    "compact-avc": ["-c:v", "libx264", "-preset", "slow", "-crf", "23"],
+}
+
+# 出错时报告的 ffmpeg stderr 行数
+STDERR_TAIL_LINES = 20
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read_text(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cgroup_cpu_limit(
+    cpu_max=CGROUP_V2_CPU_MAX, quota_path=CGROUP_V1_QUOTA, period_path=CGROUP_V1_PERIOD
+):
+    """
+    读取 cgroup 的 CPU 配额
+
+    Returns:
+        float | None: 可用的 CPU 数量 (可以是小数)，没有配额时为 None
+    """
+    text = _read_text(cpu_max)
+    if text:
+        quota, _, period = text.partition(" ")
+        if quota != "max":
+            try:
+                return int(quota) / int(period or 100000)
+            except (ValueError, ZeroDivisionError):
+                return None
+        return None
+
+    quota, period = _read_text(quota_path), _read_text(period_path)
+    try:
+        quota, period = int(quota), int(period)
+    except (TypeError, ValueError):
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return quota / period
+
+
+def available_cpus():
+    """容器中可用的 CPU 数量：CPU 亲和性和 cgroup 配额中较小的一个。"""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        count = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, math.ceil(limit))
+    return max(1, count)
+
+
+def resolve_preset(preset, custom_args=""):
+    """
+    获取转码使用的 ffmpeg 编码参数
+
+    Raises:
+        ValueError: 未知的预设
+    """
+    if custom_args:
+        return shlex.split(custom_args)
+    if preset not in TRANSCODE_PRESETS:
+        raise ValueError(
+            f"未知的转码预设: {preset} (可用: {', '.join(TRANSCODE_PRESETS)})"
+        )
+    return list(TRANSCODE_PRESETS[preset])
+
+
+def transcode_output_path(src, label):
+    """不替换原文件时转码输出的路径: ``名称.{label}.mkv``。"""
+    root, _ = os.path.splitext(src)
+    return f"{root}.{label}.mkv"
+
+
+@dataclass
+class TranscodeResult:
+    """一个文件的转码结果"""
+
+    source: str
+    output: str
+    ok: bool
+    error: str = ""
+
+
+def transcode_file(src, dst, args, threads=0, nice=0, ionice_class=0):
+    """
+    用 ffmpeg 转码一个文件，先写临时文件，成功后放到 dst (可以与 src 相同)
+
+    Returns:
+        TranscodeResult: 转码结果
+    """
+    if vamerger.ffmpeg_path is None:
+        return TranscodeResult(src, dst, False, "未找到ffmpeg可执行文件")
+
+    tmp = merge_temp_path(dst)
+    cmd = [
+        vamerger.ffmpeg_path,
+        "-y",
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-i",
+        src,
+        "-map",
+        "0",
+        "-c:a",
+        "copy",
+        *args,
+    ]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    cmd.append(tmp)
+    cmd = priority_command(cmd, nice=nice, ionice_class=ionice_class)
+    logger.info("正在转码", source=src, command=" ".join(cmd))
+
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+    except (subprocess.SubprocessError, OSError) as e:
+        return TranscodeResult(src, dst, False, str(e))
+
+    stderr_tail = StreamTail(process.stderr, max_lines=STDERR_TAIL_LINES)
+    try:
+        process.wait()
+    finally:
+        # 确保异常 (例如 Ctrl-C) 时不会遗留 ffmpeg 进程
+        terminate_process(process)
+        stderr_tail.join(timeout=5)
+
+    if process.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return TranscodeResult(
+            src, dst, False, f"返回码 {process.returncode}: {stderr_tail.text()}"
+        )
+    os.replace(tmp, dst)
+    logger.info("转码完成", source=src, output=dst)
+    return TranscodeResult(src, dst, True)
+
+
+class Transcoder:
+    """合并后的转码队列"""
+
+    def __init__(
+        self,
+        preset,
+        custom_args="",
+        workers=0,
+        replace=False,
+        nice=10,
+        ionice_class=3,
+    ):
+        self.args = resolve_preset(preset, custom_args)
+        self.label = preset if not custom_args else "transcoded"
+        cpus = available_cpus()
+        self.workers = workers if workers > 0 else cpus
+        # 每个 ffmpeg 进程分到的线程数，合计不超过可用的 CPU 数量
+        self.threads = max(1, cpus // self.workers)
+        self.replace = replace
+        self.nice = nice
+        self.ionice_class = ionice_class
+        # 实际的编码工作在 ffmpeg 子进程中进行，线程只负责启动和等待
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="transcode"
+        )
+        self._futures = []
+
+    @classmethod
+    def from_settings(cls, settings):
+        """按下载设置创建转码队列，未启用转码时返回 None。"""
+        download = settings.download
+        if not download.transcode_preset and not download.transcode_args:
+            return None
+        return cls(
+            download.transcode_preset,
+            download.transcode_args,
+            workers=download.transcode_workers,
+            replace=download.transcode_replace,
+            nice=download.transcode_nice,
+            ionice_class=download.transcode_ionice_class,
+        )
+
+    @property
+    def pending(self):
+        """尚未完成的转码数量。"""
+        return sum(not future.done() for future in self._futures)
+
+    def submit(self, path):
+        """把一个新合并的文件加入转码队列。"""
+        dst = path if self.replace else transcode_output_path(path, self.label)
+        future = self._executor.submit(
+            transcode_file,
+            path,
+            dst,
+            self.args,
+            self.threads,
+            self.nice,
+            self.ionice_class,
+        )
+        self._futures.append(future)
+        return future
+
+    def close(self):
+        """
+        等待队列中的转码完成
+
+        Returns:
+            list[TranscodeResult]: 各文件的转码结果
+        """
+        self._executor.shutdown(wait=True)
+        results = []
+        for future in self._futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                result = TranscodeResult("", "", False, str(e))
+            if not result.ok:
+                logger.error("转码失败", source=result.source, error=result.error)
+            results.append(result)
+        self._futures = []
+        return results
@@ -1,9 +1,18 @@
 import os
 import shutil
 import subprocess
+import time
+from dataclasses import dataclass
 
+from bili_downloader.core.remux import remux
+from bili_downloader.exceptions import RemuxError
 from bili_downloader.utils.logger import logger
 from bili_downloader.utils.print_utils import print_warning
+from bili_downloader.utils.process import (
+    StreamTail,
+    priority_command,
+    terminate_process,
+)
 
 
 def find_executable(name):
@@ -35,11 +44,143 @@ if not ffmpeg_path:
     print_warning("未找到ffmpeg可执行文件。视频/音频合并将无法工作。")
 
 
+# 合并进度日志的最小间隔(秒)
+PROGRESS_LOG_INTERVAL = 5.0
+# 出错时报告的 ffmpeg stderr 行数
+STDERR_TAIL_LINES = 100
+
+
+@dataclass
+class MergeProgress:
+    """ffmpeg 合并进度"""
+
+    out_time: float  # 已写出的媒体时长(秒)
+    total_size: int  # 已写出的字节数
+    speed: float | None  # 相对实时的倍速
+    rate: float  # 写入速度(字节/秒)
+    eta: float | None  # 预计剩余时间(秒)
+    done: bool = False
+
+
+class ProgressParser:
+    """
+    增量解析 ``ffmpeg -progress`` 输出的 key=value 行
+
+    每遇到一行 ``progress=continue|end`` 就生成一个进度事件。
+    """
+
+    def __init__(self, duration=None, callback=None, clock=time.monotonic):
+        """
+        Args:
+            duration: 媒体总时长(秒)，用于计算剩余时间
+            callback: 接收 MergeProgress 的回调
+            clock: 单调时钟，便于测试
+        """
+        self.duration = duration
+        self.callback = callback
+        self.clock = clock
+        self.started = clock()
+        self.last = None
+        self._fields = {}
+
+    def feed(self, line):
+        """处理一行输出，产生进度事件时返回 MergeProgress。"""
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        if key != "progress":
+            self._fields[key] = value
+            return None
+
+        fields, self._fields = self._fields, {}
+        out_time = self._parse_int(fields.get("out_time_us"))
+        if out_time is None:
+            out_time = self._parse_int(fields.get("out_time_ms"))
+        out_time = (out_time or 0) / 1_000_000
+        total_size = self._parse_int(fields.get("total_size")) or 0
+        speed = fields.get("speed", "").rstrip("x").strip()
+        try:
+            speed = float(speed) or None
+        except ValueError:
+            speed = None
+
+        elapsed = max(self.clock() - self.started, 1e-6)
+        if speed is None and out_time:
+            speed = out_time / elapsed
+        eta = None
+        if self.duration and speed:
+            eta = max(0.0, (self.duration - out_time) / speed)
+        self.last = MergeProgress(
+            out_time=out_time,
+            total_size=total_size,
+            speed=speed,
+            rate=total_size / elapsed,
+            eta=eta,
+            done=value == "end",
+        )
+        if self.callback:
+            self.callback(self.last)
+        return self.last
+
+    @staticmethod
+    def _parse_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+
 class VAMerger:
-    def __init__(self, audio, video, output):
+    def __init__(
+        self,
+        audio,
+        video,
+        output,
+        native=False,
+        duration=None,
+        nice=0,
+        ionice_class=0,
+        on_progress=None,
+    ):
         self.audio = audio
         self.video = video
         self.output = output
+        # 优先使用内置封装器，不支持的输入再交给 ffmpeg
+        self.native = native
+        # 媒体总时长(秒)，用于估算剩余时间
+        self.duration = duration
+        self.nice = nice
+        self.ionice_class = ionice_class
+        self.on_progress = on_progress or self._log_progress
+        self._last_log = 0.0
+
+    def _log_progress(self, progress):
+        """默认的进度回调：按固定间隔输出日志。"""
+        now = time.monotonic()
+        if not progress.done and now - self._last_log < PROGRESS_LOG_INTERVAL:
+            return
+        self._last_log = now
+        percent = None
+        if self.duration:
+            percent = round(min(100.0, progress.out_time / self.duration * 100), 1)
+        logger.info(
+            "合并进度",
+            output=self.output,
+            percent=percent,
+            speed=f"{progress.speed:.1f}x" if progress.speed else None,
+            rate_mib=round(progress.rate / 1024 / 1024, 1),
+            eta=round(progress.eta) if progress.eta is not None else None,
+        )
+
+    def _run_native(self):
+        """使用内置封装器合并，返回 True 表示成功。"""
+        try:
+            remux([self.video, self.audio], self.output)
+        except RemuxError as e:
+            logger.info("内置封装器无法处理，改用ffmpeg合并", reason=str(e))
+            return False
+        logger.info("Merge successful", output=self.output, muxer="native")
+        return True
 
     def run(self):
         """
@@ -49,6 +190,9 @@ class VAMerger:
         # 确保输出目录存在
         os.makedirs(os.path.dirname(self.output), exist_ok=True)
 
+        if self.native and self._run_native():
+            return True
+
         # 确保下载器可用
         if ffmpeg_path is None:
             logger.error("未找到FFmpeg可执行文件。无法合并文件。")
@@ -56,9 +200,13 @@ class VAMerger:
 
         # 构建 ffmpeg 命令参数列表
         # -y 选项用于覆盖输出文件（如果已存在）
+        # -progress pipe:1 把机器可读的进度写到 stdout
         cmd = [
             ffmpeg_path,
             "-y",  # 覆盖输出文件而不询问
+            "-nostats",
+            "-progress",
+            "pipe:1",
             "-i",
             self.video,
             "-i",
@@ -69,37 +217,46 @@ class VAMerger:
             "0:v",
             "-map",
             "1:a",
-            # "-c:v", "copy",     # 复制视频流
-            # "-c:a", "copy",      # 复制音频流
-            # "-strict", "experimental", # 某些ffmpeg版本中AAC编码所需
             self.output,
         ]
+        cmd = priority_command(cmd, nice=self.nice, ionice_class=self.ionice_class)
 
         logger.info("正在执行合并命令", command=" ".join(cmd))
 
         try:
-            # 使用 subprocess.run 执行命令
-            # 捕获 stdout 和 stderr 用于日志记录
-            result = subprocess.run(
+            process = subprocess.Popen(
                 cmd,
-                capture_output=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
                 encoding="utf-8",
+                errors="replace",
             )
-
-            if result.returncode == 0:
-                logger.info("Merge successful", output=self.output)
-                return True
-            else:
-                logger.error(
-                    f"合并失败，输出文件: {self.output}。返回码: {result.returncode}",
-                    stderr=result.stderr,
-                )
-                return False
-
-        except subprocess.SubprocessError as e:
+        except (subprocess.SubprocessError, OSError) as e:
             logger.error(f"合并失败，输出文件: {self.output}，子进程错误", error=str(e))
             return False
+
+        # stderr 只保留最后若干行，避免长时间合并占用大量内存
+        stderr_tail = StreamTail(process.stderr, max_lines=STDERR_TAIL_LINES)
+        parser = ProgressParser(self.duration, self.on_progress)
+        try:
+            for line in process.stdout:
+                parser.feed(line)
+            process.wait()
         except Exception as e:
             logger.error(f"合并失败，输出文件: {self.output}，意外错误", error=str(e))
             return False
+        finally:
+            # 确保异常 (例如 Ctrl-C) 时不会遗留 ffmpeg 进程
+            terminate_process(process)
+            stderr_tail.join(timeout=5)
+
+        if process.returncode == 0:
+            logger.info("Merge successful", output=self.output)
+            return True
+        logger.error(
+            f"合并失败，输出文件: {self.output}。返回码: {process.returncode}",
+            stderr=stderr_tail.text(),
+        )
+        return False
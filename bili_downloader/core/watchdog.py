@@ -0,0 +1,164 @@
+"""下载停滞看门狗模块"""
+
+import os
+import subprocess
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from bili_downloader.utils.logger import logger
+from bili_downloader.utils.process import StreamTail, terminate_process
+
+# 采样间隔(秒)
+DEFAULT_SAMPLE_INTERVAL = 1.0
+
+
+class StallWatchdog:
+    """吞吐量下限看门狗"""
+
+    def __init__(self, min_speed, window):
+        """
+        Args:
+            min_speed: 吞吐量下限(字节/秒)，小于等于 0 表示禁用
+            window: 判定停滞的时间窗口(秒)，小于等于 0 表示禁用
+        """
+        self.min_speed = min_speed
+        self.window = window
+        self._samples = deque()
+
+    @property
+    def enabled(self) -> bool:
+        return self.min_speed > 0 and self.window > 0
+
+    def sample(self, total_bytes, now=None) -> bool:
+        """
+        记录一次采样
+
+        Args:
+            total_bytes: 到目前为止写入的总字节数
+            now: 采样时间，默认为当前单调时钟
+
+        Returns:
+            bool: 最近一个完整窗口内的平均吞吐量低于下限时返回 True
+        """
+        if not self.enabled:
+            return False
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, total_bytes))
+
+        # 只保留覆盖一个窗口所需的采样点
+        while len(self._samples) > 1 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+        start_time, start_bytes = self._samples[0]
+        span = now - start_time
+        if span < self.window:
+            return False
+        return (total_bytes - start_bytes) / span < self.min_speed
+
+
+def process_bytes_written(pid):
+    """读取 Linux 的 /proc/<pid>/io 中进程写入的字节数，无法读取时为 None。"""
+    try:
+        with open(f"/proc/{pid}/io", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def file_bytes(path) -> int:
+    """文件实际占用的磁盘空间，文件不存在时为 0。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0
+    blocks = getattr(st, "st_blocks", None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+
+def bytes_written(pid, path) -> int:
+    """
+    获取下载进程已经写入的字节数
+
+    优先读取进程的 IO 统计 (不受文件预分配影响)，
+    否则退回到目标文件实际占用的磁盘空间。
+    """
+    written = process_bytes_written(pid)
+    return written if written is not None else file_bytes(path)
+
+
+@dataclass
+class MonitoredResult:
+    """受监控子进程的执行结果"""
+
+    returncode: int
+    stdout: str
+    stderr: str
+    stalled: bool = False
+
+
+def run_with_watchdog(
+    cmd,
+    watch_path,
+    min_speed=0,
+    window=0,
+    interval=DEFAULT_SAMPLE_INTERVAL,
+):
+    """
+    运行下载命令，并在吞吐量持续低于下限时终止它
+
+    Args:
+        cmd: 命令参数列表
+        watch_path: 下载目标文件路径 (无法读取进程 IO 统计时使用)
+        min_speed: 吞吐量下限(字节/秒)
+        window: 判定停滞的时间窗口(秒)
+        interval: 采样间隔(秒)
+
+    Returns:
+        MonitoredResult: 返回码、输出的最后若干行以及是否因停滞被终止
+    """
+    watchdog = StallWatchdog(min_speed, window)
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    stdout_tail = StreamTail(process.stdout)
+    stderr_tail = StreamTail(process.stderr)
+
+    stalled = False
+    try:
+        while True:
+            try:
+                process.wait(timeout=interval)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if watchdog.sample(bytes_written(process.pid, watch_path)):
+                stalled = True
+                logger.warning(
+                    "下载吞吐量持续低于下限，终止下载进程",
+                    dest=watch_path,
+                    min_speed=min_speed,
+                    window=window,
+                )
+                terminate_process(process)
+                break
+    finally:
+        # 确保异常 (例如 Ctrl-C) 时不会遗留下载进程
+        terminate_process(process)
+        stdout_tail.join(timeout=5)
+        stderr_tail.join(timeout=5)
+
+    return MonitoredResult(
+        returncode=process.returncode,
+        stdout=stdout_tail.text(),
+        stderr=stderr_tail.text(),
+        stalled=stalled,
+    )
@@ -20,3 +20,15 @@ class APIError(BiliDownloaderError):
     """API 调用相关错误"""
 
     pass
+
+
+class RemuxError(MergeError):
+    """内置封装器无法处理的输入"""
+
+    pass
+
+
+class LeaseLostError(DownloadError):
+    """剧集的租约已被其他进程接管"""
+
+    pass
@@ -0,0 +1,148 @@
+"""文件放置辅助模块"""
+
+import errno
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# linux/fs.h 中的 FICLONE ioctl
+FICLONE = 0x40049409
+
+# 这些错误表示内核复制不可用，应退回到下一种方式
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+}
+
+
+def _kernel_copy(copy_chunk, size):
+    """循环调用内核复制函数，返回已复制的字节数。"""
+    copied = 0
+    while copied < size:
+        n = copy_chunk(min(COPY_CHUNK_SIZE, size - copied), copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def copy_file(src, dst):
+    """
+    复制文件内容和修改时间
+
+    依次尝试 ``os.copy_file_range``、``os.sendfile`` 和普通的读写复制。
+    """
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        size = os.fstat(fin.fileno()).st_size
+        in_fd, out_fd = fin.fileno(), fout.fileno()
+        copied = 0
+
+        methods = []
+        if hasattr(os, "copy_file_range"):
+            methods.append(
+                lambda count, offset: os.copy_file_range(
+                    in_fd, out_fd, count, offset, offset
+                )
+            )
+        if hasattr(os, "sendfile"):
+            methods.append(
+                lambda count, offset: os.sendfile(out_fd, in_fd, offset, count)
+            )
+        for method in methods:
+            try:
+                copied = _kernel_copy(method, size)
+                break
+            except OSError as e:
+                # 内核复制不可用时清空已写入的内容，换用下一种方式
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                os.lseek(out_fd, 0, os.SEEK_SET)
+                os.ftruncate(out_fd, 0)
+                copied = 0
+
+        if copied < size:
+            fin.seek(copied)
+            fout.seek(copied)
+            shutil.copyfileobj(fin, fout, COPY_CHUNK_SIZE)
+        fout.flush()
+        os.fsync(out_fd)
+    shutil.copystat(src, dst)
+
+
+def place_file(src, dst):
+    """
+    把文件移动到最终位置
+
+    Returns:
+        str: "rename" 表示同一文件系统内重命名，"copy" 表示跨文件系统复制
+    """
+    try:
+        os.replace(src, dst)
+        return "rename"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    tmp_path = os.path.join(
+        os.path.dirname(dst) or ".", f".{os.path.basename(dst)}.{os.getpid()}.part"
+    )
+    try:
+        copy_file(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.remove(src)
+    return "copy"
+
+
+def reflink_file(src, dst):
+    """
+    使用 ``FICLONE`` 创建写时复制副本 (Btrfs、XFS 等)
+
+    Raises:
+        OSError: 文件系统或平台不支持
+    """
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "当前平台不支持 reflink")
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        try:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        except OSError:
+            fout.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def link_file(src, dst, mode="auto"):
+    """
+    不复制数据地在 dst 创建 src 的副本
+
+    Args:
+        mode: "hardlink"、"reflink" 或 "auto" (先硬链接，再 reflink)
+
+    Returns:
+        str | None: 使用的方式，都不可用时返回 None
+    """
+    methods = {"hardlink": os.link, "reflink": reflink_file}
+    names = ["hardlink", "reflink"] if mode == "auto" else [mode]
+    for name in names:
+        method = methods.get(name)
+        if method is None:
+            continue
+        try:
+            method(src, dst)
+            return name
+        except OSError:
+            continue
+    return None
@@ -7,8 +7,9 @@ import inspect
 
 from rich.console import Console
 
-# 创建全局Console实例
-console = Console()
+# 创建全局Console实例，与 structlog 的控制台日志一样写到标准错误，
+# 标准输出只留给命令的输出 (例如 download --plan-only 的下载计划)
+console = Console(stderr=True)
 
 
 def _format_message(level: str, message: str) -> str:
@@ -0,0 +1,70 @@
+"""
+子进程辅助模块
+"""
+
+import shutil
+import subprocess
+import threading
+from collections import deque
+
+
+class StreamTail:
+    """
+    在后台线程中持续读取子进程的输出流，只保留最后若干行
+
+    避免像 ``capture_output=True`` 那样把全部输出都保存在内存中，
+    同时防止管道缓冲区写满导致子进程阻塞。
+    """
+
+    def __init__(self, stream, max_lines=200, on_line=None):
+        self.lines = deque(maxlen=max_lines)
+        self._stream = stream
+        self._on_line = on_line
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        if self._stream is None:
+            return
+        for line in self._stream:
+            line = line.rstrip("\r\n")
+            self.lines.append(line)
+            if self._on_line:
+                self._on_line(line)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+def terminate_process(process, grace=5.0):
+    """先尝试正常终止子进程，超时后强制结束。"""
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def priority_command(cmd, nice=0, ionice_class=0):
+    """
+    在命令前加上 nice / ionice，降低子进程的 CPU 和磁盘 IO 优先级
+
+    Args:
+        cmd: 命令参数列表
+        nice: nice 值 (0 表示不调整)
+        ionice_class: ionice 调度类别 (1 实时, 2 尽力而为, 3 空闲; 0 表示不调整)
+
+    系统中没有对应工具 (例如 Windows) 时原样返回命令。
+    """
+    prefix = []
+    if ionice_class and shutil.which("ionice"):
+        prefix += ["ionice", "-c", str(ionice_class)]
+    if nice and shutil.which("nice"):
+        prefix += ["nice", "-n", str(nice)]
+    return prefix + list(cmd)
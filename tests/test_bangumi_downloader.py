@@ -1,4 +1,16 @@
-from bili_downloader.core.bangumi_downloader import BangumiDownloader
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.bangumi_downloader import (
+    BangumiDownloader,
+    choose_preview_quality,
+)
+from bili_downloader.core.manifest import DownloadManifest
+from bili_downloader.exceptions import DownloadError
 
 
 def test_sanitize_filename():
@@ -31,3 +43,305 @@ def test_sanitize_filename():
 
     # 测试只包含空格和点的文件名
     assert downloader.sanitize_filename(" . ") == "unnamed"
+
+
+def test_prepare_partial_download(tmp_path):
+    """测试未完成下载文件的续传与清理"""
+    downloader = BangumiDownloader({}, {})
+    dest = tmp_path / "ep.m4s"
+
+    # 文件不存在
+    assert downloader.prepare_partial_download(str(dest), "axel") is False
+
+    # 完整文件
+    dest.write_bytes(b"data")
+    assert downloader.prepare_partial_download(str(dest), "axel") is True
+
+    # 当前下载器的控制文件保留用于续传
+    (tmp_path / "ep.m4s.st").write_bytes(b"state")
+    assert downloader.prepare_partial_download(str(dest), "axel") is False
+    assert dest.exists()
+
+    # 其他下载器的控制文件无法续传，部分文件被删除
+    assert downloader.prepare_partial_download(str(dest), "aria2") is False
+    assert not dest.exists()
+    assert not (tmp_path / "ep.m4s.st").exists()
+
+
+def test_prepare_partial_download_uses_snapshot(tmp_path):
+    """测试目录快照代替逐个文件的 stat 调用"""
+    downloader = BangumiDownloader({}, {})
+    dest = tmp_path / "ep.m4s"
+    dest.write_bytes(b"data")
+    (tmp_path / "ep.m4s.aria2").write_bytes(b"state")
+    downloader.snapshot_directory(str(tmp_path))
+
+    with patch("os.path.exists") as mock_exists:
+        assert downloader.prepare_partial_download(str(dest), "aria2") is False
+        mock_exists.assert_not_called()
+
+    # 删除的文件同步更新到快照
+    assert downloader.prepare_partial_download(str(dest), "axel") is False
+    assert not dest.exists()
+    assert downloader.prepare_partial_download(str(dest), "axel") is False
+    assert not downloader.path_exists(str(dest) + ".aria2")
+
+
+@patch.object(BangumiDownloader, "select_stream_urls", return_value=["http://a"])
+@patch.object(BangumiDownloader, "download_bangumi", return_value=True)
+@patch.object(BangumiDownloader, "check_stream")
+def test_fetch_stream_refetches_broken_stream(
+    mock_check, mock_download, mock_select, tmp_path
+):
+    """测试校验失败时只重新下载该流"""
+    downloader = BangumiDownloader({}, {})
+    mock_check.side_effect = [False, True]
+
+    assert downloader.fetch_stream({}, str(tmp_path / "ep.m4s")) is True
+    assert mock_download.call_count == 2
+
+
+def test_download_bangumi_scores_only_transferred_bytes(tmp_path):
+    """测试续传时只按本次传输的字节数为主机评分"""
+    dest = tmp_path / "ep.m4s"
+    dest.write_bytes(b"x" * 1000)
+    downloader = BangumiDownloader({}, {})
+    downloader.settings.download.multi_source = False
+    written = []
+
+    def run(self):
+        with open(dest, "ab") as f:
+            f.write(b"y" * written.pop())
+        return True
+
+    with (
+        patch("bili_downloader.core.bangumi_downloader.DownloaderAria2.run", new=run),
+        patch.object(downloader.cdn_policy, "record") as mock_record,
+        patch.object(downloader.cdn_policy, "save"),
+        patch(
+            "bili_downloader.core.bangumi_downloader.time.monotonic",
+            side_effect=[10.0, 12.0, 20.0, 21.0],
+        ),
+    ):
+        written.append(500)
+        downloader.download_bangumi("http://a", str(dest), downloader_type="aria2")
+        # 500 字节用时 2 秒，已有的 1000 字节不计入
+        mock_record.assert_called_once_with("http://a", 250.0)
+
+        # 没有传输新数据时不记录
+        mock_record.reset_mock()
+        written.append(0)
+        downloader.download_bangumi("http://a", str(dest), downloader_type="aria2")
+        mock_record.assert_not_called()
+
+
+@patch.object(BangumiDownloader, "select_stream_urls", return_value=["http://a"])
+@patch.object(BangumiDownloader, "download_bangumi", return_value=True)
+@patch.object(BangumiDownloader, "check_stream", return_value=False)
+def test_fetch_stream_gives_up_after_retries(
+    mock_check, mock_download, mock_select, tmp_path
+):
+    """测试多次校验失败后抛出下载错误"""
+    downloader = BangumiDownloader({}, {})
+    downloader.settings.download.verify_retries = 1
+
+    with pytest.raises(DownloadError):
+        downloader.fetch_stream({}, str(tmp_path / "ep.m4s"))
+    assert mock_download.call_count == 2
+
+
+def test_merge_streams_renames_atomically(tmp_path):
+    """测试合并先写入临时文件，失败时不留下输出文件"""
+    downloader = BangumiDownloader({}, {})
+    merged = tmp_path / "ep.mkv"
+    written = []
+
+    class FakeMerger:
+        def __init__(self, audio, video, output, **kwargs):
+            self.output = output
+
+        def run(self):
+            written.append(self.output)
+            with open(self.output, "wb") as f:
+                f.write(b"merged")
+            return succeed
+
+    with patch("bili_downloader.core.bangumi_downloader.VAMerger", FakeMerger):
+        succeed = False
+        assert downloader.merge_streams("a.ogg", "v.mp4", str(merged)) is False
+        assert not merged.exists()
+        assert list(tmp_path.iterdir()) == []
+
+        succeed = True
+        assert downloader.merge_streams("a.ogg", "v.mp4", str(merged)) is True
+        assert merged.read_bytes() == b"merged"
+        assert written[-1] != str(merged)
+        assert list(tmp_path.iterdir()) == [merged]
+
+
+@patch(
+    "bili_downloader.core.bangumi_downloader.stream_merge_supported",
+    return_value=True,
+)
+def test_can_stream_merge_requires_no_local_files(mock_supported, tmp_path):
+    """测试存在需要续传的文件时不使用流式合并"""
+    downloader = BangumiDownloader({}, {})
+    audio = str(tmp_path / "ep.ogg")
+    video = str(tmp_path / "ep.mp4")
+    assert downloader.can_stream_merge(audio, video) is True
+
+    (tmp_path / "ep.mp4.aria2").write_bytes(b"")
+    assert downloader.can_stream_merge(audio, video) is False
+
+
+@patch("bili_downloader.core.bangumi_downloader.free_space", return_value=10**9)
+@patch.object(BangumiDownloader, "get_bangumi_downloads")
+def test_preflight_disk_space(mock_downloads, mock_free, tmp_path):
+    """测试磁盘空间不足时按设置拒绝开始下载"""
+    downloads = ({}, {"bandwidth": 8_000_000}, {"bandwidth": 0})
+    mock_downloads.return_value = downloads
+    episodes = [{"aid": 1, "cid": 10, "id": 100, "duration": 600_000}] * 3
+    downloader = BangumiDownloader({}, {})
+
+    # 默认只警告，并返回已获取的下载信息供下载循环复用
+    assert downloader.preflight_disk_space(episodes, str(tmp_path), 80) == {
+        10: downloads
+    }
+
+    downloader.settings.download.disk_check = "refuse"
+    with pytest.raises(DownloadError):
+        downloader.preflight_disk_space(episodes, str(tmp_path), 80)
+
+    downloader.settings.download.disk_check = "off"
+    assert downloader.preflight_disk_space(episodes, str(tmp_path), 80) == {}
+
+
+def test_stream_directory_uses_scratch_dir(tmp_path):
+    """测试设置scratch_dir时音视频流使用临时目录"""
+    downloader = BangumiDownloader({}, {})
+    destdir = str(tmp_path / "nas" / "season")
+    assert downloader.stream_directory(destdir) == destdir
+
+    downloader.settings.download.scratch_dir = str(tmp_path / "scratch")
+    stream_dir = downloader.stream_directory(destdir)
+    assert os.path.dirname(stream_dir) == str(tmp_path / "scratch")
+    assert os.path.basename(stream_dir).startswith("season-")
+    assert os.path.isdir(stream_dir)
+    # 不同下载目录对应不同的临时子目录
+    assert downloader.stream_directory(str(tmp_path / "other" / "season")) != stream_dir
+
+
+def test_reuse_library_stream_links_verified_copy(tmp_path):
+    """测试其他目录中已校验的相同流通过链接复用"""
+    with patch.object(Settings, "get_config_dir", return_value=tmp_path):
+        downloader = BangumiDownloader({}, {})
+        info = {"kind": "video", "cid": 7, "stream_id": 80, "codecs": "avc1"}
+        first = tmp_path / "a" / "ep.m4s"
+        first.parent.mkdir()
+        first.write_bytes(b"video")
+        manifest_a = DownloadManifest(str(first.parent))
+        assert downloader.check_stream({}, str(first), manifest_a, info)
+
+        second = tmp_path / "b" / "ep.m4s"
+        second.parent.mkdir()
+        manifest_b = DownloadManifest(str(second.parent))
+        assert downloader.reuse_library_stream({}, str(second), manifest_b, info)
+        assert second.read_bytes() == b"video"
+        assert manifest_b.get_stream(str(second))["cid"] == 7
+
+        # 编码不同的流不能复用
+        other = dict(info, codecs="hev1")
+        third = tmp_path / "b" / "ep_hevc.m4s"
+        assert not downloader.reuse_library_stream({}, str(third), manifest_b, other)
+        assert not third.exists()
+
+
+@patch.object(BangumiDownloader, "reuse_library_stream", return_value=False)
+@patch.object(BangumiDownloader, "fetch_stream")
+def test_download_single_stream(mock_fetch, mock_reuse, tmp_path):
+    """测试只下载音频时不合并，封装为独立文件"""
+    downloader = BangumiDownloader({}, {})
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    stream_dest = str(scratch / "ep.ogg")
+    mock_fetch.side_effect = lambda stream, dest, **kwargs: open(dest, "wb").close()
+
+    def fake_remux(inputs, output):
+        assert inputs == [stream_dest]
+        with open(output, "wb") as f:
+            f.write(b"m4a")
+
+    output = downloader.single_stream_output("audio", stream_dest, str(tmp_path), "ep")
+    assert output == str(tmp_path / "ep.m4a")
+    with patch("bili_downloader.core.bangumi_downloader.remux", fake_remux):
+        result = downloader.download_single_stream(
+            {}, stream_dest, output, {"kind": "audio", "cid": 1}, doclean=True
+        )
+    assert result == output
+    assert (tmp_path / "ep.m4a").read_bytes() == b"m4a"
+    assert not os.path.exists(stream_dest)
+
+    # 不封装时原始流从临时目录放到下载目录
+    downloader.settings.download.single_stream_remux = False
+    output = downloader.single_stream_output("audio", stream_dest, str(tmp_path), "ep")
+    result = downloader.download_single_stream(
+        {}, stream_dest, output, {"kind": "audio", "cid": 1}
+    )
+    assert result == str(tmp_path / "ep.ogg")
+    assert os.path.exists(result)
+    assert not os.path.exists(stream_dest)
+
+
+def test_choose_preview_quality():
+    """测试渐进式下载的低清晰度选择"""
+    available = [16, 32, 64, 80, 112, 999]
+    assert choose_preview_quality(available, 112, 64) == 64
+    assert choose_preview_quality(available, 112, 40) == 32
+    # 没有不高于偏好的档位时使用最低档位
+    assert choose_preview_quality(available, 112, 6) == 16
+    # 偏好高于目标时只考虑低于目标的档位
+    assert choose_preview_quality(available, 64, 80) == 32
+    assert choose_preview_quality(available, 16, 64) is None
+
+
+def test_publish_preview_then_upgrade(tmp_path):
+    """测试先发布低清晰度版本，升级后替换同名文件"""
+    downloader = BangumiDownloader({}, {})
+    downloader.settings.download.library_index = False
+    manifest = DownloadManifest(str(tmp_path))
+    ep = {"aid": 1, "cid": 2, "id": 3}
+    audio_dest = str(tmp_path / "ep.ogg")
+    video_dest = str(tmp_path / "ep.mp4")
+    merged_dest = str(tmp_path / "ep.mkv")
+
+    def fake_ensure(stream, dest, stream_info, **kwargs):
+        with open(dest, "w") as f:
+            f.write(str(stream["id"]))
+
+    def fake_merge(audio, video, merged, *args, **kwargs):
+        with open(video) as src, open(merged, "w") as out:
+            out.write(src.read())
+        return True
+
+    preview = ({"quality": 32, "format": "mp4"}, {"id": 32}, {"id": 30280})
+    final = ({"quality": 112, "format": "mp4"}, {"id": 112}, {"id": 30280})
+    with (
+        patch.object(downloader, "ensure_stream", side_effect=fake_ensure),
+        patch.object(downloader, "merge_streams", side_effect=fake_merge),
+        patch.object(downloader, "get_bangumi_downloads", return_value=final),
+    ):
+        downloader.publish_preview(
+            ep, preview, audio_dest, merged_dest, manifest=manifest
+        )
+        assert Path(merged_dest).read_text() == "32"
+        assert manifest.get_output(merged_dest)["preview"] is True
+        # 低清晰度视频流合并后删除
+        assert not os.path.exists(str(tmp_path / "ep.preview32.mp4"))
+
+        downloader.upgrade_episode(
+            ep, 112, audio_dest, video_dest, merged_dest, manifest=manifest
+        )
+    assert Path(merged_dest).read_text() == "112"
+    output = manifest.get_output(merged_dest)
+    assert output["quality"] == 112
+    assert "preview" not in output
@@ -0,0 +1,122 @@
+import os
+import threading
+
+from bili_downloader.core.bangumi_downloader import BangumiDownloader
+from bili_downloader.core.batch import read_url_list, run_batch
+from bili_downloader.exceptions import APIError
+
+
+def test_read_url_list():
+    """测试读取 URL 列表时忽略空行、注释和重复项"""
+    lines = [
+        "# 追番列表\n",
+        "\n",
+        " https://a/ep1 \n",
+        "https://b/ep2\n",
+        "https://a/ep1",
+    ]
+    assert read_url_list(lines) == ["https://a/ep1", "https://b/ep2"]
+
+
+def test_run_batch(tmp_path):
+    """测试批量下载：失败的 URL 不影响其他季度，同一季度只下载一次"""
+    seasons = {
+        "https://x/ep1": {"season_id": 1, "season_title": "季度一", "episodes": [{}]},
+        "https://x/md1": {"season_id": 1, "season_title": "季度一", "episodes": [{}]},
+        "https://x/ep2": {"season_id": 2, "title": "季度:二", "episodes": [{}, {}]},
+        "https://x/ep3": {"season_id": 3, "title": "季度三", "episodes": [{}]},
+    }
+    downloads = []
+    lock = threading.Lock()
+
+    class FakeDownloader(BangumiDownloader):
+        def get_detailed_info_from_url(self, url, headers=None):
+            if url not in seasons:
+                raise APIError("API返回错误码 -404")
+            return seasons[url]
+
+        def download_all_from_info_with_quality(self, info, destdir, **kwargs):
+            with lock:
+                downloads.append((destdir, kwargs["threads"], kwargs["quality"]))
+            if info["season_id"] == 3:
+                raise OSError("磁盘已满")
+            if info["season_id"] == 2:
+                kwargs["progress"](1, info["episodes"][1], "failed")
+            return [os.path.join(destdir, "ep.mkv")]
+
+    urls = ["https://x/ep1", "https://x/bad", "https://x/md1", "https://x/ep2"]
+    urls.append("https://x/ep3")
+    items = run_batch(
+        urls,
+        str(tmp_path),
+        lambda: FakeDownloader({}, {}),
+        workers=2,
+        threads=16,
+        quality=80,
+    )
+
+    assert [item.url for item in items] == urls
+    assert items[1].error and not items[1].files
+    assert items[2].duplicate_of == "https://x/ep1" and not items[2].files
+    assert items[3].directory == str(tmp_path / "季度二")
+    assert items[3].files == [str(tmp_path / "季度二" / "ep.mkv")]
+    assert items[3].failed == 1 and not items[3].error
+    assert items[4].error == "磁盘已满"
+    # 三个季度各下载一次，下载线程数按同时进行的季度平均分配
+    assert sorted(downloads) == sorted(
+        (str(tmp_path / name), 8, 80) for name in ("季度一", "季度二", "季度三")
+    )
+
+
+def test_run_batch_all_seasons(tmp_path):
+    """测试展开相关季度，重复的剧集只在第一个季度中下载"""
+    related = [{"season_id": 1}, {"season_id": 2}, {"season_id": 3}]
+    seasons = {
+        1: {
+            "season_id": 1,
+            "season_title": "第一季",
+            "seasons": related,
+            "episodes": [{"cid": 11}, {"cid": 12}],
+        },
+        2: {"season_id": 2, "season_title": "第二季", "episodes": [{"cid": 21}]},
+        # 总集篇包含第一季的剧集
+        3: {
+            "season_id": 3,
+            "season_title": "总集篇",
+            "episodes": [{"cid": 12}, {"cid": 31}],
+        },
+    }
+    requests = []
+    downloads = {}
+    lock = threading.Lock()
+
+    class FakeDownloader(BangumiDownloader):
+        def get_detailed_info_from_url(self, url, headers=None):
+            return self.cache_season(seasons[1])
+
+        def get_bangumi_info_by_season_id(self, season_id, headers=None):
+            with lock:
+                requests.append(season_id)
+            return seasons[season_id]
+
+        def download_all_from_info_with_quality(self, info, destdir, **kwargs):
+            with lock:
+                downloads[os.path.basename(destdir)] = [
+                    ep["cid"] for ep in info["episodes"]
+                ]
+            return []
+
+    items = run_batch(
+        ["https://x/ep1"],
+        str(tmp_path),
+        lambda: FakeDownloader({}, {}),
+        all_seasons=True,
+    )
+
+    # 第一季已在缓存中，只请求相关季度
+    assert sorted(requests) == [2, 3]
+    assert [item.title for item in items] == ["第一季", "第二季", "总集篇"]
+    assert items[2].shared == 1
+    assert downloads == {"第一季": [11, 12], "第二季": [21], "总集篇": [31]}
+    # 缓存中的季度信息不被修改
+    assert len(seasons[3]["episodes"]) == 2
@@ -0,0 +1,65 @@
+from bili_downloader.core.cdn_policy import CdnPolicy
+
+UPOS_A = "https://upos-sz-mirrorali.bilivideo.com/upgcxcode/1/2/3.m4s?deadline=1"
+UPOS_B = "https://upos-sz-mirrorcos.bilivideo.com/upgcxcode/1/2/3.m4s?deadline=1"
+PCDN = "https://xy1x2x3x4xy.mcdn.bilivideo.cn:4483/upgcxcode/1/2/3.m4s?deadline=1"
+
+
+def test_blocked_hosts_are_removed():
+    """测试屏蔽的主机被移除"""
+    policy = CdnPolicy(blocked_hosts=["*.mcdn.bilivideo.cn"])
+
+    assert policy.rewrite([PCDN, UPOS_A]) == [UPOS_A]
+
+
+def test_pinned_host_rewrite():
+    """测试upos路径被改写到固定主机并排在最前"""
+    policy = CdnPolicy(pinned_hosts=["upos-sz-mirrorhw.bilivideo.com"])
+
+    urls = policy.order(policy.rewrite([PCDN]))
+
+    assert urls[0] == (
+        "https://upos-sz-mirrorhw.bilivideo.com/upgcxcode/1/2/3.m4s?deadline=1"
+    )
+    assert PCDN in urls
+
+
+def test_preference_order():
+    """测试没有评分时按首选列表排序"""
+    policy = CdnPolicy(preferred_hosts=["upos-sz-*"])
+
+    assert policy.order([PCDN, UPOS_A]) == [UPOS_A, PCDN]
+
+
+def test_underperforming_host_is_demoted():
+    """测试评分过低的主机被降级"""
+    policy = CdnPolicy(preferred_hosts=["upos-sz-mirrorali.*"], demote_ratio=0.5)
+    policy.record(UPOS_A, 100_000)
+    policy.record(UPOS_B, 1_000_000)
+
+    # 即使在首选列表中，评分过低的主机也会排到后面
+    assert policy.order([UPOS_A, UPOS_B]) == [UPOS_B, UPOS_A]
+
+
+def test_failures_lower_score():
+    """测试失败会降低主机评分"""
+    policy = CdnPolicy()
+    policy.record(UPOS_A, 1_000_000)
+    policy.record_failure(UPOS_A)
+
+    assert policy.stats["upos-sz-mirrorali.bilivideo.com"].throughput < 1_000_000
+    assert policy.stats["upos-sz-mirrorali.bilivideo.com"].failures == 1
+
+
+def test_stats_persistence(tmp_path):
+    """测试评分保存和重新加载"""
+    stats_path = tmp_path / "cdn_stats.json"
+    policy = CdnPolicy(stats_path=stats_path)
+    policy.record(UPOS_A, 500_000, ttfb=0.2)
+    policy.save()
+
+    reloaded = CdnPolicy(stats_path=stats_path)
+    stats = reloaded.stats["upos-sz-mirrorali.bilivideo.com"]
+    assert stats.throughput == 500_000
+    assert stats.ttfb == 0.2
+    assert stats.samples == 1
@@ -76,3 +76,46 @@ def test_main_command_with_verbose(mock_setup_global_config):
     assert "Bilibili Bangumi Downloader" in result.stdout
     # 注意：由于--verbose是有效的选项，但我们没有提供它，所以不会调用setup_global_config
     # mock_setup_global_config.assert_called_once_with(False)
+
+
+@patch("bili_downloader.cli.cmd_download.download_batch", return_value=False)
+@patch(
+    "bili_downloader.cli.cmd_download.get_cookie_from_file",
+    return_value={"SESSDATA": "test"},
+)
+@patch("bili_downloader.cli.cmd_download.Settings.load_from_file")
+def test_download_batch_failure_exits_with_error(
+    mock_load_settings, mock_cookie, mock_batch, tmp_path
+):
+    """测试批量下载有失败时下载命令以状态码 1 退出"""
+    from bili_downloader.cli import cmd_download
+
+    url_file = tmp_path / "urls.txt"
+    url_file.write_text("https://www.bilibili.com/bangumi/play/ss1\n")
+    with patch.dict("bili_downloader.cli.global_config._global_cli_args", clear=True):
+        result = runner.invoke(
+            cmd_download.app,
+            ["--from-file", str(url_file), "--directory", str(tmp_path)],
+        )
+    assert result.exit_code == 1
+    mock_batch.assert_called_once()
+    assert "未预期的错误" not in result.stdout
+
+
+@patch(
+    "bili_downloader.cli.cmd_download.get_cookie_from_file",
+    return_value={"SESSDATA": "test"},
+)
+@patch("bili_downloader.cli.cmd_download.Settings.load_from_file")
+def test_download_rejects_invalid_streams(mock_load_settings, mock_cookie, tmp_path):
+    """测试 --streams 无效时只输出参数错误并退出"""
+    from bili_downloader.cli import cmd_download
+
+    with patch.dict("bili_downloader.cli.global_config._global_cli_args", clear=True):
+        result = runner.invoke(
+            cmd_download.app,
+            ["--url", "https://b23.tv/x", "-d", str(tmp_path), "--streams", "subs"],
+        )
+    assert result.exit_code == 1
+    assert "--streams 只能是" in result.stdout
+    assert "未预期的错误" not in result.stdout
@@ -0,0 +1,97 @@
+import struct
+from unittest.mock import patch
+
+import pytest
+
+from bili_downloader.core import clip
+from bili_downloader.core.clip import parse_clip, plan_clip, write_clip
+from bili_downloader.core.mp4 import find_box, iter_boxes
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type.encode()) + payload
+
+
+def _full(box_type, version, flags, payload):
+    return _box(box_type, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+def _fragment(decode_time, payload):
+    tfdt = _full("tfdt", 1, 0, struct.pack(">Q", decode_time))
+    traf = _box("traf", _full("tfhd", 0, 0x20000, struct.pack(">I", 1)) + tfdt)
+    return _box("moof", traf) + _box("mdat", payload)
+
+
+def _dash_file():
+    """构造带 sidx 的 fMP4：4 个 2 秒的子分段，第 3 个不从关键帧开始"""
+    mdhd = _full("mdhd", 0, 0, struct.pack(">IIII", 0, 0, 1000, 0) + b"\0" * 4)
+    init = _box("ftyp", b"iso5\0\0\0\0") + _box(
+        "moov", _box("trak", _box("mdia", mdhd))
+    )
+    fragments = [_fragment(i * 2000, bytes([65 + i]) * 100) for i in range(4)]
+    refs = b"".join(
+        struct.pack(">III", len(f), 2000, 0 if i == 2 else 0x80000000)
+        for i, f in enumerate(fragments)
+    )
+    sidx = _full("sidx", 0, 0, struct.pack(">IIIIHH", 1, 1000, 0, 0, 0, 4) + refs)
+    stream = {
+        "segment_base": {
+            "initialization": f"0-{len(init) - 1}",
+            "index_range": f"{len(init)}-{len(init) + len(sidx) - 1}",
+        }
+    }
+    return init + sidx + b"".join(fragments), stream
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.content = data
+
+    def iter_content(self, size):
+        for i in range(0, len(self.content), size):
+            yield self.content[i : i + size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def test_parse_clip():
+    """测试解析时间窗口"""
+    assert parse_clip("90-120") == (90, 120)
+    assert parse_clip("1:30-00:02:00.5") == (90, 120.5)
+    with pytest.raises(ValueError):
+        parse_clip("120-90")
+    with pytest.raises(ValueError):
+        parse_clip("1:xx-2:00")
+
+
+def test_clip_fetches_only_needed_subsegments(tmp_path):
+    """测试只请求覆盖时间窗口的字节范围，并从关键帧开始"""
+    data, stream = _dash_file()
+    requests_made = []
+
+    def fake_open_range(urls, start, end, headers=None, timeout=30):
+        requests_made.append((start, end))
+        return FakeResponse(data[start : end + 1])
+
+    with patch.object(clip, "_open_range", fake_open_range):
+        plan = plan_clip(stream, ["http://a"], 5.0, 5.5)
+        # 5 秒位于第 3 个子分段，它不是关键帧，向前扩展到第 2 个
+        assert (plan.start, plan.end) == (2.0, 6.0)
+        dest = tmp_path / "clip.m4s"
+        write_clip(plan, ["http://a"], str(dest))
+
+    assert requests_made[-1] == plan.byte_range
+    assert sum(end - start + 1 for start, end in requests_made) < len(data)
+
+    output = dest.read_bytes()
+    assert b"B" * 100 in output and b"C" * 100 in output
+    assert b"A" * 100 not in output and b"D" * 100 not in output
+    assert "sidx" not in [box.type for box in iter_boxes(output)]
+    # 时间戳从 0 开始
+    moof = next(box for box in iter_boxes(output) if box.type == "moof")
+    tfdt = find_box(output, ["traf", "tfdt"], moof.payload_offset, moof.end)
+    assert struct.unpack_from(">Q", output, tfdt.payload_offset + 4)[0] == 0
@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+from bili_downloader.core.dir_snapshot import DirSnapshot
+
+
+def test_snapshot_answers_from_single_scan(tmp_path):
+    """测试存在性检查不再访问文件系统"""
+    (tmp_path / "ep.mkv").write_bytes(b"data")
+    snapshot = DirSnapshot(str(tmp_path))
+
+    with patch("os.path.exists") as mock_exists:
+        assert snapshot.exists(str(tmp_path / "ep.mkv"))
+        assert not snapshot.exists(str(tmp_path / "ep.ogg"))
+        mock_exists.assert_not_called()
+
+
+def test_snapshot_tracks_changes(tmp_path):
+    """测试运行中写入和删除的文件同步到快照"""
+    snapshot = DirSnapshot(str(tmp_path / "missing"))
+    assert snapshot.names() == set()
+
+    snapshot = DirSnapshot(str(tmp_path))
+    path = tmp_path / "ep.m4s"
+    path.write_bytes(b"data")
+    assert not snapshot.exists(str(path))
+    snapshot.update(str(path))
+    assert snapshot.exists(str(path))
+
+    assert snapshot.remove(str(path))
+    assert not path.exists()
+    assert not snapshot.exists(str(path))
+    assert not snapshot.remove(str(path))
+
+    # 其他目录中的路径直接查询文件系统
+    other = tmp_path / "sub"
+    other.mkdir()
+    (other / "x").write_bytes(b"")
+    assert snapshot.exists(str(other / "x"))
@@ -0,0 +1,116 @@
+import io
+import json
+
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.bangumi_downloader import BangumiDownloader
+from bili_downloader.core.download_plan import (
+    build_plan,
+    load_plan,
+    parse_episode_spec,
+    plan_downloads,
+    url_expiry,
+)
+from bili_downloader.core.stream_selector import SelectionPolicy, StreamChoice
+
+FORMAT = {
+    "quality": 80,
+    "format": "flv",
+    "new_description": "1080P",
+    "display_desc": "",
+}
+
+
+def _stream(cid, deadline, kind):
+    url = (
+        f"https://upos-sz-mirrorali.bilivideo.com/{cid}-{kind}.m4s?deadline={deadline}"
+    )
+    return {"id": 80 if kind == "video" else 30280, "base_url": url, "bandwidth": 8000}
+
+
+class FakeDownloader(BangumiDownloader):
+    def __init__(self, deadlines, **kwargs):
+        super().__init__({}, {}, **kwargs)
+        self.deadlines = deadlines
+        self.resolved = []
+
+    def get_bangumi_downloads(self, aid, cid, qn=80, headers=None, duration=0.0):
+        self.resolved.append(cid)
+        if cid not in self.deadlines:
+            raise KeyError("dash")
+        deadline = self.deadlines[cid]
+        video, audio = _stream(cid, deadline, "video"), _stream(cid, deadline, "audio")
+        self.last_stream_choice = StreamChoice(video, audio, SelectionPolicy(), 60)
+        return FORMAT, video, audio
+
+
+def _season():
+    return {
+        "season_id": 7,
+        "season_title": "番剧",
+        "episodes": [
+            {"aid": 1, "cid": 11, "share_copy": "第1话", "duration": 60000},
+            {"aid": 1, "cid": 12, "share_copy": "第2话", "duration": 60000},
+            {"aid": 1, "cid": 13, "duration": 60000},
+        ],
+    }
+
+
+def test_url_expiry_and_episode_spec():
+    """测试从地址解析过期时间和解析剧集选择"""
+    assert url_expiry("https://x/a.m4s?e=1&deadline=1700000000") == 1700000000
+    assert url_expiry("https://x/a.m4s") is None
+    assert parse_episode_spec("1,3-5, 7") == {1, 3, 4, 5, 7}
+    assert parse_episode_spec("") == set()
+
+
+def test_build_plan(tmp_path):
+    """测试下载计划包含每一集的流、地址过期时间、预计大小和文件名"""
+    downloader = FakeDownloader({11: 2000000000, 12: 2000000000})
+    plan = build_plan(downloader, _season(), str(tmp_path), 80, url="https://x/ss7")
+
+    first, second, third = plan["episodes"]
+    assert first["title"] == "第1话1080P"
+    assert first["output"] == "第1话1080P.mkv"
+    assert first["streams"]["video"]["file"] == "第1话1080P.flv"
+    assert first["streams"]["audio"]["expires_at"] == 2000000000
+    assert first["streams"]["video"]["urls"] == [
+        _stream(11, 2000000000, "video")["base_url"]
+    ]
+    # 8000 比特/秒 × 60 秒
+    assert first["streams"]["video"]["expected_bytes"] == 60000
+    assert first["expected_bytes"] == 120000
+    assert first["stream_choice"].startswith("策略 default: ")
+    # 无法解析的剧集记录错误，执行时重新解析
+    assert "error" in third and third["episode"]["share_copy"] == "Episode_3"
+
+    reloaded = load_plan(io.StringIO(json.dumps(plan, ensure_ascii=False)))
+    assert reloaded == plan
+
+
+def test_apply_resolves_only_expired(tmp_path):
+    """测试执行计划时只重新解析地址已过期的剧集"""
+    plan = build_plan(
+        FakeDownloader({11: 2000000000, 12: 1000, 13: 2000000000}),
+        _season(),
+        str(tmp_path),
+        80,
+    )
+    info, resolved = plan_downloads(plan, selected={1, 2}, now=1500000000)
+    assert [ep["cid"] for ep in info["episodes"]] == [11, 12]
+    assert list(resolved) == [11]
+
+    settings = Settings()
+    settings.download.library_index = False
+    downloader = FakeDownloader({11: 0, 12: 2000000000}, settings=settings)
+    seen = []
+    downloader.download_all_from_info_with_quality(
+        info,
+        str(tmp_path),
+        80,
+        resolved=resolved,
+        progress=lambda i, ep, status: seen.append((ep["cid"], status)),
+        # 解析后按关键字跳过，不实际下载
+        keyword="不存在的关键字",
+    )
+    assert downloader.resolved == [12]
+    assert seen[-1] == (12, "skipped")
@@ -1,6 +1,12 @@
+import os
+import subprocess
 from unittest.mock import MagicMock, patch
 
-from bili_downloader.core.downloader_aria2 import DownloaderAria2
+from bili_downloader.core.downloader_aria2 import (
+    Aria2Batch,
+    Aria2Entry,
+    DownloaderAria2,
+)
 
 
 @patch("bili_downloader.core.downloader_aria2.find_executable")
@@ -43,25 +49,26 @@ def test_downloader_aria2_init_with_custom_headers(mock_find_executable):
 @patch("bili_downloader.core.downloader_aria2.find_executable")
 @patch("bili_downloader.core.downloader_aria2.aria2c_path", "/usr/bin/aria2c")
 @patch("os.makedirs")
-@patch("subprocess.run")
+@patch("bili_downloader.core.downloader_aria2.run_with_watchdog")
 def test_downloader_aria2_run_success(
-    mock_subprocess_run, mock_makedirs, mock_find_executable
+    mock_run_with_watchdog, mock_makedirs, mock_find_executable
 ):
     """测试DownloaderAria2成功运行"""
     mock_find_executable.return_value = "/usr/bin/aria2c"
 
     # 模拟成功的子进程运行
     mock_result = MagicMock()
+    mock_result.stalled = False
     mock_result.returncode = 0
     mock_result.stdout = ""
     mock_result.stderr = ""
-    mock_subprocess_run.return_value = mock_result
+    mock_run_with_watchdog.return_value = mock_result
 
     downloader = DownloaderAria2("http://example.com/test.mp4", 8, "/tmp/test.mp4")
     result = downloader.run()
 
     assert result is True
-    mock_subprocess_run.assert_called_once()
+    mock_run_with_watchdog.assert_called_once()
 
 
 @patch("bili_downloader.core.downloader_aria2.find_executable")
@@ -79,21 +86,175 @@ def test_downloader_aria2_run_without_executable(mock_find_executable):
 @patch("bili_downloader.core.downloader_aria2.find_executable")
 @patch("bili_downloader.core.downloader_aria2.aria2c_path", "/usr/bin/aria2c")
 @patch("os.makedirs")
-@patch("subprocess.run")
+@patch("bili_downloader.core.downloader_aria2.run_with_watchdog")
 def test_downloader_aria2_run_failure(
-    mock_subprocess_run, mock_makedirs, mock_find_executable
+    mock_run_with_watchdog, mock_makedirs, mock_find_executable
 ):
     """测试DownloaderAria2运行失败"""
     mock_find_executable.return_value = "/usr/bin/aria2c"
 
     # 模拟失败的子进程运行
     mock_result = MagicMock()
+    mock_result.stalled = False
     mock_result.returncode = 1
     mock_result.stdout = ""
     mock_result.stderr = "Download failed"
-    mock_subprocess_run.return_value = mock_result
+    mock_run_with_watchdog.return_value = mock_result
 
     downloader = DownloaderAria2("http://example.com/test.mp4", 8, "/tmp/test.mp4")
     result = downloader.run()
 
     assert result is False
+
+
+@patch("bili_downloader.core.downloader_aria2.aria2c_path", "/usr/bin/aria2c")
+@patch("os.makedirs")
+@patch("bili_downloader.core.downloader_aria2.run_with_watchdog")
+def test_downloader_aria2_rotates_mirrors_on_retry(
+    mock_run_with_watchdog, mock_makedirs
+):
+    """测试单源模式下每次重试轮换镜像"""
+    mock_result = MagicMock()
+    mock_result.stalled = False
+    mock_result.returncode = 1
+    mock_run_with_watchdog.return_value = mock_result
+
+    downloader = DownloaderAria2(
+        ["http://a/test.mp4", "http://b/test.mp4"], 8, "/tmp/test.mp4", max_retry=2
+    )
+    downloader.run()
+
+    first_cmd = mock_run_with_watchdog.call_args_list[0].args[0]
+    second_cmd = mock_run_with_watchdog.call_args_list[1].args[0]
+    assert first_cmd[-1] == "http://a/test.mp4"
+    assert second_cmd[-1] == "http://b/test.mp4"
+
+
+@patch("bili_downloader.core.downloader_aria2.aria2c_path", "/usr/bin/aria2c")
+@patch("os.makedirs")
+@patch("bili_downloader.core.downloader_aria2.run_with_watchdog")
+def test_downloader_aria2_multi_source(mock_run_with_watchdog, mock_makedirs):
+    """测试多源模式下所有镜像同时传给aria2c"""
+    mock_result = MagicMock()
+    mock_result.stalled = False
+    mock_result.returncode = 0
+    mock_run_with_watchdog.return_value = mock_result
+
+    urls = ["http://a/test.mp4", "http://b/test.mp4"]
+    downloader = DownloaderAria2(
+        urls, 8, "/tmp/test.mp4", multi_source=True, min_speed=64
+    )
+    assert downloader.run() is True
+
+    cmd = mock_run_with_watchdog.call_args.args[0]
+    assert cmd[-2:] == urls
+    assert "--uri-selector=feedback" in cmd
+    assert "--lowest-speed-limit=64K" in cmd
+
+
+@patch("bili_downloader.core.downloader_aria2.aria2c_path", "/usr/bin/aria2c")
+@patch("os.makedirs")
+@patch("bili_downloader.core.downloader_aria2.run_with_watchdog")
+def test_downloader_aria2_file_allocation(mock_run_with_watchdog, mock_makedirs):
+    """测试支持fallocate时预分配文件空间"""
+    mock_run_with_watchdog.return_value = MagicMock(stalled=False, returncode=0)
+
+    DownloaderAria2("http://example.com/test.mp4", 8, "/tmp/test.mp4").run()
+    cmd = mock_run_with_watchdog.call_args[0][0]
+    expected = "falloc" if hasattr(os, "posix_fallocate") else "none"
+    assert f"--file-allocation={expected}" in cmd
+
+    DownloaderAria2(
+        "http://example.com/test.mp4", 8, "/tmp/test.mp4", preallocate=False
+    ).run()
+    assert "--file-allocation=none" in mock_run_with_watchdog.call_args[0][0]
+
+
+@patch("bili_downloader.core.downloader_aria2.aria2c_path", "/usr/bin/aria2c")
+def test_aria2_batch_input_file_and_completion(tmp_path):
+    """测试批量下载的输入文件格式，以及按完成钩子的记录等待文件"""
+    first = str(tmp_path / "ep1" / "a.ogg")
+    second = str(tmp_path / "ep1" / "v.mp4")
+    batch = Aria2Batch(
+        [
+            Aria2Entry(
+                ["http://a/1", "http://b/1"],
+                first,
+                {"User-Agent": "ua", "referer": "http://r/\n1", "Origin": "o"},
+            ),
+            Aria2Entry(["http://a/2"], second, {}),
+        ],
+        str(tmp_path),
+        jobs=3,
+    )
+    with patch("bili_downloader.core.downloader_aria2.subprocess.Popen") as mock_popen:
+        assert batch.start() is True
+
+    with open(batch.input_path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    # 单源模式只使用第一个地址，选项中的控制字符被移除
+    assert lines[:6] == [
+        "http://a/1",
+        "  out=a.ogg",
+        f"  dir={tmp_path / 'ep1'}",
+        "  user-agent=ua",
+        "  referer=http://r/1",
+        "  header=Origin: o",
+    ]
+    assert lines[6:] == ["http://a/2", "  out=v.mp4", f"  dir={tmp_path / 'ep1'}"]
+    cmd = mock_popen.call_args.args[0]
+    assert cmd[cmd.index("-i") + 1] == batch.input_path
+    assert cmd[cmd.index("-j") + 1] == "3"
+
+    if os.name == "posix":
+        # aria2 调用钩子时传入 GID、文件数和文件路径
+        subprocess.run(["sh", batch.hook_path, "gid", "1", first], check=True)
+        mock_popen.return_value.poll.return_value = None
+        assert batch.wait([first], poll_interval=0.01) == {first}
+
+    batch.close()
+    assert not os.path.exists(batch.work_dir)
+
+
+@patch("bili_downloader.core.downloader_aria2.aria2c_path", "/usr/bin/aria2c")
+@patch("bili_downloader.core.downloader_aria2.subprocess.Popen")
+def test_aria2_batch_wait_after_exit_checks_control_files(mock_popen, tmp_path):
+    """测试进程退出后按控制文件判断哪些文件已完成"""
+    done = tmp_path / "done.mp4"
+    partial = tmp_path / "partial.mp4"
+    done.write_bytes(b"x")
+    partial.write_bytes(b"x")
+    (tmp_path / "partial.mp4.aria2").write_bytes(b"")
+    missing = tmp_path / "missing.mp4"
+
+    batch = Aria2Batch(
+        [Aria2Entry(["http://a"], str(path), {}) for path in (done, partial, missing)],
+        str(tmp_path),
+    )
+    assert batch.start() is True
+    mock_popen.return_value.poll.return_value = 1
+    assert batch.wait([str(done), str(partial), str(missing)]) == {str(done)}
+    batch.close()
+
+
+def test_aria2_batch_stall_kills_process(tmp_path):
+    """测试批量下载停滞时终止 aria2c，等待立即返回"""
+    fake = tmp_path / "aria2c"
+    # 永远不会完成的 aria2c
+    fake.write_text("#!/bin/sh\nexec sleep 60\n")
+    fake.chmod(0o755)
+    dest = str(tmp_path / "ep.mp4")
+    batch = Aria2Batch(
+        [Aria2Entry(["http://a"], dest, {})],
+        str(tmp_path),
+        stall_speed=10**9,
+        stall_window=0.2,
+    )
+    with patch("bili_downloader.core.downloader_aria2.aria2c_path", str(fake)):
+        assert batch.start() is True
+    try:
+        assert batch.wait([dest], poll_interval=0.05) == set()
+        assert batch.stalled
+        assert batch.process.poll() is not None
+    finally:
+        batch.close()
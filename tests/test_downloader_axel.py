@@ -1,6 +1,12 @@
+import json
+import struct
 from unittest.mock import MagicMock, patch
 
-from bili_downloader.core.downloader_axel import DownloaderAxel
+from bili_downloader.core.downloader_axel import (
+    DownloaderAxel,
+    read_state_file_size,
+    validators_match,
+)
 
 
 @patch("bili_downloader.core.downloader_axel.find_executable")
@@ -32,25 +38,26 @@ def test_downloader_axel_init_with_custom_headers(mock_find_executable):
 @patch("bili_downloader.core.downloader_axel.find_executable")
 @patch("bili_downloader.core.downloader_axel.axel_path", "/usr/bin/axel")
 @patch("os.makedirs")
-@patch("subprocess.run")
+@patch("bili_downloader.core.downloader_axel.run_with_watchdog")
 def test_downloader_axel_run_success(
-    mock_subprocess_run, mock_makedirs, mock_find_executable
+    mock_run_with_watchdog, mock_makedirs, mock_find_executable
 ):
     """测试DownloaderAxel成功运行"""
     mock_find_executable.return_value = "/usr/bin/axel"
 
     # 模拟成功的子进程运行
     mock_result = MagicMock()
+    mock_result.stalled = False
     mock_result.returncode = 0
     mock_result.stdout = ""
     mock_result.stderr = ""
-    mock_subprocess_run.return_value = mock_result
+    mock_run_with_watchdog.return_value = mock_result
 
     downloader = DownloaderAxel("http://example.com/test.mp4", 8, "/tmp/test.mp4")
     result = downloader.run()
 
     assert result is True
-    mock_subprocess_run.assert_called_once()
+    mock_run_with_watchdog.assert_called_once()
 
 
 @patch("bili_downloader.core.downloader_axel.find_executable")
@@ -68,19 +75,20 @@ def test_downloader_axel_run_without_executable(mock_find_executable):
 @patch("bili_downloader.core.downloader_axel.find_executable")
 @patch("bili_downloader.core.downloader_axel.axel_path", "/usr/bin/axel")
 @patch("os.makedirs")
-@patch("subprocess.run")
+@patch("bili_downloader.core.downloader_axel.run_with_watchdog")
 def test_downloader_axel_run_failure(
-    mock_subprocess_run, mock_makedirs, mock_find_executable
+    mock_run_with_watchdog, mock_makedirs, mock_find_executable
 ):
     """测试DownloaderAxel运行失败"""
     mock_find_executable.return_value = "/usr/bin/axel"
 
     # 模拟失败的子进程运行
     mock_result = MagicMock()
+    mock_result.stalled = False
     mock_result.returncode = 1
     mock_result.stdout = ""
     mock_result.stderr = "Download failed"
-    mock_subprocess_run.return_value = mock_result
+    mock_run_with_watchdog.return_value = mock_result
 
     downloader = DownloaderAxel("http://example.com/test.mp4", 8, "/tmp/test.mp4")
     result = downloader.run()
@@ -91,30 +99,33 @@ def test_downloader_axel_run_failure(
 @patch("bili_downloader.core.downloader_axel.find_executable")
 @patch("bili_downloader.core.downloader_axel.axel_path", "/usr/bin/axel")
 @patch("os.makedirs")
-@patch("subprocess.run")
+@patch("bili_downloader.core.downloader_axel.run_with_watchdog")
 def test_downloader_axel_run_with_retry(
-    mock_subprocess_run, mock_makedirs, mock_find_executable
+    mock_run_with_watchdog, mock_makedirs, mock_find_executable
 ):
     """测试DownloaderAxel重试机制"""
     mock_find_executable.return_value = "/usr/bin/axel"
 
     # 模拟前两次失败，第三次成功
     mock_result1 = MagicMock()
+    mock_result1.stalled = False
     mock_result1.returncode = 1
     mock_result1.stdout = ""
     mock_result1.stderr = "Download failed"
 
     mock_result2 = MagicMock()
+    mock_result2.stalled = False
     mock_result2.returncode = 1
     mock_result2.stdout = ""
     mock_result2.stderr = "Download failed"
 
     mock_result3 = MagicMock()
+    mock_result3.stalled = False
     mock_result3.returncode = 0
     mock_result3.stdout = ""
     mock_result3.stderr = ""
 
-    mock_subprocess_run.side_effect = [mock_result1, mock_result2, mock_result3]
+    mock_run_with_watchdog.side_effect = [mock_result1, mock_result2, mock_result3]
 
     downloader = DownloaderAxel(
         "http://example.com/test.mp4", 8, "/tmp/test.mp4", max_retry=3
@@ -122,4 +133,115 @@ def test_downloader_axel_run_with_retry(
     result = downloader.run()
 
     assert result is True
-    assert mock_subprocess_run.call_count == 3
+    assert mock_run_with_watchdog.call_count == 3
+
+
+def _write_state_file(path, size, conn_count=2):
+    """写入一个模拟的axel状态文件"""
+    chunk = size // conn_count
+    data = struct.pack("=i", conn_count) + struct.pack("=q", 0)
+    for i in range(conn_count):
+        last = size - 1 if i == conn_count - 1 else (i + 1) * chunk - 1
+        data += struct.pack("=qq", i * chunk, last)
+    path.write_bytes(data)
+
+
+def test_read_state_file_size(tmp_path):
+    """测试从axel状态文件解析文件大小"""
+    state_file = tmp_path / "test.mp4.st"
+    _write_state_file(state_file, 1000)
+
+    assert read_state_file_size(str(state_file)) == 1000
+    assert read_state_file_size(str(tmp_path / "missing.st")) == 0
+
+
+def test_validators_match():
+    """测试远程文件校验信息比对"""
+    local = {"size": 100, "etag": '"abc"', "last_modified": ""}
+
+    assert validators_match(local, {"size": 100, "etag": '"abc"'})
+    assert not validators_match(local, {"size": 100, "etag": '"def"'})
+    assert not validators_match(local, {"size": 101, "etag": '"abc"'})
+    assert not validators_match(local, None)
+    # 只有大小信息时按大小比对
+    assert validators_match({"size": 100}, {"size": 100, "etag": '"abc"'})
+
+
+@patch("bili_downloader.core.downloader_axel.axel_path", "/usr/bin/axel")
+@patch("bili_downloader.core.downloader_axel.fetch_remote_validators")
+@patch("bili_downloader.core.downloader_axel.run_with_watchdog")
+def test_downloader_axel_resumes_when_validators_match(
+    mock_run_with_watchdog, mock_fetch, tmp_path
+):
+    """测试远程文件未变化时保留部分文件续传"""
+    dest = tmp_path / "test.mp4"
+    dest.write_bytes(b"partial")
+    _write_state_file(tmp_path / "test.mp4.st", 1000)
+    (tmp_path / "test.mp4.st.json").write_text(
+        json.dumps({"size": 1000, "etag": '"abc"'})
+    )
+    mock_fetch.return_value = {"size": 1000, "etag": '"abc"', "last_modified": ""}
+
+    def check_partial_kept(*args, **kwargs):
+        assert dest.read_bytes() == b"partial"
+        assert (tmp_path / "test.mp4.st").exists()
+        return MagicMock(returncode=0, stalled=False)
+
+    mock_run_with_watchdog.side_effect = check_partial_kept
+
+    downloader = DownloaderAxel("http://example.com/test.mp4", 8, str(dest))
+    assert downloader.run() is True
+    # 成功后续传元数据被清理
+    assert not (tmp_path / "test.mp4.st.json").exists()
+
+
+@patch("bili_downloader.core.downloader_axel.axel_path", "/usr/bin/axel")
+@patch("bili_downloader.core.downloader_axel.fetch_remote_validators")
+@patch("bili_downloader.core.downloader_axel.run_with_watchdog")
+def test_downloader_axel_restarts_when_remote_changed(
+    mock_run_with_watchdog, mock_fetch, tmp_path
+):
+    """测试远程文件变化时删除部分文件从头下载"""
+    dest = tmp_path / "test.mp4"
+    dest.write_bytes(b"partial")
+    _write_state_file(tmp_path / "test.mp4.st", 1000)
+    mock_fetch.return_value = {"size": 2000, "etag": "", "last_modified": ""}
+    mock_run_with_watchdog.return_value = MagicMock(returncode=0, stalled=False)
+
+    downloader = DownloaderAxel("http://example.com/test.mp4", 8, str(dest))
+    assert downloader.run() is True
+
+    assert not dest.exists()
+    assert not (tmp_path / "test.mp4.st").exists()
+
+
+@patch("bili_downloader.core.downloader_axel.axel_path", "/usr/bin/axel")
+@patch("bili_downloader.core.downloader_axel.fetch_remote_validators")
+@patch("bili_downloader.core.downloader_axel.run_with_watchdog")
+def test_downloader_axel_retry_keeps_state(
+    mock_run_with_watchdog, mock_fetch, tmp_path
+):
+    """测试重试时不会删除状态文件，而是继续下载"""
+    dest = tmp_path / "test.mp4"
+    state_file = tmp_path / "test.mp4.st"
+    mock_fetch.return_value = {"size": 1000, "etag": '"abc"', "last_modified": ""}
+
+    attempts = []
+
+    def run_attempt(*args, **kwargs):
+        attempts.append(1)
+        if len(attempts) == 1:
+            # 第一次尝试中断，留下部分文件和状态文件
+            dest.write_bytes(b"partial")
+            _write_state_file(state_file, 1000)
+            return MagicMock(returncode=1, stalled=True, stderr="")
+        # 第二次尝试时部分文件和状态文件仍然存在
+        assert state_file.exists()
+        assert dest.read_bytes() == b"partial"
+        return MagicMock(returncode=0, stalled=False)
+
+    mock_run_with_watchdog.side_effect = run_attempt
+
+    downloader = DownloaderAxel("http://example.com/test.mp4", 8, str(dest))
+    assert downloader.run() is True
+    assert dest.read_bytes() == b"partial"
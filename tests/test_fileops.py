@@ -0,0 +1,73 @@
+import errno
+import os
+from unittest.mock import patch
+
+from bili_downloader.utils import fileops
+from bili_downloader.utils.fileops import copy_file, link_file, place_file
+
+DATA = os.urandom(3 * 1024 * 1024 + 123)
+
+
+def test_place_file_same_filesystem(tmp_path):
+    """测试同一文件系统内直接重命名"""
+    src = tmp_path / "src.mkv"
+    src.write_bytes(DATA)
+    dst = tmp_path / "dst.mkv"
+
+    assert place_file(str(src), str(dst)) == "rename"
+    assert dst.read_bytes() == DATA
+    assert not src.exists()
+
+
+def test_place_file_across_filesystems(tmp_path):
+    """测试跨文件系统时复制到临时文件后原子重命名"""
+    src = tmp_path / "src.mkv"
+    src.write_bytes(DATA)
+    dst = tmp_path / "out" / "dst.mkv"
+    dst.parent.mkdir()
+    real_replace = os.replace
+
+    def replace(a, b):
+        if a == str(src):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return real_replace(a, b)
+
+    with patch("bili_downloader.utils.fileops.os.replace", side_effect=replace):
+        assert place_file(str(src), str(dst)) == "copy"
+    assert dst.read_bytes() == DATA
+    assert not src.exists()
+    assert os.listdir(dst.parent) == ["dst.mkv"]
+
+
+def test_copy_file_falls_back_when_kernel_copy_unsupported(tmp_path):
+    """测试内核复制不可用时退回到普通复制"""
+    src = tmp_path / "src.bin"
+    src.write_bytes(DATA)
+    dst = tmp_path / "dst.bin"
+    unsupported = OSError(errno.ENOSYS, "not supported")
+
+    with (
+        patch.object(fileops.os, "copy_file_range", side_effect=unsupported),
+        patch.object(fileops.os, "sendfile", side_effect=unsupported),
+    ):
+        copy_file(str(src), str(dst))
+    assert dst.read_bytes() == DATA
+    assert dst.stat().st_mtime == src.stat().st_mtime
+
+
+def test_link_file_falls_back_to_reflink(tmp_path):
+    """测试无法硬链接时尝试 reflink，都不可用时返回 None"""
+    src = tmp_path / "src.m4s"
+    src.write_bytes(b"data")
+
+    assert link_file(str(src), str(tmp_path / "a.m4s")) == "hardlink"
+    assert os.stat(tmp_path / "a.m4s").st_ino == os.stat(src).st_ino
+
+    unsupported = OSError(errno.EXDEV, "cross-device link")
+    with (
+        patch("os.link", side_effect=unsupported),
+        patch.object(fileops, "reflink_file", side_effect=unsupported) as mock_reflink,
+    ):
+        assert link_file(str(src), str(tmp_path / "b.m4s")) is None
+        mock_reflink.assert_called_once()
+    assert not (tmp_path / "b.m4s").exists()
@@ -0,0 +1,89 @@
+import struct
+
+from bili_downloader.core.integrity import (
+    get_segment_base,
+    hash_file,
+    verify_stream_file,
+)
+from bili_downloader.core.mp4 import parse_sidx
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type.encode()) + payload
+
+
+def _sidx(sizes, timescale=1000, duration=2000):
+    payload = struct.pack(">B3sIIIIHH", 0, b"\0\0\0", 1, timescale, 0, 0, 0, len(sizes))
+    for size in sizes:
+        payload += struct.pack(">III", size, duration, 1 << 31)
+    return _box("sidx", payload)
+
+
+def _build_stream(tmp_path, sizes):
+    """构造一个带sidx索引的模拟DASH流文件"""
+    init = _box("ftyp", b"iso5\0\0\0\0") + _box("moov", b"")
+    sidx = _sidx(sizes)
+    body = b"".join(_box("mdat", b"x" * (size - 8)) for size in sizes)
+    path = tmp_path / "stream.m4s"
+    path.write_bytes(init + sidx + body)
+    stream = {
+        "segment_base": {
+            "initialization": f"0-{len(init) - 1}",
+            "index_range": f"{len(init)}-{len(init) + len(sidx) - 1}",
+        }
+    }
+    return path, stream
+
+
+def test_parse_sidx():
+    """测试解析sidx盒子"""
+    sidx, end = parse_sidx(_sidx([100, 200]))
+
+    assert sidx.timescale == 1000
+    assert [r.referenced_size for r in sidx.references] == [100, 200]
+    assert sidx.total_size(end) == end + 300
+    assert sidx.subsegments(0)[1] == (100, 299, 2.0, 4.0)
+
+
+def test_get_segment_base():
+    """测试兼容两种SegmentBase写法"""
+    assert get_segment_base(
+        {"SegmentBase": {"Initialization": "0-9", "indexRange": "10-99"}}
+    ) == ((0, 9), (10, 99))
+    assert get_segment_base({"segment_base": {}}) is None
+
+
+def test_verify_complete_stream(tmp_path):
+    """测试完整的流文件校验通过"""
+    path, stream = _build_stream(tmp_path, [100, 200])
+
+    assert verify_stream_file(str(path), stream) == (True, "")
+
+
+def test_verify_truncated_stream(tmp_path):
+    """测试被截断的流文件校验失败"""
+    path, stream = _build_stream(tmp_path, [100, 200])
+    path.write_bytes(path.read_bytes()[:-50])
+
+    ok, reason = verify_stream_file(str(path), stream)
+    assert ok is False
+    assert "段索引" in reason
+
+
+def test_verify_against_content_length(tmp_path):
+    """测试与服务器报告的大小比对"""
+    path, stream = _build_stream(tmp_path, [100])
+
+    ok, _ = verify_stream_file(str(path), {}, expected_size=path.stat().st_size + 1)
+    assert ok is False
+    assert verify_stream_file(str(path), {}, expected_size=path.stat().st_size)[0]
+
+
+def test_hash_file(tmp_path):
+    """测试流式哈希"""
+    path = tmp_path / "data"
+    path.write_bytes(b"abc")
+
+    assert hash_file(str(path)) == (
+        "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    )
@@ -0,0 +1,172 @@
+import threading
+
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.bangumi_downloader import BangumiDownloader
+from bili_downloader.core.leases import EpisodeClaims, LeaseStore
+from bili_downloader.exceptions import DownloadError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_claim_renew_and_reclaim(tmp_path):
+    """测试领取、续约、过期接管和尝试次数上限"""
+    clock = FakeClock()
+    store = LeaseStore(tmp_path / "leases.db", clock=clock)
+    other = LeaseStore(tmp_path / "leases.db", clock=clock)
+    store.enqueue("ss1", ["11", "12"])
+    other.enqueue("ss1", ["11", "12"])
+
+    a = store.claim("ss1", "a", 60)
+    b = other.claim("ss1", "b", 60)
+    assert (a.key, b.key) == ("11", "12")
+    assert store.claim("ss1", "a", 60) is None
+
+    clock.now += 50
+    assert store.renew(a, 60)
+    clock.now += 20
+    # b 的租约已过期，被 a 接管
+    taken = store.claim("ss1", "a", 60)
+    assert taken.key == "12" and taken.attempts == 2
+    assert not other.renew(b, 60)
+    assert not other.complete(b)
+    assert store.complete(taken)
+    assert store.complete(a)
+    assert store.counts("ss1") == {"done": 2}
+
+    # 失败的任务重新排队，用完尝试次数后标记为失败
+    store.enqueue("ss2", ["21"])
+    for _ in range(2):
+        store.fail(store.claim("ss2", "a", 60, max_attempts=2), "网络错误", 2)
+    assert store.counts("ss2") == {"failed": 1}
+    assert store.claim("ss2", "a", 60, max_attempts=2) is None
+    # 新的运行重新尝试失败的任务
+    store.enqueue("ss2", ["21"])
+    assert store.claim("ss2", "a", 60).attempts == 1
+
+
+def test_workers_drain_season_without_duplicates(tmp_path):
+    """测试多个进程领取同一季度的剧集，每一集只下载一次"""
+    path = tmp_path / "leases.db"
+    episodes = [{"cid": cid} for cid in range(100, 112)]
+    downloaded = []
+    lock = threading.Lock()
+
+    def worker(name):
+        claims = EpisodeClaims(LeaseStore(path), "ss1", owner=name, poll_interval=0.01)
+        for _, ep in claims.episodes(episodes):
+            with lock:
+                downloaded.append((name, ep["cid"]))
+            claims.finish("completed")
+        claims.close()
+
+    threads = [threading.Thread(target=worker, args=(f"w{n}",)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(cid for _, cid in downloaded) == list(range(100, 112))
+    assert LeaseStore(path).counts("ss1") == {"done": 12}
+
+
+def test_worker_takes_over_expired_lease(tmp_path):
+    """测试失联进程的剧集在租约过期后被其他进程接管"""
+    clock = FakeClock()
+    path = tmp_path / "leases.db"
+    episodes = [{"cid": 1}, {"cid": 2}]
+    # 失联的进程领取了第一集后不再续约
+    LeaseStore(path, clock=clock).enqueue("ss1", ["1", "2"])
+    assert LeaseStore(path, clock=clock).claim("ss1", "dead", 120).key == "1"
+
+    claims = EpisodeClaims(
+        LeaseStore(path, clock=clock),
+        "ss1",
+        owner="alive",
+        lease_seconds=120,
+        sleep=clock.sleep,
+    )
+    order = []
+    for _, ep in claims.episodes(episodes):
+        order.append(ep["cid"])
+        claims.finish("completed")
+    assert order == [2, 1]
+    assert clock.now >= 1120
+    assert claims.store.counts("ss1") == {"done": 2}
+
+
+class LeaseDownloader(BangumiDownloader):
+    """下载时不访问网络的下载器"""
+
+    def __init__(self, settings, on_download):
+        super().__init__({}, {}, settings=settings)
+        self.on_download = on_download
+        self.downloaded = []
+
+    def get_bangumi_downloads(self, aid, cid, qn, headers=None, duration=0.0):
+        format = {
+            "quality": 80,
+            "format": "mp4",
+            "new_description": "",
+            "display_desc": "",
+        }
+        return format, {"id": 80, "base_url": "v"}, {"id": 30280, "base_url": "a"}
+
+    def download_bangumi(self, url, dest, **kwargs):
+        self.on_download(self, dest)
+        with open(dest, "wb") as f:
+            f.write(b"x")
+        self.refresh_paths(dest)
+        self.downloaded.append(dest)
+        return True
+
+
+def lease_settings(tmp_path):
+    settings = Settings()
+    settings.download.lease_store = str(tmp_path / "leases.db")
+    settings.download.verify_downloads = False
+    return settings
+
+
+def test_failed_download_requeues_episode(tmp_path):
+    """测试下载失败的剧集重新排队，而不是标记为完成"""
+    settings = lease_settings(tmp_path)
+
+    def fail(downloader, dest):
+        raise DownloadError("网络错误")
+
+    downloader = LeaseDownloader(settings, fail)
+    downloader.download_all_from_info_with_quality(
+        {"season_id": 1, "episodes": [{"aid": 1, "cid": 11}]}, str(tmp_path / "ss")
+    )
+
+    store = LeaseStore(settings.download.lease_store)
+    assert store.counts("1") == {"pending": 1}
+    assert store.claim("1", "other", 60).attempts == 2
+
+
+def test_lost_lease_aborts_episode(tmp_path):
+    """测试租约被其他进程接管后不再下载和合并这一集"""
+    settings = lease_settings(tmp_path)
+
+    def take_over(downloader, dest):
+        # 下载音频期间租约被其他进程接管
+        if dest.endswith(".ogg"):
+            downloader._claims._heartbeat.lost.set()
+
+    downloader = LeaseDownloader(settings, take_over)
+    files = downloader.download_all_from_info_with_quality(
+        {"season_id": 1, "episodes": [{"aid": 1, "cid": 11}]}, str(tmp_path / "ss")
+    )
+
+    assert files == []
+    assert [dest[-4:] for dest in downloader.downloaded] == [".ogg"]
+    assert not (tmp_path / "ss" / "Episode_1.mkv").exists()
@@ -0,0 +1,73 @@
+import os
+
+from bili_downloader.core.library_index import LibraryEntry, LibraryIndex
+from bili_downloader.core.manifest import DownloadManifest
+
+
+def _entry(path, **kwargs):
+    stat = os.stat(path)
+    info = {"cid": 1, "stream_id": 30280, "codecs": "mp4a.40.2", "quality": 30280}
+    info.update(kwargs)
+    return LibraryEntry(
+        path=str(path), kind="audio", size=stat.st_size, mtime=stat.st_mtime, **info
+    )
+
+
+def test_find_returns_current_copy(tmp_path):
+    """测试按 (cid, 流 id, 编码, 清晰度) 查找有效副本"""
+    index = LibraryIndex(tmp_path / "library.db")
+    path = tmp_path / "a" / "ep1.ogg"
+    path.parent.mkdir()
+    path.write_bytes(b"audio")
+    index.record(_entry(path, sha256="abc"))
+
+    entry = index.find(1, 30280, "mp4a.40.2", 30280)
+    assert entry.path == str(path)
+    assert entry.sha256 == "abc"
+    assert index.find(1, 30280, "mp4a.40.2", 30216) is None
+    assert index.find(1, 30280, "mp4a.40.2", 30280, exclude=str(path)) is None
+
+    # 被修改或删除的文件从索引中移除
+    path.write_bytes(b"changed audio")
+    assert index.find(1, 30280, "mp4a.40.2", 30280) is None
+    assert index.count() == 0
+
+
+def test_rebuild_from_manifests(tmp_path):
+    """测试扫描下载清单重建索引，只替换扫描目录中的条目"""
+    index = LibraryIndex(tmp_path / "library.db")
+    outside = tmp_path / "outside.ogg"
+    outside.write_bytes(b"x")
+    index.record(_entry(outside, cid=9))
+
+    root = tmp_path / "library"
+    for name in ("season1", "season2"):
+        directory = root / name
+        directory.mkdir(parents=True)
+        (directory / "ep1.ogg").write_bytes(b"audio")
+        manifest = DownloadManifest(str(directory))
+        manifest.record_stream(
+            str(directory / "ep1.ogg"),
+            size=5,
+            kind="audio",
+            cid=1,
+            stream_id=30280,
+            codecs="mp4a.40.2",
+            quality=30280,
+        )
+        # 文件已被删除的条目被忽略
+        manifest.record_stream(str(directory / "gone.m4s"), size=1, cid=2)
+    index.record(_entry(root / "season1" / "ep1.ogg", cid=3))
+
+    assert index.rebuild([str(root)], workers=2) == 2
+    assert index.count() == 3
+    assert index.find(9, 30280, "mp4a.40.2", 30280).path == str(outside)
+    assert index.find(3, 30280, "mp4a.40.2", 30280) is None
+    assert index.find(1, 30280, "mp4a.40.2", 30280) is not None
+
+
+def test_rebuild_ignores_broken_manifest(tmp_path):
+    """测试无法解析的清单不影响重建"""
+    (tmp_path / ".bili_manifest.json").write_text("{broken")
+    index = LibraryIndex(tmp_path / "library.db")
+    assert index.rebuild([str(tmp_path)]) == 0
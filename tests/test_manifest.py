@@ -0,0 +1,46 @@
+import json
+
+from bili_downloader.core.manifest import MANIFEST_FILENAME, DownloadManifest
+
+
+def test_manifest_record_and_reload(tmp_path):
+    """测试清单记录和重新加载"""
+    manifest = DownloadManifest(str(tmp_path))
+    manifest.record_stream(
+        str(tmp_path / "ep1.ogg"), kind="audio", cid=1, size=10, sha256="abc"
+    )
+    manifest.record_output("ep1.mkv", cid=1, quality=80)
+
+    reloaded = DownloadManifest(str(tmp_path))
+    assert reloaded.get_stream("ep1.ogg")["sha256"] == "abc"
+    assert reloaded.get_output("ep1.mkv")["quality"] == 80
+
+    reloaded.remove_stream("ep1.ogg")
+    assert DownloadManifest(str(tmp_path)).get_stream("ep1.ogg") is None
+
+
+def test_manifest_ignores_corrupt_file(tmp_path):
+    """测试损坏的清单文件会被重新创建"""
+    (tmp_path / MANIFEST_FILENAME).write_text("{not json")
+
+    manifest = DownloadManifest(str(tmp_path))
+    manifest.record_output("ep1.mkv", cid=1)
+
+    data = json.loads((tmp_path / MANIFEST_FILENAME).read_text())
+    assert "ep1.mkv" in data["outputs"]
+    # 原子写入不会留下临时文件
+    assert [p.name for p in tmp_path.iterdir()] == [MANIFEST_FILENAME]
+
+
+def test_manifest_merges_concurrent_writers(tmp_path):
+    """测试多个进程写入同一目录的清单时不丢失彼此的记录"""
+    first = DownloadManifest(str(tmp_path))
+    second = DownloadManifest(str(tmp_path))
+    first.record_output("ep1.mkv", cid=1)
+    second.record_output("ep2.mkv", cid=2)
+    second.record_stream("ep2.ogg", cid=2, size=5)
+    second.remove_stream("ep2.ogg")
+
+    reloaded = DownloadManifest(str(tmp_path))
+    assert set(reloaded.data["outputs"]) == {"ep1.mkv", "ep2.mkv"}
+    assert reloaded.get_stream("ep2.ogg") is None
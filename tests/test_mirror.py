@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock, patch
+
+from bili_downloader.core.mirror import (
+    MirrorProbe,
+    get_stream_urls,
+    probe_mirror,
+    rank_mirrors,
+)
+
+
+def test_get_stream_urls():
+    """测试收集主地址和备用地址"""
+    stream = {
+        "base_url": "http://a/1.m4s",
+        "baseUrl": "http://a/1.m4s",
+        "backup_url": ["http://b/1.m4s", "http://c/1.m4s"],
+        "backupUrl": ["http://b/1.m4s"],
+    }
+
+    assert get_stream_urls(stream) == [
+        "http://a/1.m4s",
+        "http://b/1.m4s",
+        "http://c/1.m4s",
+    ]
+
+
+def test_get_stream_urls_without_backup():
+    """测试没有备用地址的流"""
+    assert get_stream_urls({"base_url": "http://a/1.m4s", "backup_url": None}) == [
+        "http://a/1.m4s"
+    ]
+
+
+@patch("bili_downloader.core.mirror.requests.get")
+def test_probe_mirror(mock_get):
+    """测试镜像测速"""
+    mock_response = MagicMock()
+    mock_response.status_code = 206
+    mock_response.headers = {"Content-Range": "bytes 0-1023/4096"}
+    mock_response.iter_content.return_value = [b"x" * 512, b"x" * 512]
+    mock_get.return_value.__enter__.return_value = mock_response
+
+    probe = probe_mirror("http://a/1.m4s", {"Referer": "x"}, probe_bytes=1024)
+
+    assert probe.ok
+    assert probe.total_size == 4096
+    assert probe.throughput > 0
+    assert mock_get.call_args.kwargs["headers"]["Range"] == "bytes=0-1023"
+
+
+@patch("bili_downloader.core.mirror.probe_mirror")
+def test_rank_mirrors(mock_probe):
+    """测试镜像按吞吐量排序，失败的镜像排在最后"""
+    results = {
+        "http://slow": MirrorProbe("http://slow", ttfb=0.5, throughput=100),
+        "http://fast": MirrorProbe("http://fast", ttfb=0.1, throughput=1000),
+        "http://dead": MirrorProbe("http://dead", error="timeout"),
+    }
+    mock_probe.side_effect = lambda url, *args: results[url]
+
+    ranked = rank_mirrors(["http://dead", "http://slow", "http://fast"])
+
+    assert [p.url for p in ranked] == ["http://fast", "http://slow", "http://dead"]
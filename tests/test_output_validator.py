@@ -0,0 +1,123 @@
+import struct
+from unittest.mock import patch
+
+from bili_downloader.core import output_validator
+from bili_downloader.core.output_validator import (
+    OutputValidator,
+    merge_temp_path,
+    probe_matroska,
+    probe_mp4,
+)
+
+
+def _element(element_id, payload):
+    return element_id + b"\x01" + len(payload).to_bytes(7, "big") + payload
+
+
+def _mkv(duration_ms=None, tracks=2):
+    """构造只包含头部的模拟Matroska文件"""
+    header = _element(b"\x1a\x45\xdf\xa3", _element(b"\x42\x82", b"matroska"))
+    info = _element(b"\x2a\xd7\xb1", (1_000_000).to_bytes(3, "big"))
+    if duration_ms is not None:
+        info += _element(b"\x44\x89", struct.pack(">d", duration_ms))
+    entries = b"".join(
+        _element(b"\xae", _element(b"\xd7", bytes([n + 1]))) for n in range(tracks)
+    )
+    segment = (
+        _element(b"\x15\x49\xa9\x66", info)
+        + _element(b"\x16\x54\xae\x6b", entries)
+        + _element(b"\x1f\x43\xb6\x75", b"\0" * 16)
+    )
+    return header + _element(b"\x18\x53\x80\x67", segment)
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type.encode()) + payload
+
+
+def _mp4(duration, timescale=1000, tracks=2):
+    mvhd = _box(
+        "mvhd", struct.pack(">IIIII", 0, 0, 0, timescale, duration) + b"\0" * 80
+    )
+    moov = _box("moov", mvhd + b"".join(_box("trak", b"") for _ in range(tracks)))
+    return _box("ftyp", b"isom\0\0\0\0") + moov + _box("mdat", b"x" * 32)
+
+
+def test_probe_matroska(tmp_path):
+    """测试解析Matroska头部"""
+    path = tmp_path / "ep.mkv"
+    path.write_bytes(_mkv(duration_ms=1_440_000))
+    info = probe_matroska(str(path))
+    assert info.streams == 2
+    assert info.duration == 1440.0
+
+
+def test_probe_mp4(tmp_path):
+    """测试解析MP4头部"""
+    path = tmp_path / "ep.mp4"
+    path.write_bytes(_mp4(duration=90_000, tracks=1))
+    info = probe_mp4(str(path))
+    assert info.streams == 1
+    assert info.duration == 90.0
+
+
+def test_validate_detects_incomplete_outputs(tmp_path):
+    """测试检测中断合并留下的文件"""
+    validator = OutputValidator(str(tmp_path))
+    good = tmp_path / "good.mkv"
+    good.write_bytes(_mkv(duration_ms=1_440_000))
+    interrupted = tmp_path / "interrupted.mkv"
+    interrupted.write_bytes(_mkv(duration_ms=None))
+    truncated = tmp_path / "truncated.mkv"
+    truncated.write_bytes(_mkv(duration_ms=1_440_000)[:20])
+
+    assert validator.validate(str(good), 1440).ok
+    assert not validator.validate(str(good), 600).ok
+    assert not validator.validate(str(good), 1440, expected_streams=3).ok
+    assert not validator.validate(str(interrupted), 1440).ok
+    with patch.object(output_validator, "ffprobe_path", None):
+        assert not validator.validate(str(truncated), 1440).ok
+
+
+def test_validate_uses_cache(tmp_path):
+    """测试大小和修改时间不变时使用缓存结果"""
+    path = tmp_path / "ep.mkv"
+    path.write_bytes(_mkv(duration_ms=1_440_000))
+    OutputValidator(str(tmp_path)).validate_directory()
+
+    validator = OutputValidator(str(tmp_path))
+    with patch.object(output_validator, "probe_media") as mock_probe:
+        assert validator.validate(str(path), 1440).ok
+        mock_probe.assert_not_called()
+
+
+def test_validate_directory_skips_merge_temp_files(tmp_path):
+    """测试并行校验目录时忽略合并临时文件"""
+    (tmp_path / "a.mkv").write_bytes(_mkv(duration_ms=1_000))
+    (tmp_path / "b.mkv").write_bytes(_mkv(duration_ms=2_000))
+    (tmp_path / "notes.txt").write_text("x")
+    temp = merge_temp_path(str(tmp_path / "c.mkv"))
+    assert temp.endswith("c.merging.mkv")
+    with open(temp, "wb") as f:
+        f.write(b"partial")
+
+    results = OutputValidator(str(tmp_path)).validate_directory({"b.mkv": 2})
+    assert sorted(results) == ["a.mkv", "b.mkv"]
+    assert all(result.ok for result in results.values())
+
+
+def test_validate_reuses_directory_scan(tmp_path):
+    """测试目录校验后再次校验同一文件时不再 stat"""
+    path = tmp_path / "ep.mkv"
+    path.write_bytes(_mkv(duration_ms=1_440_000))
+    validator = OutputValidator(str(tmp_path))
+    validator.validate_directory()
+
+    with patch("os.stat") as mock_stat:
+        assert validator.validate(str(path), 1440).ok
+        mock_stat.assert_not_called()
+
+    # 文件被改写后重新读取
+    validator.forget(str(path))
+    path.write_bytes(_mkv(duration_ms=600_000))
+    assert not validator.validate(str(path), 1440).ok
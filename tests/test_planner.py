@@ -0,0 +1,45 @@
+from bili_downloader.core.planner import (
+    estimate_bytes,
+    free_space,
+    plan_disk_usage,
+    stream_bandwidth,
+)
+
+
+def test_estimate_bytes():
+    """测试根据码率和时长估算大小"""
+    assert estimate_bytes(8_000_000, 60) == 60_000_000
+    assert stream_bandwidth({"bandwidth": 1234}) == 1234
+    assert stream_bandwidth({}) == 0
+    assert stream_bandwidth(None) == 0
+
+
+def test_plan_disk_usage_modes():
+    """测试不同合并方式下的峰值空间"""
+    durations = [100, 200]
+    bandwidth = 8_000_000  # 每秒 1 MB
+
+    plan = plan_disk_usage(durations, bandwidth, 10**12, margin=0)
+    assert plan.stream_bytes == 300_000_000
+    assert plan.peak_bytes == 600_000_000
+
+    plan = plan_disk_usage(durations, bandwidth, 10**12, doclean=True, margin=0)
+    assert plan.peak_bytes == 500_000_000
+
+    plan = plan_disk_usage(durations, bandwidth, 10**12, stream_merge=True, margin=0)
+    assert plan.peak_bytes == 300_000_000
+
+
+def test_plan_disk_usage_shortfall():
+    """测试可用空间不足时的判断"""
+    plan = plan_disk_usage([100], 8_000_000, 150_000_000, reserve_bytes=10, margin=0)
+    assert not plan.ok
+    assert plan.shortfall == 50_000_010
+
+    plan = plan_disk_usage([100], 8_000_000, 250_000_000, margin=0)
+    assert plan.ok
+
+
+def test_free_space_for_missing_directory(tmp_path):
+    """测试目录尚不存在时查询上级目录的可用空间"""
+    assert free_space(str(tmp_path / "a" / "b")) > 0
@@ -0,0 +1,141 @@
+import struct
+
+import pytest
+
+from bili_downloader.core.output_validator import probe_matroska, probe_mp4
+from bili_downloader.core.remux import parse_track, remux
+from bili_downloader.exceptions import RemuxError
+
+
+def _box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type.encode()) + payload
+
+
+def _full(box_type, version, flags, payload):
+    return _box(box_type, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+def _video_entry(fourcc="avc1"):
+    fields = b"\0" * 6 + struct.pack(">H", 1) + b"\0" * 16
+    fields += struct.pack(">HH", 64, 48) + b"\0" * 50
+    return _box(fourcc, fields + _box("avcC", b"\x01avcc"))
+
+
+def _audio_entry():
+    fields = b"\0" * 6 + struct.pack(">H", 1) + b"\0" * 8
+    fields += struct.pack(">HHHHI", 2, 16, 0, 0, 48000 << 16)
+    dsi = bytes([0x05, 2]) + b"\x11\x90"
+    dcd = bytes([0x04, 13 + len(dsi)]) + b"\x40\x15" + b"\0" * 11 + dsi
+    es = bytes([0x03, 3 + len(dcd)]) + b"\0\x01\0" + dcd
+    return _box("mp4a", fields + _full("esds", 0, 0, es))
+
+
+def _init(entry, handler, track_id, timescale):
+    """构造只包含一条轨道的fMP4初始化段"""
+    stsd = _full("stsd", 0, 0, struct.pack(">I", 1) + entry)
+    tkhd = _full("tkhd", 0, 3, struct.pack(">IIIII", 0, 0, track_id, 0, 0) + b"\0" * 60)
+    mdhd = _full("mdhd", 0, 0, struct.pack(">IIII", 0, 0, timescale, 0) + b"\0" * 4)
+    hdlr = _full("hdlr", 0, 0, b"\0" * 4 + handler.encode() + b"\0" * 13)
+    mdia = _box("mdia", mdhd + hdlr + _box("minf", _box("stbl", stsd)))
+    mvhd = _full("mvhd", 0, 0, struct.pack(">IIII", 0, 0, 1000, 0) + b"\0" * 80)
+    trex = _full("trex", 0, 0, struct.pack(">IIIII", track_id, 1, 0, 0, 0))
+    moov = _box("moov", mvhd + _box("trak", tkhd + mdia) + _box("mvex", trex))
+    return _box("ftyp", b"iso5\0\0\0\0") + moov
+
+
+def _fragment(sequence, track_id, decode_time, samples):
+    """构造一个moof+mdat分片，samples 为 (数据, 时长, 标志) 列表"""
+
+    def moof(data_offset):
+        entries = b"".join(
+            struct.pack(">III", duration, len(data), flags)
+            for data, duration, flags in samples
+        )
+        trun = _full(
+            "trun", 0, 0x701, struct.pack(">Ii", len(samples), data_offset) + entries
+        )
+        traf = _box(
+            "traf",
+            _full("tfhd", 0, 0x20000, struct.pack(">I", track_id))
+            + _full("tfdt", 1, 0, struct.pack(">Q", decode_time))
+            + trun,
+        )
+        return _box("moof", _full("mfhd", 0, 0, struct.pack(">I", sequence)) + traf)
+
+    header = moof(len(moof(0)) + 8)
+    return header + _box("mdat", b"".join(data for data, _, _ in samples))
+
+
+NON_SYNC = 0x00010000
+
+
+@pytest.fixture
+def dash_inputs(tmp_path):
+    """构造两个分片的视频流(1000时间刻度)和音频流(48000时间刻度)"""
+    video = _init(_video_entry(), "vide", 1, 1000)
+    video += _fragment(1, 1, 0, [(b"V0", 500, 0), (b"V1", 500, NON_SYNC)])
+    video += _fragment(2, 1, 1000, [(b"V2", 500, 0), (b"V3", 500, NON_SYNC)])
+    audio = _init(_audio_entry(), "soun", 2, 48000)
+    audio += _fragment(1, 2, 0, [(b"A0", 24000, 0), (b"A1", 24000, 0)])
+    audio += _fragment(2, 2, 48000, [(b"A2", 24000, 0), (b"A3", 24000, 0)])
+
+    video_path = tmp_path / "video.m4s"
+    audio_path = tmp_path / "audio.m4s"
+    video_path.write_bytes(video)
+    audio_path.write_bytes(audio)
+    return str(video_path), str(audio_path)
+
+
+def test_parse_track(dash_inputs):
+    """测试解析单轨fMP4"""
+    video = parse_track(dash_inputs[0])
+    assert video.kind == "video"
+    assert (video.width, video.height) == (64, 48)
+    assert video.codec_private == b"\x01avcc"
+    assert len(video.fragments) == 2
+    assert video.duration == 2.0
+
+    audio = parse_track(dash_inputs[1])
+    assert audio.kind == "audio"
+    assert audio.codec_private == b"\x11\x90"
+    assert (audio.channels, audio.sample_rate) == (2, 48000)
+
+
+def test_remux_to_mp4(dash_inputs, tmp_path):
+    """测试封装为分片MP4"""
+    output = tmp_path / "out.mp4"
+    remux(list(dash_inputs), str(output))
+
+    info = probe_mp4(str(output))
+    assert info.streams == 2
+    assert info.duration == 2.0
+    data = output.read_bytes()
+    # 分片按时间交织：同一时刻视频在前，音频在后
+    order = [data.index(s) for s in (b"V0V1", b"A0A1", b"V2V3", b"A2A3")]
+    assert order == sorted(order)
+
+
+def test_remux_to_matroska(dash_inputs, tmp_path):
+    """测试封装为Matroska"""
+    output = tmp_path / "out.mkv"
+    remux(list(dash_inputs), str(output))
+
+    info = probe_matroska(str(output))
+    assert info.streams == 2
+    assert info.duration == pytest.approx(2.0)
+    data = output.read_bytes()
+    order = [data.index(s) for s in (b"V0", b"A0", b"V1", b"A1", b"V2", b"A2")]
+    assert order == sorted(order)
+
+
+def test_remux_rejects_unsupported_codec(tmp_path):
+    """测试不支持的编码抛出RemuxError且不留下输出文件"""
+    path = tmp_path / "video.m4s"
+    path.write_bytes(
+        _init(_video_entry("encv"), "vide", 1, 1000)
+        + _fragment(1, 1, 0, [(b"V0", 500, 0)])
+    )
+    output = tmp_path / "out.mkv"
+    with pytest.raises(RemuxError):
+        remux([str(path)], str(output))
+    assert not output.exists()
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.bangumi_downloader import BangumiDownloader
+from bili_downloader.core.server import (
+    JobClient,
+    JobManager,
+    JobServer,
+    parse_job_request,
+)
+from bili_downloader.exceptions import DownloadError
+
+
+@pytest.fixture
+def job_api(tmp_path):
+    """在随机端口启动任务服务，第一集下载在 release 被设置前阻塞"""
+    release = threading.Event()
+    started = []
+    forks = []
+
+    class FakeDownloader(BangumiDownloader):
+        def fork(self):
+            other = super().fork()
+            forks.append(other)
+            return other
+
+        def get_detailed_info_from_url(self, url, headers=None):
+            episodes = [
+                {"title": str(n), "share_copy": f"{url} 第{n}话"} for n in (1, 2)
+            ]
+            return self.cache_season({"season_id": url, "episodes": episodes})
+
+        def download_all_from_info_with_quality(
+            self, info, destdir, quality, *args, progress=None, cancel_event=None
+        ):
+            files = []
+            started.append(info["season_id"])
+            for i, ep in enumerate(info["episodes"]):
+                if cancel_event.is_set():
+                    break
+                progress(i, ep, "running")
+                release.wait(5)
+                progress(i, ep, "completed")
+                files.append(f"{destdir}/{ep['title']}.mkv")
+            return files
+
+    settings = Settings()
+    settings.history.last_directory = str(tmp_path)
+    base = FakeDownloader({}, {}, settings=settings)
+    manager = JobManager(base, settings, workers=1)
+    server = JobServer(manager, "127.0.0.1", 0)
+    manager.start()
+    server.start()
+    yield JobClient(server.url), release, started, base, forks
+    release.set()
+    server.shutdown()
+    server.server_close()
+    manager.stop(timeout=5)
+
+
+def test_job_api_progress_priority_and_cancel(job_api):
+    """测试提交任务、按优先级执行、查询每集进度和取消任务"""
+    client, release, started, base, forks = job_api
+    assert client._request("GET", "/health") == {"status": "ok"}
+
+    first = client.submit("a", directory="/data")
+    assert first["status"] in ("queued", "running")
+    while not started:
+        time.sleep(0.01)
+    low = client.submit("low")
+    high = client.submit("high", priority=10)
+    cancelled = client.submit("cancelled", priority=20)
+    assert client.cancel(cancelled["id"])["status"] == "cancelled"
+
+    release.set()
+    done = client.wait(first["id"])
+    assert done["status"] == "completed"
+    assert done["files"] == ["/data/1.mkv", "/data/2.mkv"]
+    assert [ep["status"] for ep in done["episodes"]] == ["completed", "completed"]
+    assert done["episodes"][0]["title"] == "a 第1话"
+    assert done["progress"] == {"completed": 2}
+
+    assert client.wait(low["id"])["status"] == "completed"
+    assert client.wait(high["id"])["status"] == "completed"
+    # 高优先级的任务先执行，已取消的任务不执行
+    assert started == ["a", "high", "low"]
+    assert len(client.list()) == 4
+
+    # 所有任务共享连接池和季度缓存
+    assert all(f.session is base.session for f in forks)
+    assert set(base._season_cache) == {"a", "high", "low"}
+
+
+def test_cancel_running_job(job_api):
+    """测试取消进行中的任务：当前剧集结束后停止"""
+    client, release, started, base, forks = job_api
+    job = client.submit("a")
+    # 等待第一集开始下载
+    while not client.get(job["id"])["episodes"] or not started:
+        time.sleep(0.01)
+    client.cancel(job["id"])
+    release.set()
+    result = client.wait(job["id"])
+    assert result["status"] == "cancelled"
+    assert [ep["status"] for ep in result["episodes"]] == ["completed", "queued"]
+    assert result["files"] == [f"{base.settings.history.last_directory}/1.mkv"]
+
+    with pytest.raises(requests.HTTPError):
+        client.get("missing")
+    with pytest.raises(requests.HTTPError):
+        client._request("POST", "/jobs", json={"priority": 1})
+
+
+def test_job_fails_when_episode_downloads_fail(tmp_path):
+    """测试剧集下载失败时任务状态为失败"""
+
+    class FailingDownloader(BangumiDownloader):
+        def get_detailed_info_from_url(self, url, headers=None):
+            return {"season_id": 1, "episodes": [{"aid": 1, "cid": 11}]}
+
+        def get_bangumi_downloads(self, aid, cid, qn, headers=None, duration=0.0):
+            format = {
+                "quality": 80,
+                "format": "mp4",
+                "new_description": "",
+                "display_desc": "",
+            }
+            return format, {"id": 80, "base_url": "v"}, {"id": 30280, "base_url": "a"}
+
+        def download_bangumi(self, url, dest, **kwargs):
+            raise DownloadError("网络错误")
+
+    settings = Settings()
+    settings.history.last_directory = str(tmp_path)
+    manager = JobManager(FailingDownloader({}, {}, settings=settings), settings)
+    job = manager.submit(parse_job_request({"url": "a"}))
+    manager.start()
+    try:
+        while job.status in ("queued", "running"):
+            time.sleep(0.01)
+    finally:
+        manager.stop(timeout=5)
+    assert job.status == "failed"
+    assert [ep["status"] for ep in job.episodes] == ["failed"]
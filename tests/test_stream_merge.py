@@ -0,0 +1,107 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from bili_downloader.core import stream_merge
+from bili_downloader.core.stream_merge import StreamingMerger, _content_total
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="需要命名管道")
+
+# 模拟 ffmpeg：依次读取两个输入并拼接写入输出文件
+FAKE_FFMPEG = """#!/bin/sh
+for out; do :; done
+cat "$3" "$5" > "$out"
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG)
+    path.chmod(0o755)
+    with patch.object(stream_merge.vamerger, "ffmpeg_path", str(path)):
+        yield path
+
+
+def _response(chunks, status=200, headers=None, fail=False):
+    response = MagicMock()
+    response.status_code = status
+    response.headers = headers or {}
+
+    def iter_content(_size):
+        yield from chunks
+        if fail:
+            raise requests.ConnectionError("reset")
+
+    response.iter_content.side_effect = iter_content
+    response.__enter__.return_value = response
+    return response
+
+
+def test_content_total():
+    """测试根据响应头计算资源总大小"""
+    assert _content_total(_response([], headers={"Content-Length": "10"}), 0) == 10
+    assert (
+        _content_total(_response([], headers={"Content-Range": "bytes 4-9/10"}), 4)
+        == 10
+    )
+    assert _content_total(_response([]), 0) == 0
+
+
+@patch("bili_downloader.core.stream_merge.requests.get")
+def test_streaming_merge(mock_get, fake_ffmpeg, tmp_path):
+    """测试两个流经管道送入合并进程"""
+    responses = {
+        "http://video": _response([b"VV", b"VV"], headers={"Content-Length": "4"}),
+        "http://audio": _response([b"AA"], headers={"Content-Length": "2"}),
+    }
+    mock_get.side_effect = lambda url, **kwargs: responses[url]
+    output = tmp_path / "out.mkv"
+
+    merger = StreamingMerger(["http://audio"], ["http://video"], str(output))
+    assert merger.run() is True
+    assert output.read_bytes() == b"VVVVAA"
+    assert merger.bytes_fed == {"video": 4, "audio": 2}
+
+
+@patch("bili_downloader.core.stream_merge.requests.get")
+def test_streaming_merge_resumes_on_next_mirror(mock_get, fake_ffmpeg, tmp_path):
+    """测试传输中断后用Range请求在下一个镜像上继续"""
+    calls = []
+
+    def get(url, headers=None, **kwargs):
+        calls.append((url, (headers or {}).get("Range")))
+        if url == "http://audio":
+            return _response([b"AA"])
+        if url == "http://video-1":
+            return _response([b"VVV"], headers={"Content-Length": "6"}, fail=True)
+        return _response([b"vvv"], status=206, headers={"Content-Range": "bytes 3-5/6"})
+
+    mock_get.side_effect = get
+    output = tmp_path / "out.mkv"
+
+    merger = StreamingMerger(
+        "http://audio", ["http://video-1", "http://video-2"], str(output)
+    )
+    assert merger.run() is True
+    assert output.read_bytes() == b"VVVvvvAA"
+    assert ("http://video-2", "bytes=3-") in calls
+
+
+@patch("bili_downloader.core.stream_merge.requests.get")
+def test_streaming_merge_failure_removes_output(mock_get, fake_ffmpeg, tmp_path):
+    """测试所有镜像都失败时删除不完整的输出"""
+
+    def get(url, **kwargs):
+        if url == "http://audio":
+            raise requests.ConnectionError("refused")
+        return _response([b"VV"])
+
+    mock_get.side_effect = get
+    output = tmp_path / "out.mkv"
+
+    merger = StreamingMerger("http://audio", "http://video", str(output), retries=1)
+    assert merger.run() is False
+    assert not output.exists()
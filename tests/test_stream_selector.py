@@ -0,0 +1,70 @@
+import pytest
+
+from bili_downloader.core.stream_selector import (
+    SelectionPolicy,
+    codec_name,
+    parse_policy,
+    select_streams,
+)
+
+VIDEOS = [
+    {"id": 80, "codecid": 7, "codecs": "avc1.640032", "bandwidth": 3_000_000},
+    {"id": 80, "codecid": 12, "codecs": "hev1.1.6.L150.90", "bandwidth": 1_800_000},
+    {"id": 80, "codecid": 13, "codecs": "av01.0.08M.08", "bandwidth": 1_500_000},
+    {"id": 64, "codecid": 7, "codecs": "avc1.640028", "bandwidth": 1_400_000},
+    {"id": 32, "codecid": 7, "codecs": "avc1.64001F", "bandwidth": 700_000},
+]
+AUDIOS = [
+    {"id": 30216, "bandwidth": 64_000},
+    {"id": 30280, "bandwidth": 192_000},
+]
+
+
+def test_parse_policy():
+    """测试解析策略字符串"""
+    assert parse_policy("").mode == "default"
+    assert parse_policy("Prefer-AV1").mode == "prefer-av1"
+    assert parse_policy("max-bitrate-under=2000").max_bitrate == 2_000_000
+    assert parse_policy("max-bitrate-under=1.5M").max_bitrate == 1_500_000
+    with pytest.raises(ValueError):
+        parse_policy("fastest")
+    with pytest.raises(ValueError):
+        parse_policy("max-bitrate-under=abc")
+
+
+def test_default_keeps_listed_codec():
+    """测试默认策略使用清晰度格式中的第一个编码和最高音质"""
+    choice = select_streams(VIDEOS, AUDIOS, 80, preferred_codecs="avc1.640032")
+    assert codec_name(choice.video) == "avc"
+    assert choice.audio["id"] == 30280
+
+
+def test_smallest_and_prefer_policies():
+    """测试按码率和编码偏好选择"""
+    choice = select_streams(VIDEOS, AUDIOS, 80, SelectionPolicy("smallest"), None, 600)
+    assert codec_name(choice.video) == "av1"
+    assert choice.audio["id"] == 30216
+    assert choice.estimated_bytes == (1_500_000 + 64_000) * 600 // 8
+    assert "AVC -49%" in choice.describe()
+
+    choice = select_streams(VIDEOS, AUDIOS, 80, SelectionPolicy("prefer-hevc"))
+    assert codec_name(choice.video) == "hevc"
+    # 首选编码不可用时按回退顺序选择
+    choice = select_streams(VIDEOS, AUDIOS, 64, SelectionPolicy("prefer-av1"))
+    assert codec_name(choice.video) == "avc"
+
+
+def test_max_bitrate_under():
+    """测试码率上限选择不超过上限的最高清晰度"""
+    policy = parse_policy("max-bitrate-under=2100")
+    choice = select_streams(VIDEOS, AUDIOS, 80, policy)
+    assert choice.video["codecid"] == 12
+    assert choice.bandwidth <= 2_100_000
+
+    choice = select_streams(VIDEOS, AUDIOS, 80, parse_policy("max-bitrate-under=1500"))
+    assert choice.video["id"] == 32
+
+    # 没有满足上限的流时使用码率最低的组合
+    choice = select_streams(VIDEOS, AUDIOS, 80, parse_policy("max-bitrate-under=100"))
+    assert choice.video["id"] == 32
+    assert choice.audio["id"] == 30216
@@ -0,0 +1,115 @@
+import random
+
+from bili_downloader.config.settings import Settings
+from bili_downloader.core.bangumi_downloader import BangumiDownloader
+from bili_downloader.core.manifest import DownloadManifest
+from bili_downloader.core.subscriptions import (
+    Subscription,
+    SubscriptionStore,
+    Watcher,
+    completed_episodes,
+    episode_changes,
+    next_interval,
+)
+
+
+def test_episode_changes_and_backoff():
+    """测试只检测新增或 cid 变化的剧集，已完结的季度逐次加倍检查间隔"""
+    subscription = Subscription(1, "url", "/tmp", 80, episodes={"101": 11})
+    info = {"episodes": [{"id": 101, "cid": 11}, {"id": 102, "cid": 12}]}
+    assert [ep["id"] for ep in episode_changes(subscription, info)] == [102]
+    info["episodes"][0]["cid"] = 99
+    assert len(episode_changes(subscription, info)) == 2
+
+    assert next_interval(subscription, False, 1800, 10000) == 1800
+    subscription.finished = True
+    subscription.interval = 1800
+    assert next_interval(subscription, False, 1800, 10000) == 3600
+    subscription.interval = 8000
+    assert next_interval(subscription, False, 1800, 10000) == 10000
+    assert next_interval(subscription, True, 1800, 10000) == 1800
+
+
+def test_watcher_downloads_only_new_episodes(tmp_path):
+    """测试检查订阅时只下载新剧集，并保留其他进程添加的订阅"""
+    directory = tmp_path / "season"
+    directory.mkdir()
+    store = SubscriptionStore(tmp_path / "subscriptions.json")
+    subscription = Subscription(
+        5, "url", str(directory), 80, episodes={"101": 11}, next_poll=0
+    )
+    store.add(subscription)
+    store.save()
+
+    season = {
+        "season_id": 5,
+        "season_title": "连载番",
+        "publish": {"is_finish": 0},
+        "episodes": [{"id": 101, "cid": 11}, {"id": 102, "cid": 12}],
+    }
+    downloaded = []
+
+    class FakeDownloader(BangumiDownloader):
+        def get_bangumi_info_by_season_id(self, season_id, headers=None):
+            return season
+
+        def download_all_from_info_with_quality(self, info, destdir, quality, **kw):
+            downloaded.extend(ep["id"] for ep in info["episodes"])
+            manifest = DownloadManifest(destdir)
+            for ep in info["episodes"]:
+                manifest.record_output(f"{ep['id']}.mkv", ep_id=ep["id"], cid=ep["cid"])
+            return []
+
+    # 检查期间另一个进程添加了订阅
+    other = SubscriptionStore(store.path)
+    other.add(Subscription(6, "url6", str(tmp_path), 80, next_poll=10**12))
+    other.save()
+
+    settings = Settings()
+    watcher = Watcher(
+        store,
+        lambda: FakeDownloader({}, {}, settings=settings),
+        settings,
+        clock=lambda: 1000.0,
+        rng=random.Random(0),
+    )
+    assert watcher.run_once() == 1
+    assert downloaded == [102]
+
+    saved = SubscriptionStore(store.path).subscriptions
+    assert set(saved) == {5, 6}
+    assert saved[5].episodes == {"101": 11, "102": 12}
+    assert saved[5].title == "连载番"
+    jitter = settings.watch.jitter
+    assert (
+        1000 + 1800 * (1 - jitter) <= saved[5].next_poll <= 1000 + 1800 * (1 + jitter)
+    )
+
+    # 没有新剧集时不再下载
+    store.subscriptions[5].next_poll = 0
+    store.save()
+    assert watcher.run_once() == 0
+    assert downloaded == [102]
+
+
+def test_existing_outputs_count_as_completed(tmp_path):
+    """测试下载清单出现之前已下载的剧集在跳过时记录为已完成"""
+    (tmp_path / "第1话.mkv").write_bytes(b"x")
+
+    class ExistingDownloader(BangumiDownloader):
+        def get_bangumi_downloads(self, aid, cid, qn, headers=None, duration=0.0):
+            format = {
+                "quality": 80,
+                "format": "mp4",
+                "new_description": "",
+                "display_desc": "",
+            }
+            return format, {"id": 80, "base_url": "v"}, {"id": 30280, "base_url": "a"}
+
+        def output_is_complete(self, *args, **kwargs):
+            return True
+
+    info = {"episodes": [{"id": 101, "aid": 1, "cid": 11, "share_copy": "第1话"}]}
+    downloader = ExistingDownloader({}, {}, settings=Settings())
+    downloader.download_all_from_info_with_quality(info, str(tmp_path))
+    assert completed_episodes(str(tmp_path)) == {"101": 11}
@@ -0,0 +1,102 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from bili_downloader.core import transcode
+from bili_downloader.core.transcode import (
+    Transcoder,
+    available_cpus,
+    cgroup_cpu_limit,
+    resolve_preset,
+    transcode_file,
+)
+
+
+def test_cgroup_cpu_limit(tmp_path):
+    """测试读取 cgroup v2 和 v1 的 CPU 配额"""
+    cpu_max = tmp_path / "cpu.max"
+    cpu_max.write_text("250000 100000\n")
+    assert cgroup_cpu_limit(str(cpu_max)) == 2.5
+
+    cpu_max.write_text("max 100000\n")
+    assert cgroup_cpu_limit(str(cpu_max)) is None
+
+    quota = tmp_path / "cpu.cfs_quota_us"
+    period = tmp_path / "cpu.cfs_period_us"
+    quota.write_text("150000")
+    period.write_text("100000")
+    missing = str(tmp_path / "missing")
+    assert cgroup_cpu_limit(missing, str(quota), str(period)) == 1.5
+    quota.write_text("-1")
+    assert cgroup_cpu_limit(missing, str(quota), str(period)) is None
+
+    # 配额向上取整，并且不超过 CPU 亲和性
+    with (
+        patch("os.sched_getaffinity", return_value=set(range(16))),
+        patch.object(transcode, "cgroup_cpu_limit", return_value=2.5),
+    ):
+        assert available_cpus() == 3
+
+
+def test_resolve_preset():
+    """测试转码预设和自定义参数"""
+    assert resolve_preset("archive-hevc")[:2] == ["-c:v", "libx265"]
+    assert resolve_preset("archive-hevc", "-c:v libx264 -crf 30") == [
+        "-c:v",
+        "libx264",
+        "-crf",
+        "30",
+    ]
+    with pytest.raises(ValueError):
+        resolve_preset("nvenc")
+
+
+@patch.object(transcode.vamerger, "ffmpeg_path", "/usr/bin/ffmpeg")
+@patch("subprocess.Popen")
+def test_transcode_file(mock_popen, tmp_path):
+    """测试转码命令使用低优先级，成功后替换输出文件"""
+    src = tmp_path / "ep.mkv"
+    src.write_bytes(b"original")
+    dst = tmp_path / "ep.archive-hevc.mkv"
+
+    def fake_popen(cmd, **kwargs):
+        with open(cmd[-1], "wb") as f:
+            f.write(b"encoded")
+        process = MagicMock()
+        process.returncode = 0
+        process.poll.return_value = 0
+        process.stderr = iter(())
+        return process
+
+    mock_popen.side_effect = fake_popen
+    with patch("shutil.which", return_value="/usr/bin/tool"):
+        result = transcode_file(
+            str(src), str(dst), ["-c:v", "libx265"], 2, nice=10, ionice_class=3
+        )
+
+    assert result.ok
+    assert dst.read_bytes() == b"encoded"
+    cmd = mock_popen.call_args[0][0]
+    assert cmd[:5] == ["ionice", "-c", "3", "nice", "-n"]
+    assert cmd[-3:-1] == ["-threads", "2"]
+
+
+def test_transcoder_queue(tmp_path):
+    """测试转码队列的并发数和输出路径"""
+    with patch.object(transcode, "available_cpus", return_value=4):
+        transcoder = Transcoder("archive-av1", workers=2)
+    assert transcoder.threads == 2
+
+    calls = []
+
+    def fake_transcode(src, dst, args, threads, nice, ionice_class):
+        calls.append((src, dst, threads, nice))
+        return transcode.TranscodeResult(src, dst, True)
+
+    with patch.object(transcode, "transcode_file", fake_transcode):
+        transcoder.submit(str(tmp_path / "ep.mkv"))
+        results = transcoder.close()
+    assert [r.ok for r in results] == [True]
+    assert calls == [
+        (str(tmp_path / "ep.mkv"), str(tmp_path / "ep.archive-av1.mkv"), 2, 10)
+    ]
@@ -1,6 +1,16 @@
 from unittest.mock import MagicMock, patch
 
-from bili_downloader.core.vamerger import VAMerger
+from bili_downloader.core.vamerger import ProgressParser, VAMerger
+
+
+def _mock_process(returncode=0, stdout=(), stderr=()):
+    """模拟 ffmpeg 子进程"""
+    process = MagicMock()
+    process.returncode = returncode
+    process.poll.return_value = returncode
+    process.stdout = iter(stdout)
+    process.stderr = iter(stderr)
+    return process
 
 
 @patch("bili_downloader.core.vamerger.find_executable")
@@ -18,23 +28,21 @@ def test_vamerger_init(mock_find_executable):
 @patch("bili_downloader.core.vamerger.find_executable")
 @patch("bili_downloader.core.vamerger.ffmpeg_path", "/usr/bin/ffmpeg")
 @patch("os.makedirs")
-@patch("subprocess.run")
-def test_vamerger_run_success(mock_subprocess_run, mock_makedirs, mock_find_executable):
+@patch("subprocess.Popen")
+def test_vamerger_run_success(mock_popen, mock_makedirs, mock_find_executable):
     """测试VAMerger成功运行"""
     mock_find_executable.return_value = "/usr/bin/ffmpeg"
 
     # 模拟成功的子进程运行
-    mock_result = MagicMock()
-    mock_result.returncode = 0
-    mock_result.stdout = ""
-    mock_result.stderr = ""
-    mock_subprocess_run.return_value = mock_result
+    mock_popen.return_value = _mock_process(0)
 
     merger = VAMerger("/tmp/audio.mp3", "/tmp/video.mp4", "/tmp/output.mp4")
     result = merger.run()
 
     assert result is True
-    mock_subprocess_run.assert_called_once()
+    mock_popen.assert_called_once()
+    cmd = mock_popen.call_args[0][0]
+    assert cmd[cmd.index("-progress") + 1] == "pipe:1"
 
 
 @patch("bili_downloader.core.vamerger.find_executable")
@@ -61,17 +69,13 @@ def test_vamerger_run_without_executable(mock_find_executable):
 @patch("bili_downloader.core.vamerger.find_executable")
 @patch("bili_downloader.core.vamerger.ffmpeg_path", "/usr/bin/ffmpeg")
 @patch("os.makedirs")
-@patch("subprocess.run")
-def test_vamerger_run_failure(mock_subprocess_run, mock_makedirs, mock_find_executable):
+@patch("subprocess.Popen")
+def test_vamerger_run_failure(mock_popen, mock_makedirs, mock_find_executable):
     """测试VAMerger运行失败"""
     mock_find_executable.return_value = "/usr/bin/ffmpeg"
 
     # 模拟失败的子进程运行
-    mock_result = MagicMock()
-    mock_result.returncode = 1
-    mock_result.stdout = ""
-    mock_result.stderr = "Merge failed"
-    mock_subprocess_run.return_value = mock_result
+    mock_popen.return_value = _mock_process(1, stderr=["Merge failed\n"])
 
     merger = VAMerger("/tmp/audio.mp3", "/tmp/video.mp4", "/tmp/output.mp4")
     result = merger.run()
@@ -82,17 +86,84 @@ def test_vamerger_run_failure(mock_subprocess_run, mock_makedirs, mock_find_exec
 @patch("bili_downloader.core.vamerger.find_executable")
 @patch("bili_downloader.core.vamerger.ffmpeg_path", "/usr/bin/ffmpeg")
 @patch("os.makedirs")
-@patch("subprocess.run")
-def test_vamerger_run_subprocess_error(
-    mock_subprocess_run, mock_makedirs, mock_find_executable
-):
+@patch("subprocess.Popen")
+def test_vamerger_run_subprocess_error(mock_popen, mock_makedirs, mock_find_executable):
     """测试VAMerger运行时出现子进程错误"""
     mock_find_executable.return_value = "/usr/bin/ffmpeg"
 
     # 模拟子进程错误
-    mock_subprocess_run.side_effect = Exception("Subprocess error")
+    mock_popen.side_effect = OSError("Subprocess error")
 
     merger = VAMerger("/tmp/audio.mp3", "/tmp/video.mp4", "/tmp/output.mp4")
     result = merger.run()
 
     assert result is False
+
+
+@patch("bili_downloader.core.vamerger.ffmpeg_path", "/usr/bin/ffmpeg")
+@patch("bili_downloader.core.vamerger.remux")
+@patch("subprocess.Popen")
+def test_vamerger_native_remux(mock_popen, mock_remux, tmp_path):
+    """测试内置封装器成功时不调用ffmpeg，失败时退回到ffmpeg"""
+    from bili_downloader.exceptions import RemuxError
+
+    output = str(tmp_path / "output.mkv")
+    merger = VAMerger("/tmp/audio.m4s", "/tmp/video.m4s", output, native=True)
+    assert merger.run() is True
+    mock_remux.assert_called_once_with(["/tmp/video.m4s", "/tmp/audio.m4s"], output)
+    mock_popen.assert_not_called()
+
+    mock_remux.side_effect = RemuxError("不支持的编码")
+    mock_popen.return_value = _mock_process(0)
+    assert merger.run() is True
+    mock_popen.assert_called_once()
+
+
+def test_progress_parser():
+    """测试增量解析ffmpeg进度输出"""
+    now = [100.0]
+    events = []
+    parser = ProgressParser(duration=100, callback=events.append, clock=lambda: now[0])
+
+    now[0] = 110.0
+    for line in [
+        "out_time_us=20000000\n",
+        "total_size=1048576\n",
+        "speed=2.0x\n",
+        "progress=continue\n",
+    ]:
+        parser.feed(line)
+    assert len(events) == 1
+    assert events[0].out_time == 20.0
+    assert events[0].rate == 1048576 / 10
+    assert events[0].eta == 40.0
+    assert not events[0].done
+
+    # speed 为 N/A 时按已用时间估算倍速
+    for line in ["out_time_us=100000000", "speed=N/A", "progress=end"]:
+        parser.feed(line)
+    assert events[-1].done
+    assert events[-1].speed == 10.0
+    assert events[-1].eta == 0.0
+
+
+@patch("bili_downloader.core.vamerger.ffmpeg_path", "/usr/bin/ffmpeg")
+@patch("subprocess.Popen")
+def test_vamerger_reports_progress(mock_popen, tmp_path):
+    """测试合并时产生进度事件，并按设置降低优先级"""
+    mock_popen.return_value = _mock_process(
+        0, stdout=["out_time_us=5000000\n", "progress=end\n"]
+    )
+    events = []
+    merger = VAMerger(
+        "a.m4s",
+        "v.m4s",
+        str(tmp_path / "out.mkv"),
+        duration=5,
+        nice=10,
+        on_progress=events.append,
+    )
+    with patch("bili_downloader.utils.process.shutil.which", return_value="/bin/nice"):
+        assert merger.run() is True
+    assert events[-1].out_time == 5.0
+    assert mock_popen.call_args[0][0][:3] == ["nice", "-n", "10"]
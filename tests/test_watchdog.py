@@ -0,0 +1,71 @@
+import sys
+
+from bili_downloader.core.watchdog import StallWatchdog, run_with_watchdog
+
+
+def test_watchdog_disabled():
+    """测试下限或窗口为0时看门狗被禁用"""
+    watchdog = StallWatchdog(0, 60)
+
+    assert watchdog.sample(0, now=0) is False
+    assert watchdog.sample(0, now=1000) is False
+
+
+def test_watchdog_healthy_transfer():
+    """测试吞吐量高于下限时不判定为停滞"""
+    watchdog = StallWatchdog(min_speed=1000, window=10)
+
+    for t in range(0, 30):
+        assert watchdog.sample(t * 2000, now=t) is False
+
+
+def test_watchdog_detects_stall_after_full_window():
+    """测试吞吐量持续低于下限一个完整窗口后判定为停滞"""
+    watchdog = StallWatchdog(min_speed=1000, window=10)
+
+    # 先正常下载一段时间
+    for t in range(0, 10):
+        watchdog.sample(t * 5000, now=t)
+    # 之后完全停滞，窗口未满之前不判定为停滞
+    stalled_at = None
+    for t in range(10, 40):
+        if watchdog.sample(45000, now=t):
+            stalled_at = t
+            break
+
+    assert stalled_at is not None
+    assert 10 < stalled_at <= 20
+
+
+def test_watchdog_short_dip_is_tolerated():
+    """测试短暂的速度下降不会被判定为停滞"""
+    watchdog = StallWatchdog(min_speed=1000, window=10)
+    total = 0
+    for t in range(0, 40):
+        # 每10秒中有3秒没有数据
+        if t % 10 >= 3:
+            total += 3000
+        assert watchdog.sample(total, now=t) is False
+
+
+def test_run_with_watchdog_kills_stalled_process(tmp_path):
+    """测试停滞的子进程会被终止"""
+    cmd = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+    result = run_with_watchdog(
+        cmd, str(tmp_path / "out"), min_speed=1024 * 1024, window=0.5, interval=0.1
+    )
+
+    assert result.stalled is True
+    assert result.returncode != 0
+
+
+def test_run_with_watchdog_success(tmp_path):
+    """测试正常退出的子进程"""
+    cmd = [sys.executable, "-c", "print('done')"]
+
+    result = run_with_watchdog(cmd, str(tmp_path / "out"), min_speed=1, window=60)
+
+    assert result.returncode == 0
+    assert result.stalled is False
+    assert result.stdout == "done"